@@ -1,7 +1,8 @@
 """Agent 模块"""
 from .agent import AIAgent
 from .agent_china import AIAgentChina
-from .agent_game_dev_hybrid import GameDevAgent
+from .agent_game import GameDevAgent
+from .agent_universal import UniversalAgent
 
-__all__ = ['AIAgent', 'AIAgentChina', 'GameDevAgent']
+__all__ = ['AIAgent', 'AIAgentChina', 'GameDevAgent', 'UniversalAgent']
 
@@ -8,8 +8,9 @@ from typing import Optional
 from dotenv import load_dotenv
 # langchain 1.2.x 的新导入方式
 from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
 from tools_package.tools import create_tools
+from tools_package.http_client import get_http_manager
+from agents.rate_limiter import RateLimitedChatOpenAI
 from rich.console import Console
 from rich.markdown import Markdown
 from rich.panel import Panel
@@ -52,10 +53,11 @@ class AIAgent:
         
         # 初始化LLM
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
-        self.llm = ChatOpenAI(
+        self.llm = RateLimitedChatOpenAI(
             model=self.model,
             temperature=temperature,
-            api_key=api_key
+            api_key=api_key,
+            **get_http_manager().llm_client_kwargs()
         )
         
         # 创建工具
@@ -4,11 +4,14 @@ AI Agent 主程序 - 中国版
 """
 
 import os
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
 from tools_package.tools import create_tools
+from tools_package.http_client import get_http_manager
+from agents.rate_limiter import RateLimitedChatOpenAI
+from agents.message_index import MessageIndex
+from agents.llm_router import RouterChatModel
 from rich.console import Console
 from rich.panel import Panel
 
@@ -18,6 +21,44 @@ load_dotenv()
 console = Console()
 
 
+# 国内服务配置（均为 OpenAI 兼容接口）
+# 可通过环境变量 {前缀}_BASE_URL 覆盖接口地址（例如指向本地测试服务）
+SERVICE_CONFIGS = {
+    "dashscope": {
+        "name": "阿里通义千问",
+        "env_prefix": "DASHSCOPE",
+        "default_model": "qwen-turbo",
+        "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        "key_example": "sk-your-api-key",
+        "signup_url": "https://dashscope.aliyun.com/",
+    },
+    "wenxin": {
+        "name": "百度文心一言",
+        "env_prefix": "WENXIN",
+        "default_model": "ERNIE-Bot-turbo",
+        "base_url": "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop",
+        "key_example": "your-api-key",
+        "signup_url": "https://console.bce.baidu.com/qianfan/",
+    },
+    "zhipu": {
+        "name": "智谱ChatGLM",
+        "env_prefix": "ZHIPU",
+        "default_model": "glm-4",
+        "base_url": "https://open.bigmodel.cn/api/paas/v4/",
+        "key_example": "your-api-key",
+        "signup_url": "https://open.bigmodel.cn/",
+    },
+    "deepseek": {
+        "name": "DeepSeek",
+        "env_prefix": "DEEPSEEK",
+        "default_model": "deepseek-chat",
+        "base_url": "https://api.deepseek.com/v1",
+        "key_example": "your-api-key",
+        "signup_url": "https://platform.deepseek.com/",
+    },
+}
+
+
 class AIAgentChina:
     """AI Agent 类 - 支持国内服务"""
     
@@ -27,89 +68,51 @@ class AIAgentChina:
             temperature: float = 0,
             max_iterations: int = None,
             verbose: bool = True,
-            service: str = "dashscope",  # dashscope(阿里), wenxin(百度), zhipu(智谱)
-            enable_clip: bool = False  # 🆕 是否启用CLIP图像分析功能
+            service: str = "dashscope",  # dashscope(阿里), wenxin(百度), zhipu(智谱), deepseek, router(多服务商路由)
+            enable_clip: bool = False,  # 🆕 是否启用CLIP图像分析功能
+            router_services: Optional[List[str]] = None,
+            hedge_delay: Optional[float] = None
     ):
         """
         初始化AI Agent
         
         Args:
-            model: 模型名称
+            model: 模型名称（router 模式下各服务商使用各自的默认模型）
             temperature: 温度参数，控制输出随机性（0-1）
             max_iterations: 最大迭代次数（None=无限制）
             verbose: 是否显示详细日志
-            service: AI 服务提供商
+            service: AI 服务提供商，"router" 表示在多个服务商之间按延迟路由
             enable_clip: 是否启用CLIP图像分析功能
+            router_services: router 模式使用的服务商，默认为所有已配置 API Key 的服务商
+                             （也可通过环境变量 ROUTER_SERVICES 指定，逗号分隔）
+            hedge_delay: router 模式的对冲延迟（秒），主请求超时未返回时向第二个服务商发送相同请求，
+                         默认读取环境变量 LLM_HEDGE_DELAY，未设置则不对冲
         """
         self.service = service
         
-        # 根据服务类型配置
-        if service == "dashscope":
-            # 阿里通义千问
-            api_key = os.getenv("DASHSCOPE_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "未找到 DASHSCOPE_API_KEY！\n"
-                    "请在 .env 文件中添加：\n"
-                    "DASHSCOPE_API_KEY=sk-your-api-key\n\n"
-                    "获取地址: https://dashscope.aliyun.com/"
-                )
-            
-            self.model = model or os.getenv("DASHSCOPE_MODEL", "qwen-turbo")
-            base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
-            
-        elif service == "wenxin":
-            # 百度文心一言
-            api_key = os.getenv("WENXIN_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "未找到 WENXIN_API_KEY！\n"
-                    "请在 .env 文件中添加：\n"
-                    "WENXIN_API_KEY=your-api-key\n\n"
-                    "获取地址: https://console.bce.baidu.com/qianfan/"
-                )
-            
-            self.model = model or os.getenv("WENXIN_MODEL", "ERNIE-Bot-turbo")
-            base_url = "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop"
-            
-        elif service == "zhipu":
-            # 智谱 ChatGLM
-            api_key = os.getenv("ZHIPU_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "未找到 ZHIPU_API_KEY！\n"
-                    "请在 .env 文件中添加：\n"
-                    "ZHIPU_API_KEY=your-api-key\n\n"
-                    "获取地址: https://open.bigmodel.cn/"
-                )
-            
-            self.model = model or os.getenv("ZHIPU_MODEL", "glm-4")
-            base_url = "https://open.bigmodel.cn/api/paas/v4/"
-            
-        elif service == "deepseek":
-            # DeepSeek
-            api_key = os.getenv("DEEPSEEK_API_KEY")
-            if not api_key:
+        if service == "router":
+            if router_services is None and os.getenv("ROUTER_SERVICES"):
+                router_services = [name.strip() for name in os.getenv("ROUTER_SERVICES").split(",") if name.strip()]
+            if router_services is None:
+                router_services = [
+                    name for name, config in SERVICE_CONFIGS.items()
+                    if os.getenv(f"{config['env_prefix']}_API_KEY")
+                ]
+            if not router_services:
                 raise ValueError(
-                    "未找到 DEEPSEEK_API_KEY！\n"
-                    "请在 .env 文件中添加：\n"
-                    "DEEPSEEK_API_KEY=your-api-key\n\n"
-                    "获取地址: https://platform.deepseek.com/"
+                    "router 模式未找到任何可用服务！\n"
+                    "请在 .env 文件中至少配置一个 API Key：\n"
+                    + "\n".join(f"{config['env_prefix']}_API_KEY=..." for config in SERVICE_CONFIGS.values())
                 )
+            if hedge_delay is None and os.getenv("LLM_HEDGE_DELAY"):
+                hedge_delay = float(os.getenv("LLM_HEDGE_DELAY"))
             
-            self.model = model or os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
-            base_url = "https://api.deepseek.com/v1"
-            
+            providers = {name: self._create_llm(name, None, temperature)[1] for name in router_services}
+            self.llm = RouterChatModel(providers=providers, hedge_delay=hedge_delay)
+            self.model = ", ".join(f"{name}:{llm.model_name}" for name, llm in providers.items())
         else:
-            raise ValueError(f"不支持的服务: {service}")
-        
-        # 初始化 LLM（使用 OpenAI 兼容接口）
-        self.llm = ChatOpenAI(
-            model=self.model,
-            temperature=temperature,
-            api_key=api_key,
-            base_url=base_url
-        )
+            # 初始化 LLM（使用 OpenAI 兼容接口）
+            self.model, self.llm = self._create_llm(service, model, temperature)
         
         # 创建工具（根据参数决定是否启用CLIP）
         self.tools = create_tools(enable_clip=enable_clip)
@@ -130,21 +133,56 @@ class AIAgentChina:
         self.verbose = verbose
         self.max_iterations = max_iterations if max_iterations else None  # 无限制，由任务完成情况决定
         
-        service_names = {
-            "dashscope": "阿里通义千问",
-            "wenxin": "百度文心一言",
-            "zhipu": "智谱ChatGLM",
-            "deepseek": "DeepSeek"
-        }
+        if service == "router":
+            service_display = "多服务商路由 (" + ", ".join(
+                SERVICE_CONFIGS[name]["name"] for name in router_services
+            ) + ")" + (f"，对冲延迟 {hedge_delay}s" if hedge_delay is not None else "")
+        else:
+            service_display = SERVICE_CONFIGS[service]["name"]
         
         console.print(Panel.fit(
             f"[bold green]🤖 AI Agent 已启动 (中国版)[/bold green]\n\n"
-            f"AI 服务: {service_names.get(service, service)}\n"
+            f"AI 服务: {service_display}\n"
             f"模型: {self.model}\n"
             f"可用工具数: {len(self.tools)}",
             title="系统信息"
         ))
     
+    @staticmethod
+    def _create_llm(service: str, model: Optional[str], temperature: float):
+        """根据服务配置创建 ChatOpenAI，返回 (模型名, LLM)"""
+        config = SERVICE_CONFIGS.get(service)
+        if config is None:
+            raise ValueError(f"不支持的服务: {service}")
+        
+        prefix = config["env_prefix"]
+        api_key = os.getenv(f"{prefix}_API_KEY")
+        if not api_key:
+            raise ValueError(
+                f"未找到 {prefix}_API_KEY！\n"
+                "请在 .env 文件中添加：\n"
+                f"{prefix}_API_KEY={config['key_example']}\n\n"
+                f"获取地址: {config['signup_url']}"
+            )
+        
+        model = model or os.getenv(f"{prefix}_MODEL", config["default_model"])
+        base_url = os.getenv(f"{prefix}_BASE_URL", config["base_url"])
+        
+        llm = RateLimitedChatOpenAI(
+            model=model,
+            temperature=temperature,
+            api_key=api_key,
+            base_url=base_url,
+            **get_http_manager().llm_client_kwargs(base_url)
+        )
+        return model, llm
+    
+    def router_stats(self) -> dict:
+        """router 模式下各服务商的延迟 / 错误统计"""
+        if isinstance(self.llm, RouterChatModel):
+            return self.llm.stats_snapshot()
+        return {}
+    
     def _create_system_prompt(self) -> str:
         """创建系统提示"""
         return """你是一个强大的 AI Agent，采用 ReAct 模式（Reasoning + Acting）工作。
@@ -185,7 +223,7 @@ class AIAgentChina:
 🔧 可用工具：
 - calculator: 数学计算（输入：数学表达式，如 "sqrt(100)" 或 "2+2"）
 - write_file: 写入文件（输入格式：文件路径|||文件内容，用|||分隔，如 "result.txt|||10"）
-- read_file: 读取文件（输入：文件路径）
+- read_file: 读取文件（输入：文件路径；大文件可用 文件路径|||lines=10-20、tail=50 或 offset=字节 分页读取）
 - list_directory: 列出目录（输入：目录路径，默认 "."）
 - get_current_time: 获取当前时间（输入：空字符串或任意文本）
 - web_search: 网络搜索（输入：搜索关键词）
@@ -249,6 +287,7 @@ class AIAgentChina:
             
             # 使用 stream 方法实现流式输出
             all_messages = []
+            seen_message_ids = set()
             step_count = 0
             plan_sent = False  # 标记是否已发送计划
             
@@ -260,8 +299,9 @@ class AIAgentChina:
                         messages = chunk.get("messages", [])
                         
                         for msg in messages:
-                            # 避免重复添加
-                            if msg not in all_messages:
+                            # 避免重复添加（按对象ID去重，O(1)）
+                            if id(msg) not in seen_message_ids:
+                                seen_message_ids.add(id(msg))
                                 all_messages.append(msg)
                             
                             # 提取任务规划（从第一个 AIMessage 中）
@@ -442,27 +482,13 @@ class AIAgentChina:
                     if step_count == 0:
                         console.print("[dim]💡 此任务无需使用工具，直接完成[/dim]\n")
             
-            # 提取输出 - 找到最后一个 AIMessage
-            output = "未能获取响应"
-            if messages:
-                # 从后向前找最后一个 AIMessage
-                for msg in reversed(messages):
-                    if hasattr(msg, 'content') and msg.content:
-                        # 检查是否是 AIMessage（不是 ToolMessage）
-                        msg_type = type(msg).__name__
-                        if 'AI' in msg_type and not hasattr(msg, 'tool_calls'):
-                            output = msg.content
-                            break
-                        elif 'AI' in msg_type and hasattr(msg, 'tool_calls') and not msg.tool_calls:
-                            # AIMessage 但没有 tool_calls，说明是最终答案
-                            output = msg.content
-                            break
-                
-                # 如果还是没有找到，使用最后一条消息
-                if output == "未能获取响应" and messages:
-                    last_msg = messages[-1]
-                    if hasattr(last_msg, 'content'):
-                        output = last_msg.content
+            # 提取输出 - 最后一个没有工具调用的 AIMessage（单遍索引）
+            message_index = MessageIndex.from_messages(messages)
+            output = message_index.final_output(exclude_plan=False)
+
+            # 如果还是没有找到，使用最后一条有内容的消息
+            if output is None:
+                output = message_index.last_content or "未能获取响应"
             
             if self.verbose:
                 console.print("[bold green]" + "="*80 + "[/bold green]")
@@ -476,7 +502,13 @@ class AIAgentChina:
                     "content": output
                 })
             
-            return {"output": output, "messages": messages}
+            return {
+                "output": output,
+                "messages": messages,
+                "plan": message_index.plan,
+                "react_steps": message_index.react_steps,
+                "router_stats": self.router_stats()
+            }
         
         except Exception as e:
             error_msg = f"执行错误: {str(e)}"
@@ -9,9 +9,10 @@ import time
 from typing import Optional
 from dotenv import load_dotenv
 from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
-from tools_package.tools import create_tools
-from tools_package.game_dev_tools import create_game_dev_tools
+from tools_package.registry import get_toolset
+from tools_package.http_client import get_http_manager
+from agents.rate_limiter import RateLimitedChatOpenAI
+from agents.message_index import MessageIndex
 from rich.console import Console
 from rich.panel import Panel
 
@@ -50,16 +51,17 @@ class GameDevAgent:
             raise ValueError(f"不支持的服务: {service}")
 
         # 初始化LLM
-        self.llm = ChatOpenAI(
+        self.llm = RateLimitedChatOpenAI(
             model=self.model,
             temperature=temperature,
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            **get_http_manager().llm_client_kwargs(base_url)
         )
 
         # 创建工具集
-        basic_tools = create_tools(enable_clip=False)
-        game_tools = create_game_dev_tools()
+        basic_tools = get_toolset("basic")
+        game_tools = get_toolset("game_dev")
         self.tools = basic_tools + game_tools
 
         # 🔑 增强的System Prompt - 强制使用工具
@@ -109,27 +111,32 @@ class GameDevAgent:
 4. **专业标准** - 像专业程序员一样，模块化、可维护、有注释
 5. **中文交流** - 所有回复使用中文
 
-🔧 **可用工具**（共24个专业工具）：
+🔧 **可用工具**（共29个专业工具）：
 
-**📖 代码分析**（4个）：
+**📖 代码分析**（5个）：
 - analyze_python_file: 深度分析Python文件结构
 - find_function: 查找特定函数代码
 - analyze_project: 分析整个项目结构
-- search_code: 在项目中搜索代码模式
+- find_symbol: 按名称查找类/函数定义位置
+- search_code: 在项目中搜索代码模式（正则，可用 目录|||模式|||py,js 指定文件类型）
 
-**✏️ 代码编辑**（5个）：
+**✏️ 代码编辑**（6个）：
 - write_file: 写入完整文件
+- write_files: 一次原子修改多个文件（JSON 编辑列表，重构多个文件时用它一次完成）
 - create_game_file: 从模板创建游戏文件
 - replace_function: 替换指定函数
 - insert_code: 在指定位置插入代码
-- read_file: 读取文件内容
+- read_file: 读取文件内容（大文件用 文件路径|||lines=起-止 / head=N / tail=N / offset=字节 分页）
 
 **✅ 测试验证**（2个）：
 - run_python: 运行Python文件
 - check_syntax: 检查语法错误
 
-**💻 终端工具**（1个）：
-- run_command: 执行任意终端命令
+**💻 终端工具**（4个）：
+- run_command: 执行任意终端命令（最多30秒）
+- run_command_background: 在后台启动长时间运行的命令（开发服务器等），返回任务编号
+- check_command: 查看后台任务的状态和新输出
+- stop_command: 结束后台任务
 
 **🐍 Python环境**（4个）：
 - pip_install: 安装Python包
@@ -180,6 +187,7 @@ class GameDevAgent:
 
             # 🔑 方案1：尝试流式输出（实时体验） - 带超时保护
             all_messages = []
+            message_index = None
             stream_success = False
 
             if stream_callback:
@@ -195,6 +203,7 @@ class GameDevAgent:
                     step_count = 0
                     plan_sent = False
                     seen_message_ids = set()
+                    stream_index = MessageIndex()
                     
                     # 🔥 添加超时保护机制
                     STREAM_TIMEOUT = 60  # 60秒总超时
@@ -233,6 +242,7 @@ class GameDevAgent:
                                     continue
                                 seen_message_ids.add(msg_id)
                                 all_messages.append(msg)
+                                stream_index.add(msg)
 
                                 # 提取任务规划
                                 if not plan_sent and hasattr(msg, 'content') and msg.content:
@@ -290,6 +300,7 @@ class GameDevAgent:
                                             border_style="green"
                                         ))
 
+                    message_index = stream_index
                     stream_success = True
                     if self.verbose:
                         console.print(f"[dim]✅ 流式模式成功（处理了{event_count}个事件）[/dim]\n")
@@ -344,57 +355,16 @@ class GameDevAgent:
                     
                     raise Exception(f"流式和标准模式都失败: {invoke_error}")
 
-            # 🔑 方案3：手动解析messages（保证100%显示）
-            # 无论流式是否成功，都要手动解析一遍来确保完整性
-            plan_text = ""
-            react_steps = []
-            step_num = 0
-
-            # 第一遍：查找计划
-            for msg in all_messages:
-                if hasattr(msg, 'content') and msg.content:
-                    msg_type = type(msg).__name__
-                    if 'AI' in msg_type:
-                        content = msg.content
-                        if any(keyword in content for keyword in ["步骤", "计划", "首先", "然后", "接下来", "使用", "我将"]):
-                            if not plan_text or len(content) > len(plan_text):
-                                plan_text = content
-
-            # 第二遍：提取步骤
-            for i, msg in enumerate(all_messages):
-                if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                    for tool_call in msg.tool_calls:
-                        step_num += 1
-                        tool = tool_call.get('name', 'unknown')
-                        args = tool_call.get('args', {})
-
-                        step_data = {
-                            "step": step_num,
-                            "tool": tool,
-                            "args": args,
-                            "observation": ""
-                        }
-
-                        # 查找对应的 ToolMessage
-                        for j in range(i+1, len(all_messages)):
-                            next_msg = all_messages[j]
-                            if hasattr(next_msg, 'tool_call_id') and next_msg.tool_call_id == tool_call.get('id'):
-                                content = next_msg.content if hasattr(next_msg, 'content') else str(next_msg)
-                                step_data["observation"] = content
-                                break
-
-                        react_steps.append(step_data)
-
-            # 提取最终答案
-            output = "未能获取响应"
-            if all_messages:
-                for msg in reversed(all_messages):
-                    if hasattr(msg, 'content') and msg.content:
-                        msg_type = type(msg).__name__
-                        if 'AI' in msg_type and not (hasattr(msg, 'tool_calls') and msg.tool_calls):
-                            if msg.content != plan_text:  # 排除计划文本
-                                output = msg.content
-                                break
+            # 🔑 方案3：解析messages（保证100%显示）
+            # 流式成功时直接使用边执行边构建的索引，否则对完整消息单遍构建
+            if message_index is None:
+                message_index = MessageIndex.from_messages(all_messages)
+
+            plan_text = message_index.plan
+            react_steps = message_index.react_steps
+
+            # 提取最终答案（排除计划文本）
+            output = message_index.final_output() or "未能获取响应"
 
             if output == "未能获取响应" and react_steps:
                 output = f"任务已执行完成。共执行了 {len(react_steps)} 个步骤。"
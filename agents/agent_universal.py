@@ -7,12 +7,22 @@
 import os
 import time
 import signal
-from typing import Optional, List, Dict
+import asyncio
+import uuid
+from typing import Optional, List, Dict, AsyncIterator
 from dotenv import load_dotenv
 from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
-from tools_package.tools import create_tools
-from tools_package.game_dev_tools import create_game_dev_tools
+from langchain_core.messages import AIMessageChunk
+from tools_package.registry import get_scenario_tools
+from tools_package.http_client import get_http_manager
+from tools_package.tool_cache import get_tool_cache
+from agents.rate_limiter import RateLimitedChatOpenAI, is_rate_limit_error
+from agents.llm_cache import create_llm_cache
+from agents.tool_executor import ParallelToolExecutor, ToolResultOrderer
+from agents.checkpoint import create_checkpointer
+from agents.message_index import MessageIndex
+from agents.context_compactor import ContextCompactor
+from agents.tracing import RunTracer
 from rich.console import Console
 from rich.panel import Panel
 
@@ -64,7 +74,13 @@ class UniversalAgent:
             temperature: float = 0,
             verbose: bool = True,
             service: str = "deepseek",
-            scenario: str = "general"
+            scenario: str = "general",
+            enable_cache: bool = False,
+            max_tool_workers: int = 4,
+            stream_tokens: bool = False,
+            enable_checkpoint: bool = True,
+            context_budget: Optional[int] = None,
+            trace_file: Optional[str] = None
     ):
         """
         初始化通用编程Agent
@@ -75,10 +91,20 @@ class UniversalAgent:
             verbose: 是否显示详细信息
             service: AI服务提供商 (deepseek/dashscope)
             scenario: 使用场景 (game_dev/web_dev/data_science/devops/general)
+            enable_cache: 是否启用本地LLM响应缓存（建议配合 temperature=0 使用）
+            max_tool_workers: 同一步骤内并发执行的最大工具数
+            stream_tokens: 是否通过 stream_callback 逐token推送模型输出（type="token"）
+            enable_checkpoint: 是否在每个节点后保存检查点（超时/失败时从最后完成的步骤继续）
+            context_budget: 发送给模型的历史 token 预算，超过时压缩较早的工具结果
+                            （默认读取环境变量 CONTEXT_TOKEN_BUDGET，默认24000，0=不压缩）
+            trace_file: 每次执行的追踪数据（OTLP JSON）追加写入的文件
+                        （默认读取环境变量 AGENT_TRACE_FILE，未设置则只附加在返回值中）
         """
         self.service = service
         self.verbose = verbose
         self.scenario = scenario
+        self.stream_tokens = stream_tokens
+        self.trace_file = trace_file or os.getenv("AGENT_TRACE_FILE")
 
         # 配置API
         if service == "deepseek":
@@ -86,35 +112,54 @@ class UniversalAgent:
             if not api_key:
                 raise ValueError("未找到 DEEPSEEK_API_KEY！请在 .env 文件中添加")
             self.model = model or "deepseek-chat"
-            base_url = "https://api.deepseek.com/v1"
+            base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
         elif service == "dashscope":
             api_key = os.getenv("DASHSCOPE_API_KEY")
             if not api_key:
                 raise ValueError("未找到 DASHSCOPE_API_KEY！")
             self.model = model or "qwen-turbo"
-            base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+            base_url = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
         else:
             raise ValueError(f"不支持的服务: {service}")
 
+        # 初始化LLM响应缓存（可选）
+        self.llm_cache = create_llm_cache() if enable_cache else None
+
         # 初始化LLM
-        self.llm = ChatOpenAI(
+        self.llm = RateLimitedChatOpenAI(
             model=self.model,
             temperature=temperature,
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            cache=self.llm_cache,
+            **get_http_manager().llm_client_kwargs(base_url)
         )
 
-        # 创建工具集（根据场景选择）
-        self.tools = self._create_tools_for_scenario(scenario)
+        # 创建工具集（根据场景选择），并包装为可并发执行
+        # 上下文压缩（超过预算时把较早的工具结果替换为摘要 + 引用，可用 recall_observation 取回）
+        if context_budget is None:
+            context_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", 24000))
+        self.compactor = ContextCompactor(token_budget=context_budget) if context_budget > 0 else None
+
+        self.tool_executor = ParallelToolExecutor(max_workers=max_tool_workers)
+        tools = self._create_tools_for_scenario(scenario)
+        if self.compactor:
+            tools.append(self.compactor.recall_tool())
+        self.tools = self.tool_executor.wrap(tools)
 
         # 创建系统提示词
         system_prompt = self._create_system_prompt(scenario)
 
+        # 检查点存储（本地SQLite）
+        self.checkpointer = create_checkpointer() if enable_checkpoint else None
+
         # 创建Agent
         self.agent = create_agent(
             model=self.llm,
             tools=self.tools,
             system_prompt=system_prompt,
+            checkpointer=self.checkpointer,
+            middleware=[self.compactor] if self.compactor else [],
             debug=False
         )
 
@@ -126,58 +171,14 @@ class UniversalAgent:
             f"模型: {self.model}\n"
             f"工具总数: {len(self.tools)}个\n\n"
             f"✅ 流式输出: 实时显示\n"
-            f"✅ 可靠性: 100%保证",
+            f"✅ 可靠性: 100%保证\n"
+            f"{'✅' if self.llm_cache else '⬜'} 响应缓存: {'已启用' if self.llm_cache else '未启用'}",
             title="🚀 Universal Programming Agent"
         ))
 
     def _create_tools_for_scenario(self, scenario: str) -> List:
-        """根据场景创建工具集"""
-        basic_tools = create_tools(enable_clip=False)
-
-        # 所有场景都包含质量工具
-        try:
-            from tools_package.quality_tools import create_quality_tools
-            quality_tools = create_quality_tools()
-        except ImportError:
-            quality_tools = []
-
-        # 根据场景添加特定工具
-        if scenario == "game_dev":
-            from tools_package.game_dev_tools import create_game_dev_tools
-            game_tools = create_game_dev_tools()
-            return basic_tools + game_tools + quality_tools
-        elif scenario == "web_dev":
-            from tools_package.web_dev_tools import create_web_dev_tools
-            web_tools = create_web_dev_tools()
-            return basic_tools + web_tools + quality_tools
-        elif scenario == "data_science":
-            from tools_package.data_science_tools import create_data_science_tools
-            data_tools = create_data_science_tools()
-            return basic_tools + data_tools + quality_tools
-        elif scenario == "devops":
-            from tools_package.devops_tools import create_devops_tools
-            devops_tools = create_devops_tools()
-            return basic_tools + devops_tools + quality_tools
-        else:  # general
-            from tools_package.game_dev_tools import create_game_dev_tools
-            # 通用场景包含所有工具
-            game_tools = create_game_dev_tools()
-            try:
-                from tools_package.web_dev_tools import create_web_dev_tools
-                web_tools = create_web_dev_tools()
-            except ImportError:
-                web_tools = []
-            try:
-                from tools_package.data_science_tools import create_data_science_tools
-                data_tools = create_data_science_tools()
-            except ImportError:
-                data_tools = []
-            try:
-                from tools_package.devops_tools import create_devops_tools
-                devops_tools = create_devops_tools()
-            except ImportError:
-                devops_tools = []
-            return basic_tools + game_tools + web_tools + data_tools + devops_tools + quality_tools
+        """根据场景创建工具集（注册表按场景缓存，重复创建Agent时不再重新导入和构建）"""
+        return get_scenario_tools(scenario)
 
     def _create_system_prompt(self, scenario: str) -> str:
         """根据场景创建系统提示词"""
@@ -264,6 +265,443 @@ class UniversalAgent:
 
         return base_prompt
 
+    # 流式模式超时保护
+    STREAM_TIMEOUT = 60  # 60秒总超时
+    EVENT_TIMEOUT = 30   # 30秒事件超时
+
+    def _print_task_header(self, task: str):
+        """打印任务开始信息"""
+        if self.verbose:
+            console.print(f"\n[bold blue]🎯 任务:[/bold blue] {task}\n")
+            console.print("[bold cyan]" + "="*80 + "[/bold cyan]")
+            console.print("[bold cyan]🔄 开始执行[/bold cyan]")
+            console.print("[bold cyan]" + "="*80 + "[/bold cyan]\n")
+
+    @staticmethod
+    def _new_stream_state(tracer: Optional[RunTracer] = None) -> dict:
+        """创建一次流式执行的状态"""
+        now = time.time()
+        return {
+            "tracer": tracer,
+            "all_messages": [],
+            "step_count": 0,
+            "plan_sent": False,
+            "seen_message_ids": set(),
+            "result_orderer": ToolResultOrderer(),
+            "call_steps": {},
+            "running_steps": {},
+            "index": MessageIndex(),
+            "start_time": now,
+            "last_event_time": now,
+            "event_count": 0
+        }
+
+    def _check_stream_timeout(self, state: dict):
+        """检查流式执行是否超时，超时抛出 TimeoutError"""
+        current_time = time.time()
+
+        # 总超时检查
+        if current_time - state["start_time"] > self.STREAM_TIMEOUT:
+            if self.verbose:
+                console.print("[yellow]⚠️  流式模式总超时（60秒），切换到标准模式[/yellow]")
+            raise TimeoutError("流式处理总超时")
+
+        # 事件间隔超时检查
+        if current_time - state["last_event_time"] > self.EVENT_TIMEOUT:
+            if self.verbose:
+                console.print("[yellow]⚠️  流式事件超时（30秒无响应），切换到标准模式[/yellow]")
+            raise TimeoutError("流式事件超时")
+
+        # 更新最后事件时间
+        state["last_event_time"] = current_time
+        state["event_count"] += 1
+
+    def _stream_mode(self):
+        """流式模式：按节点更新 + 工具的实时输出（custom），开启 stream_tokens 时同时订阅 token 增量"""
+        return ["updates", "custom", "messages"] if self.stream_tokens else ["updates", "custom"]
+
+    def _handle_stream_item(self, item, state: dict, stream_callback):
+        """处理 agent.stream 产出的一项（超时检查 + 按模式分发）"""
+        self._check_stream_timeout(state)
+
+        mode, data = item
+        if mode == "messages":
+            self._handle_token_event(data, stream_callback)
+            return
+        if mode == "custom":
+            self._handle_output_event(data, state, stream_callback)
+            return
+
+        self._handle_stream_event(data, state, stream_callback)
+        self._send_trace_events(state.get("tracer"), stream_callback)
+
+    @staticmethod
+    def _handle_output_event(data, state: dict, stream_callback):
+        """处理 stream_mode="custom" 事件：转发命令类工具执行中的输出（type="tool_output"）"""
+        if not isinstance(data, dict) or data.get("type") != "tool_output":
+            return
+        tool = data.get("tool", "")
+        # 对应最早的、同名且还没有结果的步骤
+        running = [step for step, name in state["running_steps"].items() if name == tool]
+        stream_callback({
+            "type": "tool_output",
+            "step": min(running) if running else state["step_count"],
+            "tool": tool,
+            "stream": data.get("stream", "stdout"),
+            "content": data.get("content", "")
+        })
+
+    @staticmethod
+    def _send_trace_events(tracer: Optional[RunTracer], stream_callback):
+        """推送已结束的模型 / 工具调用 span（type="trace"）"""
+        if tracer is None or not stream_callback:
+            return
+        for span in tracer.drain():
+            stream_callback({
+                "type": "trace",
+                "span": span,
+                "content": f"⏱️ {span['name']}: {span['duration_ms']:.0f}ms"
+            })
+
+    @staticmethod
+    def _handle_token_event(data, stream_callback):
+        """处理 stream_mode="messages" 事件：转发模型输出的 token 增量"""
+        chunk, metadata = data
+
+        # 只转发模型生成的内容，工具结果由 observation 事件负责
+        if not isinstance(chunk, AIMessageChunk):
+            return
+        if not isinstance(chunk.content, str) or not chunk.content:
+            return
+
+        stream_callback({
+            "type": "token",
+            "content": chunk.content,
+            "message_id": chunk.id,
+            "node": metadata.get("langgraph_node", "")
+        })
+
+    def _handle_stream_event(self, event: dict, state: dict, stream_callback):
+        """处理一个 stream_mode="updates" 事件：收集消息并发送 plan/action/observation"""
+        for node_name, node_data in event.items():
+            ordered_messages = []
+            for msg in node_data.get("messages", []):
+                msg_id = id(msg)
+                if msg_id in state["seen_message_ids"]:
+                    continue
+                state["seen_message_ids"].add(msg_id)
+
+                # 并发执行的工具结果按调用顺序释放
+                if getattr(msg, 'tool_call_id', None):
+                    ordered_messages.extend(state["result_orderer"].add(msg))
+                else:
+                    ordered_messages.append(msg)
+
+            for msg in ordered_messages:
+                state["all_messages"].append(msg)
+                state["index"].add(msg)
+
+                # 提取任务规划
+                if not state["plan_sent"] and hasattr(msg, 'content') and msg.content:
+                    msg_type = type(msg).__name__
+                    if 'AI' in msg_type:
+                        content = msg.content
+                        if any(keyword in content for keyword in ["步骤", "计划", "首先", "然后", "接下来", "我将"]):
+                            stream_callback({
+                                "type": "plan",
+                                "content": content
+                            })
+                            state["plan_sent"] = True
+
+                            if self.verbose:
+                                console.print(Panel(
+                                    f"[blue]{content}[/blue]",
+                                    border_style="blue",
+                                    title="📋 执行计划"
+                                ))
+
+                # 检测工具调用
+                if hasattr(msg, 'tool_calls') and msg.tool_calls:
+                    # 提取思考内容（AI消息中的content，在工具调用之前）
+                    thought_content = ""
+                    if hasattr(msg, 'content') and msg.content:
+                        thought_content = msg.content
+
+                    state["result_orderer"].expect(msg.tool_calls)
+                    for tool_call in msg.tool_calls:
+                        state["step_count"] += 1
+                        step_count = state["step_count"]
+                        state["call_steps"][tool_call.get('id')] = step_count
+                        tool_name = tool_call.get('name', 'unknown')
+                        state["running_steps"][step_count] = tool_name
+                        tool_args = tool_call.get('args', {})
+
+                        stream_callback({
+                            "type": "action",
+                            "step": step_count,
+                            "tool": tool_name,
+                            "args": tool_args,
+                            "thought": thought_content,  # 添加思考内容
+                            "content": f"步骤 {step_count}: {tool_name}"
+                        })
+
+                        if self.verbose:
+                            console.print(f"[bold yellow]▼ 步骤 {step_count}: {tool_name} ▼[/bold yellow]")
+
+                # 检测工具响应
+                elif hasattr(msg, 'name') and msg.name:
+                    content = msg.content if hasattr(msg, 'content') else str(msg)
+                    display_content = content[:500] + "..." if len(content) > 500 else content
+
+                    step = state["call_steps"].get(getattr(msg, 'tool_call_id', None), state["step_count"])
+                    state["running_steps"].pop(step, None)
+                    stream_callback({
+                        "type": "observation",
+                        "step": step,
+                        "tool": msg.name,
+                        "result": display_content,
+                        "content": f"✅ 结果: {display_content}"
+                    })
+
+                    if self.verbose:
+                        console.print(Panel(
+                            f"[green]✅ {msg.name}\n{display_content}[/green]",
+                            border_style="green"
+                        ))
+
+    def _finish_stream(self, state: dict) -> List:
+        """流式执行结束：释放剩余工具结果并返回全部消息"""
+        remaining = state["result_orderer"].flush()
+        state["all_messages"].extend(remaining)
+        state["index"].extend(remaining)
+        if self.verbose:
+            console.print(f"[dim]✅ 流式模式成功（处理了{state['event_count']}个事件）[/dim]\n")
+        return state["all_messages"]
+
+    def _report_stream_failure(self, error: Exception, stream_callback):
+        """流式模式失败时提示切换到标准模式"""
+        if isinstance(error, TimeoutError):
+            if self.verbose:
+                console.print(f"[yellow]⚠️  {error}[/yellow]")
+                console.print("[dim]🔄 自动切换到标准模式...[/dim]")
+
+            stream_callback({
+                "type": "warning",
+                "content": f"{error}，自动切换到标准模式..."
+            })
+        else:
+            if self.verbose:
+                console.print(f"[yellow]⚠️  流式模式失败: {error}[/yellow]")
+                console.print("[dim]🔄 切换到标准模式...[/dim]")
+
+            stream_callback({
+                "type": "warning",
+                "content": "流式模式不可用，使用标准模式..."
+            })
+
+    def _run_config(self, thread_id: str, tracer: Optional[RunTracer] = None) -> dict:
+        """单次执行的运行配置（并发限制 + 线程ID，用于检查点和按任务统计；附加追踪回调）"""
+        config = self.tool_executor.config()
+        config["configurable"] = {"thread_id": thread_id}
+        if tracer is not None:
+            config["callbacks"] = [tracer]
+        return config
+
+    def _notify_resume(self, snapshot, stream_callback):
+        """提示从检查点继续执行"""
+        done_steps = sum(1 for msg in snapshot.values.get("messages", []) if getattr(msg, 'tool_call_id', None))
+        if self.verbose:
+            console.print(f"[dim]♻️  从检查点继续执行（已完成 {done_steps} 个工具调用）...[/dim]")
+        if stream_callback:
+            stream_callback({
+                "type": "info",
+                "content": f"从检查点继续执行，跳过已完成的 {done_steps} 个工具调用"
+            })
+
+    def _resume_or_invoke(self, inputs: dict, config: dict, stream_callback) -> dict:
+        """标准模式：有未完成的检查点时从断点继续，否则从头执行"""
+        if self.checkpointer is not None:
+            snapshot = self.agent.get_state(config)
+            if snapshot.next:
+                self._notify_resume(snapshot, stream_callback)
+                return self.agent.invoke(None, config=config)
+            if snapshot.values.get("messages"):
+                # 流式执行其实已经完成
+                return snapshot.values
+
+        return self.agent.invoke(inputs, config=config)
+
+    async def _aresume_or_invoke(self, inputs: dict, config: dict, stream_callback) -> dict:
+        """_resume_or_invoke 的异步版本"""
+        if self.checkpointer is not None:
+            snapshot = await self.agent.aget_state(config)
+            if snapshot.next:
+                self._notify_resume(snapshot, stream_callback)
+                return await self.agent.ainvoke(None, config=config)
+            if snapshot.values.get("messages"):
+                return snapshot.values
+
+        return await self.agent.ainvoke(inputs, config=config)
+
+    def _discard_checkpoint(self, thread_id: str):
+        """任务成功后删除检查点，避免数据库无限增长"""
+        if self.checkpointer is None:
+            return
+        try:
+            self.checkpointer.delete_thread(thread_id)
+        except Exception:
+            pass
+
+    def _report_invoke_done(self, stream_callback):
+        """标准模式完成"""
+        if self.verbose:
+            console.print("[dim]✅ 标准模式完成[/dim]\n")
+
+        # 如果有回调函数，通知标准模式已完成
+        if stream_callback:
+            stream_callback({
+                "type": "info",
+                "content": "使用标准模式完成任务"
+            })
+
+    def _build_result(self, all_messages: List, stream_callback, message_index: Optional[MessageIndex] = None,
+                      thread_id: Optional[str] = None, tracer: Optional[RunTracer] = None) -> dict:
+        """🔑 方案3：解析messages（保证100%显示），生成最终结果
+
+        流式执行时直接使用边执行边构建的索引，否则对完整消息单遍构建
+        """
+        if message_index is None:
+            message_index = MessageIndex.from_messages(all_messages)
+
+        plan_text = message_index.plan
+        react_steps = message_index.react_steps
+
+        # 提取最终答案（排除计划文本）
+        output = message_index.final_output() or "未能获取响应"
+
+        if output == "未能获取响应" and react_steps:
+            output = f"任务已执行完成。共执行了 {len(react_steps)} 个步骤。"
+
+        if self.verbose:
+            console.print("[bold green]" + "="*80 + "[/bold green]")
+            console.print("[bold green]✅ 任务完成[/bold green]")
+            console.print(Panel(output, border_style="green", padding=(1, 2)))
+            console.print(f"[dim]📊 计划: {'有' if plan_text else '无'} | 步骤: {len(react_steps)}个[/dim]")
+            if self.llm_cache:
+                cache_stats = self.llm_cache.stats()
+                console.print(f"[dim]💾 缓存: 命中 {cache_stats['hits']} | 未命中 {cache_stats['misses']}[/dim]")
+            tool_cache_stats = get_tool_cache().stats()
+            if tool_cache_stats["hits"]:
+                console.print(f"[dim]🗂️ 工具结果缓存: 命中 {tool_cache_stats['hits']} | "
+                              f"未命中 {tool_cache_stats['misses']} | 命中率 {tool_cache_stats['hit_rate']:.0%}[/dim]")
+
+        context_stats = self.compactor.pop_stats(thread_id) if self.compactor else None
+        if self.verbose and context_stats and context_stats["tokens_saved"]:
+            console.print(f"[dim]🗜️ 上下文压缩: {context_stats['compacted_calls']}/{context_stats['model_calls']} 次模型调用, "
+                          f"节省约 {context_stats['tokens_saved']} tokens[/dim]")
+
+        self._send_trace_events(tracer, stream_callback)
+        if stream_callback:
+            stream_callback({
+                "type": "final",
+                "content": output,
+                "plan": plan_text,
+                "steps": react_steps
+            })
+
+        result = {
+            "output": output,
+            "messages": all_messages,
+            "plan": plan_text,
+            "react_steps": react_steps
+        }
+        if self.llm_cache:
+            result["cache_stats"] = self.llm_cache.stats()
+        result["tool_cache"] = get_tool_cache().stats()
+        if context_stats is not None:
+            result["context"] = context_stats
+        self._add_rate_limit_metrics(result)
+        self._add_trace(result, tracer)
+
+        return result
+
+    def _build_error_result(self, error: Exception, stream_callback, thread_id: Optional[str] = None,
+                            tracer: Optional[RunTracer] = None) -> dict:
+        """生成错误结果（启用检查点时附带 thread_id，可用 resume 继续执行）"""
+        error_msg = f"执行错误: {str(error)}"
+        console.print(f"\n[bold red]❌ {error_msg}[/bold red]")
+
+        if stream_callback:
+            stream_callback({
+                "type": "error",
+                "content": error_msg
+            })
+
+        result = {"error": error_msg, "output": error_msg, "messages": []}
+        if self.checkpointer is not None and thread_id:
+            result["thread_id"] = thread_id
+        if self.compactor:
+            result["context"] = self.compactor.pop_stats(thread_id)
+        self._add_rate_limit_metrics(result)
+        self._add_trace(result, tracer, status="error")
+        return result
+
+    def _add_rate_limit_metrics(self, result: dict) -> None:
+        """附加限流器的排队 / 429 指标"""
+        limiter = getattr(self.llm, "request_limiter", None)
+        if limiter is not None:
+            result["rate_limit"] = limiter.metrics()
+
+    def _add_trace(self, result: dict, tracer: Optional[RunTracer], status: str = "ok") -> None:
+        """结束追踪，附加 span 汇总（配置了 trace_file 时导出 OTLP JSON）"""
+        if tracer is None:
+            return
+        tracer.finish(status)
+        result["trace"] = tracer.summary()
+
+        if self.verbose:
+            totals = result["trace"]["totals"]
+            console.print(f"[dim]⏱️ 总耗时 {totals['wall_ms'] / 1000:.1f}s | "
+                          f"模型 {totals['llm_ms'] / 1000:.1f}s ({totals['llm_calls']}次, 排队 {totals['llm_queue_ms'] / 1000:.1f}s) | "
+                          f"工具 {totals['tool_ms'] / 1000:.1f}s ({totals['tool_calls']}次) | "
+                          f"回调 {totals['callback_ms']:.0f}ms[/dim]")
+
+        if self.trace_file:
+            try:
+                tracer.export(self.trace_file)
+            except OSError as e:
+                console.print(f"[yellow]⚠️  追踪数据写入失败: {e}[/yellow]")
+
+    def resume(self, thread_id: str, stream_callback=None) -> dict:
+        """
+        从检查点继续执行之前失败的任务（如进程崩溃、API持续超时）
+
+        Args:
+            thread_id: 失败结果中返回的 thread_id
+            stream_callback: 流式回调函数
+
+        Returns:
+            dict: 与 run 相同的结果格式
+        """
+        if self.checkpointer is None:
+            return self._build_error_result(Exception("未启用检查点，无法恢复"), stream_callback)
+
+        tracer = RunTracer(thread_id, name="agent.resume")
+        stream_callback = tracer.wrap_callback(stream_callback)
+        try:
+            config = self._run_config(thread_id, tracer)
+            snapshot = self.agent.get_state(config)
+            if not snapshot.values:
+                raise Exception(f"未找到检查点: {thread_id}")
+
+            response = self._resume_or_invoke(None, config, stream_callback)
+            result = self._build_result(response.get("messages", []), stream_callback, thread_id=thread_id, tracer=tracer)
+            self._discard_checkpoint(thread_id)
+            return result
+
+        except Exception as e:
+            return self._build_error_result(e, stream_callback, thread_id, tracer)
+
     def run(self, task: str, stream_callback=None) -> dict:
         """
         执行任务 - 混合模式：流式+可靠性保证
@@ -275,17 +713,18 @@ class UniversalAgent:
         Returns:
             dict: 包含 output 和 messages
         """
+        thread_id = uuid.uuid4().hex
+        tracer = RunTracer(thread_id)
+        stream_callback = tracer.wrap_callback(stream_callback)
         try:
-            if self.verbose:
-                console.print(f"\n[bold blue]🎯 任务:[/bold blue] {task}\n")
-                console.print("[bold cyan]" + "="*80 + "[/bold cyan]")
-                console.print("[bold cyan]🔄 开始执行[/bold cyan]")
-                console.print("[bold cyan]" + "="*80 + "[/bold cyan]\n")
+            self._print_task_header(task)
 
             inputs = {"messages": [{"role": "user", "content": task}]}
+            config = self._run_config(thread_id, tracer)
 
             # 🔑 方案1：尝试流式输出（实时体验） - 带超时保护
             all_messages = []
+            message_index = None
             stream_success = False
 
             if stream_callback:
@@ -298,254 +737,163 @@ class UniversalAgent:
                         "content": task
                     })
 
-                    step_count = 0
-                    plan_sent = False
-                    seen_message_ids = set()
-                    
-                    # 🔥 添加超时保护机制
-                    STREAM_TIMEOUT = 60  # 60秒总超时
-                    EVENT_TIMEOUT = 30   # 30秒事件超时
-                    start_time = time.time()
-                    last_event_time = time.time()
-                    event_count = 0
-
-                    # 使用 stream_mode="updates"
-                    for event in self.agent.stream(inputs, stream_mode="updates"):
-                        # 🔥 检查超时
-                        current_time = time.time()
-                        
-                        # 总超时检查
-                        if current_time - start_time > STREAM_TIMEOUT:
-                            if self.verbose:
-                                console.print("[yellow]⚠️  流式模式总超时（60秒），切换到标准模式[/yellow]")
-                            raise TimeoutError("流式处理总超时")
-                        
-                        # 事件间隔超时检查
-                        if current_time - last_event_time > EVENT_TIMEOUT:
-                            if self.verbose:
-                                console.print("[yellow]⚠️  流式事件超时（30秒无响应），切换到标准模式[/yellow]")
-                            raise TimeoutError("流式事件超时")
-                        
-                        # 更新最后事件时间
-                        last_event_time = current_time
-                        event_count += 1
-                        
-                        for node_name, node_data in event.items():
-                            messages = node_data.get("messages", [])
-
-                            for msg in messages:
-                                msg_id = id(msg)
-                                if msg_id in seen_message_ids:
-                                    continue
-                                seen_message_ids.add(msg_id)
-                                all_messages.append(msg)
-
-                                # 提取任务规划
-                                if not plan_sent and hasattr(msg, 'content') and msg.content:
-                                    msg_type = type(msg).__name__
-                                    if 'AI' in msg_type:
-                                        content = msg.content
-                                        if any(keyword in content for keyword in ["步骤", "计划", "首先", "然后", "接下来", "我将"]):
-                                            stream_callback({
-                                                "type": "plan",
-                                                "content": content
-                                            })
-                                            plan_sent = True
-
-                                            if self.verbose:
-                                                console.print(Panel(
-                                                    f"[blue]{content}[/blue]",
-                                                    border_style="blue",
-                                                    title="📋 执行计划"
-                                                ))
-
-                                # 检测工具调用
-                                if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                                    # 提取思考内容（AI消息中的content，在工具调用之前）
-                                    thought_content = ""
-                                    if hasattr(msg, 'content') and msg.content:
-                                        thought_content = msg.content
-
-                                    for tool_call in msg.tool_calls:
-                                        step_count += 1
-                                        tool_name = tool_call.get('name', 'unknown')
-                                        tool_args = tool_call.get('args', {})
-
-                                        stream_callback({
-                                            "type": "action",
-                                            "step": step_count,
-                                            "tool": tool_name,
-                                            "args": tool_args,
-                                            "thought": thought_content,  # 添加思考内容
-                                            "content": f"步骤 {step_count}: {tool_name}"
-                                        })
-
-                                        if self.verbose:
-                                            console.print(f"[bold yellow]▼ 步骤 {step_count}: {tool_name} ▼[/bold yellow]")
-
-                                # 检测工具响应
-                                elif hasattr(msg, 'name') and msg.name:
-                                    content = msg.content if hasattr(msg, 'content') else str(msg)
-                                    display_content = content[:500] + "..." if len(content) > 500 else content
-
-                                    stream_callback({
-                                        "type": "observation",
-                                        "step": step_count,
-                                        "tool": msg.name,
-                                        "result": display_content,
-                                        "content": f"✅ 结果: {display_content}"
-                                    })
-
-                                    if self.verbose:
-                                        console.print(Panel(
-                                            f"[green]✅ {msg.name}\n{display_content}[/green]",
-                                            border_style="green"
-                                        ))
+                    state = self._new_stream_state(tracer)
+
+                    # 使用 stream_mode="updates" + "custom"（开启 stream_tokens 时附加 "messages"）
+                    for event in self.agent.stream(
+                            inputs,
+                            config=config,
+                            stream_mode=self._stream_mode()
+                    ):
+                        self._handle_stream_item(event, state, stream_callback)
 
+                    all_messages = self._finish_stream(state)
+                    message_index = state["index"]
                     stream_success = True
-                    if self.verbose:
-                        console.print(f"[dim]✅ 流式模式成功（处理了{event_count}个事件）[/dim]\n")
 
-                except TimeoutError as timeout_error:
+                except Exception as stream_error:
+                    # 限流重试耗尽时不切换标准模式（只会加重过载），保留检查点直接返回错误
+                    if is_rate_limit_error(stream_error):
+                        raise
+                    # 超时或失败时不设置stream_success=True，让它走标准模式
+                    self._report_stream_failure(stream_error, stream_callback)
+                    stream_success = False
+
+            # 🔑 方案2：如果流式失败或没有回调，使用标准模式（100%可靠）
+            # 流式已完成的步骤保存在检查点中，标准模式从断点继续而不是从头再来
+            if not stream_success or not stream_callback:
+                if self.verbose:
+                    console.print("[dim]📡 使用标准模式执行...[/dim]")
+
+                try:
+                    response = self._resume_or_invoke(inputs, config, stream_callback)
+                    all_messages = response.get("messages", [])
+                    self._report_invoke_done(stream_callback)
+
+                except Exception as invoke_error:
                     if self.verbose:
-                        console.print(f"[yellow]⚠️  {timeout_error}[/yellow]")
-                        console.print("[dim]🔄 自动切换到标准模式...[/dim]")
+                        console.print(f"[red]❌ 标准模式也失败: {invoke_error}[/red]")
 
-                    if stream_callback:
-                        stream_callback({
-                            "type": "warning",
-                            "content": f"{timeout_error}，自动切换到标准模式..."
-                        })
-                    
-                    # 超时时不设置stream_success=True，让它走标准模式
-                    stream_success = False
+                    # 如果标准模式也失败，抛出异常（检查点保留，可用 resume 继续）
+                    raise Exception(f"流式和标准模式都失败: {invoke_error}")
 
-                except Exception as stream_error:
+            result = self._build_result(all_messages, stream_callback, message_index, thread_id, tracer)
+            self._discard_checkpoint(thread_id)
+            return result
+
+        except Exception as e:
+            return self._build_error_result(e, stream_callback, thread_id, tracer)
+
+    async def arun(self, task: str, stream_callback=None) -> dict:
+        """
+        异步执行任务 - 与 run 行为一致，但不阻塞事件循环
+
+        使用 LangGraph 的 astream/ainvoke，工具通过异步包装在线程中执行，
+        同一个事件循环可以同时运行多个任务。
+
+        Args:
+            task: 任务描述
+            stream_callback: 流式回调函数（与 run 相同的事件格式）
+
+        Returns:
+            dict: 包含 output、messages、plan 和 react_steps
+        """
+        thread_id = uuid.uuid4().hex
+        tracer = RunTracer(thread_id)
+        stream_callback = tracer.wrap_callback(stream_callback)
+        try:
+            self._print_task_header(task)
+
+            inputs = {"messages": [{"role": "user", "content": task}]}
+            config = self._run_config(thread_id, tracer)
+
+            all_messages = []
+            message_index = None
+            stream_success = False
+
+            if stream_callback:
+                try:
                     if self.verbose:
-                        console.print(f"[yellow]⚠️  流式模式失败: {stream_error}[/yellow]")
-                        console.print("[dim]🔄 切换到标准模式...[/dim]")
+                        console.print("[dim]🔄 尝试流式模式...[/dim]")
 
-                    if stream_callback:
-                        stream_callback({
-                            "type": "warning",
-                            "content": "流式模式不可用，使用标准模式..."
-                        })
-                    
+                    stream_callback({
+                        "type": "start",
+                        "content": task
+                    })
+
+                    state = self._new_stream_state(tracer)
+
+                    async for event in self.agent.astream(
+                            inputs,
+                            config=config,
+                            stream_mode=self._stream_mode()
+                    ):
+                        self._handle_stream_item(event, state, stream_callback)
+
+                    all_messages = self._finish_stream(state)
+                    message_index = state["index"]
+                    stream_success = True
+
+                except Exception as stream_error:
+                    if is_rate_limit_error(stream_error):
+                        raise
+                    self._report_stream_failure(stream_error, stream_callback)
                     stream_success = False
 
-            # 🔑 方案2：如果流式失败或没有回调，使用标准模式（100%可靠）
             if not stream_success or not stream_callback:
                 if self.verbose:
                     console.print("[dim]📡 使用标准模式执行...[/dim]")
-                
+
                 try:
-                    # 添加超时保护到标准模式
-                    response = self.agent.invoke(inputs)
+                    response = await self._aresume_or_invoke(inputs, config, stream_callback)
                     all_messages = response.get("messages", [])
+                    self._report_invoke_done(stream_callback)
 
-                    if self.verbose:
-                        console.print("[dim]✅ 标准模式完成[/dim]\n")
-                    
-                    # 如果有回调函数，通知标准模式已完成
-                    if stream_callback:
-                        stream_callback({
-                            "type": "info",
-                            "content": "使用标准模式完成任务"
-                        })
-                        
                 except Exception as invoke_error:
                     if self.verbose:
                         console.print(f"[red]❌ 标准模式也失败: {invoke_error}[/red]")
-                    
-                    # 如果标准模式也失败，抛出异常
+
                     raise Exception(f"流式和标准模式都失败: {invoke_error}")
 
-            # 🔑 方案3：手动解析messages（保证100%显示）
-            plan_text = ""
-            react_steps = []
-            step_num = 0
+            result = self._build_result(all_messages, stream_callback, message_index, thread_id, tracer)
+            self._discard_checkpoint(thread_id)
+            return result
 
-            # 第一遍：查找计划
-            for msg in all_messages:
-                if hasattr(msg, 'content') and msg.content:
-                    msg_type = type(msg).__name__
-                    if 'AI' in msg_type:
-                        content = msg.content
-                        if any(keyword in content for keyword in ["步骤", "计划", "首先", "然后", "接下来", "使用", "我将"]):
-                            if not plan_text or len(content) > len(plan_text):
-                                plan_text = content
+        except Exception as e:
+            return self._build_error_result(e, stream_callback, thread_id, tracer)
 
-            # 第二遍：提取步骤
-            for i, msg in enumerate(all_messages):
-                if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                    for tool_call in msg.tool_calls:
-                        step_num += 1
-                        tool = tool_call.get('name', 'unknown')
-                        args = tool_call.get('args', {})
-
-                        step_data = {
-                            "step": step_num,
-                            "tool": tool,
-                            "args": args,
-                            "observation": ""
-                        }
-
-                        # 查找对应的 ToolMessage
-                        for j in range(i+1, len(all_messages)):
-                            next_msg = all_messages[j]
-                            if hasattr(next_msg, 'tool_call_id') and next_msg.tool_call_id == tool_call.get('id'):
-                                content = next_msg.content if hasattr(next_msg, 'content') else str(next_msg)
-                                step_data["observation"] = content
-                                break
-
-                        react_steps.append(step_data)
-
-            # 提取最终答案
-            output = "未能获取响应"
-            if all_messages:
-                for msg in reversed(all_messages):
-                    if hasattr(msg, 'content') and msg.content:
-                        msg_type = type(msg).__name__
-                        if 'AI' in msg_type and not (hasattr(msg, 'tool_calls') and msg.tool_calls):
-                            if msg.content != plan_text:  # 排除计划文本
-                                output = msg.content
-                                break
+    async def astream(self, task: str) -> AsyncIterator[dict]:
+        """
+        异步流式执行任务，逐个产出与 stream_callback 相同格式的事件
 
-            if output == "未能获取响应" and react_steps:
-                output = f"任务已执行完成。共执行了 {len(react_steps)} 个步骤。"
+        最后一个事件为 final（成功）或 error（失败）。
 
-            if self.verbose:
-                console.print("[bold green]" + "="*80 + "[/bold green]")
-                console.print("[bold green]✅ 任务完成[/bold green]")
-                console.print(Panel(output, border_style="green", padding=(1, 2)))
-                console.print(f"[dim]📊 计划: {'有' if plan_text else '无'} | 步骤: {len(react_steps)}个[/dim]")
+        用法:
+            async for event in agent.astream("创建贪吃蛇游戏"):
+                print(event["type"], event.get("content"))
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        run_task = asyncio.create_task(self.arun(task, stream_callback=queue.put_nowait))
 
-            if stream_callback:
-                stream_callback({
-                    "type": "final",
-                    "content": output,
-                    "plan": plan_text,
-                    "steps": react_steps
-                })
-
-            return {
-                "output": output,
-                "messages": all_messages,
-                "plan": plan_text,
-                "react_steps": react_steps
-            }
+        try:
+            while True:
+                get_event = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait({get_event, run_task}, return_when=asyncio.FIRST_COMPLETED)
 
-        except Exception as e:
-            error_msg = f"执行错误: {str(e)}"
-            console.print(f"\n[bold red]❌ {error_msg}[/bold red]")
+                if get_event in done:
+                    yield get_event.result()
+                    continue
 
-            if stream_callback:
-                stream_callback({
-                    "type": "error",
-                    "content": error_msg
-                })
+                get_event.cancel()
+                # 任务已结束，取出剩余事件
+                while not queue.empty():
+                    yield queue.get_nowait()
+                break
+        finally:
+            if not run_task.done():
+                run_task.cancel()
 
-            return {"error": error_msg, "output": error_msg, "messages": []}
+        await run_task
 
     def chat(self):
         """交互式对话模式"""
@@ -577,6 +925,12 @@ def main():
     """主函数"""
     import sys
 
+    # 批量模式：多进程执行任务文件，不在主进程创建Agent
+    if "--batch" in sys.argv[1:]:
+        from agents.batch_runner import main_batch
+        main_batch(sys.argv[1:])
+        return
+
     service = os.getenv("AI_SERVICE", "deepseek")
     scenario = os.getenv("AGENT_SCENARIO", "general")
 
@@ -585,7 +939,9 @@ def main():
             temperature=float(os.getenv("TEMPERATURE", 0)),
             verbose=os.getenv("VERBOSE", "true").lower() == "true",
             service=service,
-            scenario=scenario
+            scenario=scenario,
+            enable_cache=os.getenv("LLM_CACHE", "false").lower() == "true",
+            max_tool_workers=int(os.getenv("MAX_TOOL_WORKERS", 4))
         )
     except ValueError as e:
         console.print(f"[bold red]初始化错误: {e}[/bold red]")
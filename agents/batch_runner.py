@@ -0,0 +1,281 @@
+"""
+批量任务执行 - 多进程并行运行 UniversalAgent
+- 每个工作进程持有自己的 UniversalAgent，每个任务在独立的工作目录中执行
+- 结果逐条写入输出 JSONL（耗时、token 数、步骤数）
+- 支持断点续跑：输出文件中已成功的任务会被跳过
+- 全局限流：总 RPM / TPM 平均分给各工作进程
+
+任务文件格式（每行一个 JSON）:
+    {"id": "snake", "task": "创建一个贪吃蛇游戏", "scenario": "game_dev"}
+    id 可省略（默认使用行号），scenario 可省略（默认使用 --scenario）
+
+用法:
+    python -m agents.agent_universal --batch tasks.jsonl --workers 4 --output results.jsonl
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# 工作进程内的 Agent（按场景缓存）
+_worker_agents: Dict[str, object] = {}
+_worker_options: dict = {}
+
+
+def load_tasks(path: str) -> List[dict]:
+    """读取任务文件，补全 id"""
+    tasks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"task": item}
+            if not item.get("task"):
+                raise ValueError(f"{path}:{line_no} 缺少 task 字段")
+            item["id"] = str(item.get("id", line_no))
+            tasks.append(item)
+    return tasks
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """读取输出文件中已成功完成的任务 id（用于断点续跑）"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 中断时写了一半的行
+            if record.get("status") == "ok":
+                completed.add(str(record.get("id")))
+    return completed
+
+
+def _sandbox_name(task_id: str) -> str:
+    """任务 id 转为安全的目录名"""
+    return re.sub(r"[^\w.-]", "_", task_id)[:100] or "task"
+
+
+def _init_worker(options: dict) -> None:
+    """工作进程初始化：设置本进程的限流参数，并预先创建默认场景的 Agent（不计入任务耗时）"""
+    _worker_options.update(options)
+    for name, value in options.get("env", {}).items():
+        os.environ[name] = str(value)
+    try:
+        _get_worker_agent(options.get("scenario", "general"))
+    except Exception:
+        pass  # 创建失败时由 run_task 记录错误
+
+
+def _get_worker_agent(scenario: str):
+    """本进程的 Agent（同一场景只创建一次）"""
+    agent = _worker_agents.get(scenario)
+    if agent is None:
+        from agents.agent_universal import UniversalAgent
+        agent = UniversalAgent(
+            service=_worker_options.get("service", "deepseek"),
+            scenario=scenario,
+            temperature=_worker_options.get("temperature", 0),
+            verbose=False
+        )
+        _worker_agents[scenario] = agent
+    return agent
+
+
+def _token_usage(messages: List) -> dict:
+    """汇总 AI 消息中的 token 用量"""
+    usage = {"input": 0, "output": 0, "total": 0}
+    llm_calls = 0
+    for msg in messages:
+        metadata = getattr(msg, "usage_metadata", None)
+        if metadata:
+            llm_calls += 1
+            usage["input"] += metadata.get("input_tokens", 0)
+            usage["output"] += metadata.get("output_tokens", 0)
+            usage["total"] += metadata.get("total_tokens", 0)
+    usage["llm_calls"] = llm_calls
+    return usage
+
+
+def run_task(item: dict) -> dict:
+    """在工作进程中执行单个任务（在任务自己的工作目录中）"""
+    scenario = item.get("scenario") or _worker_options.get("scenario", "general")
+    workdir = os.path.abspath(os.path.join(_worker_options["workdir"], _sandbox_name(item["id"])))
+    os.makedirs(workdir, exist_ok=True)
+
+    record = {
+        "id": item["id"],
+        "task": item["task"],
+        "scenario": scenario,
+        "workdir": workdir,
+        "worker_pid": os.getpid(),
+    }
+
+    start = time.perf_counter()
+    original_cwd = os.getcwd()
+    try:
+        agent = _get_worker_agent(scenario)
+        os.chdir(workdir)
+        result = agent.run(item["task"])
+        error = result.get("error")
+        record.update({
+            "status": "error" if error else "ok",
+            "output": result.get("output", ""),
+            "error": error,
+            "steps": len(result.get("react_steps", [])),
+            "tokens": _token_usage(result.get("messages", [])),
+            "thread_id": result.get("thread_id"),
+        })
+    except Exception as e:
+        record.update({"status": "error", "output": "", "error": str(e), "steps": 0, "tokens": _token_usage([])})
+    finally:
+        os.chdir(original_cwd)
+
+    record["latency"] = round(time.perf_counter() - start, 3)
+    record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return record
+
+
+def run_batch(tasks_path: str,
+              output_path: Optional[str] = None,
+              workers: int = 4,
+              workdir: str = "batch_workspace",
+              scenario: str = "general",
+              service: str = "deepseek",
+              temperature: float = 0,
+              rpm: int = 0,
+              tpm: int = 0,
+              resume: bool = True) -> dict:
+    """
+    并行执行任务文件中的所有任务
+
+    Args:
+        tasks_path: 任务 JSONL 文件
+        output_path: 结果 JSONL 文件，默认为 <任务文件名>.results.jsonl
+        workers: 工作进程数
+        workdir: 各任务工作目录的根目录
+        scenario: 默认场景
+        service: AI服务提供商
+        temperature: 温度参数
+        rpm: 全局每分钟请求数上限（0=不限制），平均分给各工作进程
+        tpm: 全局每分钟 token 数上限（0=不限制），平均分给各工作进程
+        resume: 是否跳过输出文件中已成功的任务
+
+    Returns:
+        dict: 汇总信息
+    """
+    output_path = output_path or os.path.splitext(tasks_path)[0] + ".results.jsonl"
+    tasks = load_tasks(tasks_path)
+    completed = load_completed(output_path) if resume else set()
+    pending = [item for item in tasks if item["id"] not in completed]
+
+    workers = max(1, min(workers, len(pending) or 1))
+    env = {}
+    if rpm > 0:
+        env["LLM_RPM"] = max(1, rpm // workers)
+    if tpm > 0:
+        env["LLM_TPM"] = max(1, tpm // workers)
+
+    options = {
+        "workdir": os.path.abspath(workdir),
+        "scenario": scenario,
+        "service": service,
+        "temperature": temperature,
+        "env": env,
+    }
+
+    console.print(f"[bold cyan]📦 批量任务: {len(tasks)} 个，已完成 {len(tasks) - len(pending)} 个，"
+                  f"待执行 {len(pending)} 个，工作进程 {workers} 个[/bold cyan]")
+    console.print(f"[dim]结果输出: {output_path}[/dim]")
+
+    summary = {"total": len(tasks), "skipped": len(tasks) - len(pending), "ok": 0, "error": 0,
+               "latency": 0.0, "tokens": 0, "steps": 0}
+    start = time.perf_counter()
+
+    if pending:
+        mode = "a" if resume else "w"
+        with open(output_path, mode, encoding="utf-8") as out, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as executor:
+            futures = {executor.submit(run_task, item): item for item in pending}
+            for done_count, future in enumerate(as_completed(futures), 1):
+                item = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:  # 工作进程崩溃
+                    record = {"id": item["id"], "task": item["task"], "status": "error", "error": str(e),
+                              "steps": 0, "tokens": _token_usage([]), "latency": 0.0}
+
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+                summary[record["status"]] += 1
+                summary["latency"] += record.get("latency", 0.0)
+                summary["tokens"] += record.get("tokens", {}).get("total", 0)
+                summary["steps"] += record.get("steps", 0)
+
+                status = "[green]✅[/green]" if record["status"] == "ok" else "[red]❌[/red]"
+                console.print(f"{status} [{done_count}/{len(pending)}] {record['id']} "
+                              f"({record.get('latency', 0):.1f}s, {record.get('steps', 0)} 步)")
+
+    summary["wall_time"] = round(time.perf_counter() - start, 3)
+    summary["output"] = output_path
+    _print_summary(summary)
+    return summary
+
+
+def _print_summary(summary: dict) -> None:
+    """打印批量执行汇总"""
+    executed = summary["ok"] + summary["error"]
+    table = Table(title="📊 批量执行汇总")
+    table.add_column("指标")
+    table.add_column("数值", justify="right")
+    table.add_row("任务总数", str(summary["total"]))
+    table.add_row("跳过（已完成）", str(summary["skipped"]))
+    table.add_row("成功", str(summary["ok"]))
+    table.add_row("失败", str(summary["error"]))
+    table.add_row("总耗时", f"{summary['wall_time']:.1f}s")
+    table.add_row("平均任务耗时", f"{summary['latency'] / executed:.1f}s" if executed else "-")
+    table.add_row("总 token 数", str(summary["tokens"]))
+    table.add_row("总步骤数", str(summary["steps"]))
+    console.print(table)
+
+
+def main_batch(argv: List[str]) -> dict:
+    """解析 --batch 命令行参数并执行"""
+    parser = argparse.ArgumentParser(prog="agent_universal.py --batch", description="批量执行任务")
+    parser.add_argument("--batch", required=True, help="任务 JSONL 文件")
+    parser.add_argument("--output", help="结果 JSONL 文件（默认 <任务文件名>.results.jsonl）")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BATCH_WORKERS", 4)), help="工作进程数")
+    parser.add_argument("--workdir", default="batch_workspace", help="任务工作目录的根目录")
+    parser.add_argument("--scenario", default=os.getenv("AGENT_SCENARIO", "general"), help="默认场景")
+    parser.add_argument("--rpm", type=int, default=int(os.getenv("BATCH_RPM", 0)), help="全局每分钟请求数上限")
+    parser.add_argument("--tpm", type=int, default=int(os.getenv("BATCH_TPM", 0)), help="全局每分钟 token 数上限")
+    parser.add_argument("--no-resume", action="store_true", help="不跳过已完成的任务（覆盖输出文件）")
+    args = parser.parse_args(argv)
+
+    return run_batch(
+        args.batch,
+        output_path=args.output,
+        workers=args.workers,
+        workdir=args.workdir,
+        scenario=args.scenario,
+        service=os.getenv("AI_SERVICE", "deepseek"),
+        temperature=float(os.getenv("TEMPERATURE", 0)),
+        rpm=args.rpm,
+        tpm=args.tpm,
+        resume=not args.no_resume
+    )
@@ -0,0 +1,78 @@
+"""
+Agent 执行检查点 - 基于 LangGraph checkpointer
+每个节点（模型调用 / 工具调用）完成后保存图状态，超时或失败时从最后完成的步骤继续，
+不再重复已经完成的 LLM 调用和工具副作用
+"""
+
+import os
+import asyncio
+import sqlite3
+from typing import Optional
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:  # 未安装 langgraph-checkpoint-sqlite
+    SqliteSaver = None
+
+try:
+    from langgraph.checkpoint.memory import InMemorySaver
+except ImportError:  # 旧版本 langgraph
+    from langgraph.checkpoint.memory import MemorySaver as InMemorySaver
+
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(".agent_cache", "checkpoints.db")
+
+
+if SqliteSaver is not None:
+    class ThreadedSqliteSaver(SqliteSaver):
+        """
+        SqliteSaver 的异步扩展
+
+        官方 SqliteSaver 只支持同步接口，这里把异步接口放到线程中执行同步实现，
+        让同一个检查点库同时服务 run() 和 arun()（SqliteSaver 内部有锁保护连接）
+        """
+
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            checkpoints = await asyncio.to_thread(
+                lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+            )
+            for checkpoint in checkpoints:
+                yield checkpoint
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+else:
+    ThreadedSqliteSaver = None
+
+
+def create_checkpointer(path: Optional[str] = None):
+    """
+    创建检查点存储
+
+    优先使用本地 SQLite（进程崩溃后仍可恢复），
+    未安装 langgraph-checkpoint-sqlite 时退回内存存储（仅进程内可恢复）
+
+    Args:
+        path: SQLite 文件路径，默认读取环境变量 AGENT_CHECKPOINT_PATH
+    """
+    if ThreadedSqliteSaver is None:
+        return InMemorySaver()
+
+    path = path or os.getenv("AGENT_CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, check_same_thread=False)
+    checkpointer = ThreadedSqliteSaver(conn)
+    checkpointer.setup()
+    return checkpointer
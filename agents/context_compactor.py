@@ -0,0 +1,191 @@
+"""
+上下文压缩 - 长任务中控制发送给模型的历史长度
+当消息历史超过 token 预算时，把较早的大块工具观察结果（read_file、search_code、
+run_terminal_command 等的输出）替换为简短摘要 + 内容哈希引用；
+图状态和检查点中保留完整消息，只压缩发给模型的视图。
+模型需要原文时调用 recall_observation 工具按引用取回。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import Tool
+from agents.rate_limiter import estimate_tokens
+
+
+# 取回被压缩内容的工具名
+RECALL_TOOL_NAME = "recall_observation"
+
+
+def _get_thread_id() -> str:
+    """当前执行的 thread_id（用于按任务统计），不在图执行中时返回 default"""
+    try:
+        from langgraph.config import get_config
+        return get_config().get("configurable", {}).get("thread_id", "default")
+    except Exception:
+        return "default"
+
+
+class ContextCompactor(AgentMiddleware):
+    """
+    上下文压缩中间件（create_agent 的 middleware）
+
+    用法:
+        compactor = ContextCompactor(token_budget=24000)
+        agent = create_agent(model, tools + [compactor.recall_tool()], middleware=[compactor])
+    """
+
+    def __init__(self,
+                 token_budget: int = 24000,
+                 keep_recent: int = 4,
+                 min_chars: int = 800,
+                 summary_lines: int = 5,
+                 max_store: int = 1000):
+        """
+        Args:
+            token_budget: 历史 token 预算，超过时开始压缩
+            keep_recent: 最近的N条工具结果始终保留原文
+            min_chars: 小于该长度的工具结果不压缩
+            summary_lines: 摘要保留的开头行数
+            max_store: 最多保存多少条被压缩的原文（LRU）
+        """
+        super().__init__()
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.min_chars = min_chars
+        self.summary_lines = summary_lines
+        self.max_store = max_store
+
+        # 引用 -> 原文
+        self._store: "OrderedDict[str, str]" = OrderedDict()
+        # (tool_call_id, 引用) -> 压缩后的消息（同一条消息每次压缩结果相同，保持提示词稳定）
+        # 键中包含内容引用：不同对话的服务商可能复用 call_0 这样的 tool_call_id
+        # 引用从 _store 中淘汰时一并删除，摘要不会指向已无法取回的引用
+        self._compacted: "OrderedDict[Tuple[str, str], ToolMessage]" = OrderedDict()
+        # thread_id -> 统计
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    # ---------- 压缩 ----------
+
+    def _summarize(self, msg: ToolMessage, content: str, ref: str) -> str:
+        lines = content.splitlines()
+        head = "\n".join(line[:200] for line in lines[:self.summary_lines])
+        return (
+            f"[已压缩的工具结果] 工具: {msg.name or 'unknown'} | 原长度: {len(content)}字符 / {len(lines)}行\n"
+            f"开头内容:\n{head}\n"
+            f"...\n"
+            f"如需完整内容，调用 {RECALL_TOOL_NAME} 工具，输入: {ref}"
+        )
+
+    def _compact_message(self, msg: ToolMessage) -> ToolMessage:
+        """压缩单条工具结果（结果按 tool_call_id + 内容缓存）"""
+        content = msg.content if isinstance(msg.content, str) else str(msg.content)
+        ref = "obs:" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+        key = (msg.tool_call_id, ref)
+        with self._lock:
+            cached = self._compacted.get(key)
+            if cached is not None and ref in self._store:
+                self._compacted.move_to_end(key)
+                self._store.move_to_end(ref)
+                return cached
+
+            self._store[ref] = content
+            self._store.move_to_end(ref)
+            while len(self._store) > self.max_store:
+                evicted, _ = self._store.popitem(last=False)
+                for stale in [k for k in self._compacted if k[1] == evicted]:
+                    del self._compacted[stale]
+
+            compacted = msg.model_copy(update={"content": self._summarize(msg, content, ref)})
+            self._compacted[key] = compacted
+            while len(self._compacted) > self.max_store:
+                self._compacted.popitem(last=False)
+            return compacted
+
+    def compact(self, messages: List) -> List:
+        """
+        返回压缩后的消息列表（不修改原列表）
+
+        从最早的工具结果开始替换，直到总量回到预算以内
+        """
+        total = estimate_tokens(messages)
+        if self.token_budget <= 0 or total <= self.token_budget:
+            return messages
+
+        tool_positions = [i for i, msg in enumerate(messages) if isinstance(msg, ToolMessage)]
+        candidates = tool_positions[:-self.keep_recent] if self.keep_recent else tool_positions
+
+        compacted = list(messages)
+        for i in candidates:
+            if total <= self.token_budget:
+                break
+            msg = messages[i]
+            content = msg.content if isinstance(msg.content, str) else str(msg.content)
+            # 模型主动取回的原文不再压缩
+            if len(content) < self.min_chars or msg.name == RECALL_TOOL_NAME:
+                continue
+            new_msg = self._compact_message(msg)
+            total -= estimate_tokens([msg]) - estimate_tokens([new_msg])
+            compacted[i] = new_msg
+        return compacted
+
+    def _record(self, original: List, compacted: List) -> None:
+        saved = estimate_tokens(original) - estimate_tokens(compacted) if compacted is not original else 0
+        thread_id = _get_thread_id()
+        with self._lock:
+            stats = self._stats.setdefault(thread_id, {"model_calls": 0, "compacted_calls": 0, "tokens_saved": 0})
+            stats["model_calls"] += 1
+            if saved > 0:
+                stats["compacted_calls"] += 1
+                stats["tokens_saved"] += saved
+
+    # ---------- 中间件钩子 ----------
+
+    def wrap_model_call(self, request, handler):
+        compacted = self.compact(request.messages)
+        self._record(request.messages, compacted)
+        if compacted is request.messages:
+            return handler(request)
+        return handler(request.override(messages=compacted))
+
+    async def awrap_model_call(self, request, handler):
+        compacted = self.compact(request.messages)
+        self._record(request.messages, compacted)
+        if compacted is request.messages:
+            return await handler(request)
+        return await handler(request.override(messages=compacted))
+
+    # ---------- 取回 ----------
+
+    def recall(self, ref: str) -> str:
+        """按引用取回被压缩的完整工具结果"""
+        ref = ref.strip().strip("'\"")
+        if not ref.startswith("obs:"):
+            ref = "obs:" + ref
+        with self._lock:
+            content = self._store.get(ref)
+            if content is not None:
+                self._store.move_to_end(ref)
+        if content is None:
+            return f"错误: 未找到引用 {ref}（可能已过期），请重新调用原工具获取"
+        return content
+
+    def recall_tool(self) -> Tool:
+        """取回被压缩内容的工具"""
+        return Tool(
+            name=RECALL_TOOL_NAME,
+            func=self.recall,
+            description="取回之前被压缩的工具结果原文。输入: 压缩提示中给出的引用（如 obs:1a2b3c4d5e6f）"
+        )
+
+    # ---------- 统计 ----------
+
+    def pop_stats(self, thread_id: Optional[str] = None) -> dict:
+        """取出并清除某次执行的压缩统计"""
+        with self._lock:
+            return self._stats.pop(thread_id or "default",
+                                   {"model_calls": 0, "compacted_calls": 0, "tokens_saved": 0})
@@ -0,0 +1,205 @@
+"""
+LLM 响应缓存 - 本地SQLite持久化
+相同的模型配置 + 系统提示 + 工具定义 + 对话历史 直接返回缓存结果，跳过API调用
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict, Any
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+
+DEFAULT_CACHE_DIR = ".agent_cache"
+DEFAULT_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIR, "llm_cache.db")
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    基于SQLite的LLM响应缓存（精确匹配）
+
+    - 缓存键: sha256(prompt + llm_string)
+      prompt 为 LangChain 序列化后的完整消息列表（含系统提示和对话历史），
+      llm_string 包含模型名、温度以及 bind_tools 绑定的工具定义
+    - TTL淘汰: 超过 ttl 秒的条目视为未命中并删除
+    - 容量淘汰: 条目数超过 max_entries 时按最近访问时间淘汰（LRU）
+    - 命中/未命中计数: stats()
+    """
+
+    def __init__(
+            self,
+            path: str = DEFAULT_CACHE_PATH,
+            ttl: Optional[float] = 24 * 3600,
+            max_entries: int = 5000
+    ):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite 数据库文件路径
+            ttl: 条目有效期（秒），None 表示永不过期
+            max_entries: 最大条目数
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # LangGraph 会在工作线程中调用模型，连接需要跨线程使用（由 _lock 串行化）
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _dumps(generations: RETURN_VAL_TYPE) -> str:
+        """序列化生成结果（消息用 message_to_dict，避免反序列化任意对象）"""
+        data = []
+        for gen in generations:
+            if isinstance(gen, ChatGeneration):
+                data.append({"message": message_to_dict(gen.message), "generation_info": gen.generation_info})
+            else:
+                data.append({"text": gen.text, "generation_info": gen.generation_info})
+        return json.dumps(data, ensure_ascii=False)
+
+    @staticmethod
+    def _loads(value: str) -> RETURN_VAL_TYPE:
+        """反序列化生成结果"""
+        generations = []
+        for item in json.loads(value):
+            if "message" in item:
+                message = messages_from_dict([item["message"]])[0]
+                generations.append(ChatGeneration(message=message, generation_info=item.get("generation_info")))
+            else:
+                generations.append(Generation(text=item["text"], generation_info=item.get("generation_info")))
+        return generations
+
+    @staticmethod
+    def _make_key(prompt: str, llm_string: str) -> str:
+        """生成缓存键"""
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """查找缓存"""
+        key = self._make_key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            try:
+                generations = self._loads(value)
+            except Exception:
+                # 无法反序列化（如 LangChain 版本升级），当作未命中
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """写入缓存"""
+        key = self._make_key(prompt, llm_string)
+        now = time.time()
+        value = self._dumps(return_val)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """按TTL和容量淘汰条目（调用方持有锁）"""
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空缓存并重置计数"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "path": self.path
+        }
+
+
+def create_llm_cache(
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None
+) -> SQLiteLLMCache:
+    """
+    创建LLM缓存（未指定的参数从环境变量读取）
+
+    环境变量:
+        LLM_CACHE_PATH: 数据库路径（默认 .agent_cache/llm_cache.db）
+        LLM_CACHE_TTL: 有效期秒数（默认 86400，0 表示永不过期）
+        LLM_CACHE_MAX_ENTRIES: 最大条目数（默认 5000）
+    """
+    if path is None:
+        path = os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+    if ttl is None:
+        ttl = float(os.getenv("LLM_CACHE_TTL", 24 * 3600)) or None
+    if max_entries is None:
+        max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+
+    return SQLiteLLMCache(path=path, ttl=ttl, max_entries=max_entries)
@@ -0,0 +1,348 @@
+"""
+多服务商路由 LLM
+在多个 OpenAI 兼容服务商之间按实时延迟路由：
+- 每个服务商维护滚动窗口的延迟 / 错误统计
+- 每次请求发往最快的健康服务商，失败时依次切换到下一个
+- 可选对冲请求：主请求在 hedge_delay 秒内未返回时，向第二个服务商发送相同请求，取先返回的结果
+  （落败的请求计入服务商统计的 wasted：同步请求无法取消，仍会完成并计费）
+- 服务商调用挂在路由的回调（run_manager 的子回调）下，追踪记录中可以看到实际调用的服务商
+"""
+
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional, Sequence
+from pydantic import ConfigDict
+from langchain_core.callbacks import AsyncCallbackManager, AsyncCallbackManagerForLLMRun, CallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class ProviderStats:
+    """单个服务商的滚动统计（线程安全）"""
+
+    def __init__(self, window: int = 50, failure_threshold: int = 3, max_cooldown: float = 60.0):
+        """
+        Args:
+            window: 滚动窗口大小（最近N次请求）
+            failure_threshold: 连续失败多少次后进入冷却
+            max_cooldown: 最长冷却时间（秒），冷却时间随连续失败次数指数增长
+        """
+        self.failure_threshold = failure_threshold
+        self.max_cooldown = max_cooldown
+        self._latencies = deque(maxlen=window)
+        self._results = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._cooldown_until = 0.0
+        self._in_flight = 0
+        self._wasted = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+
+    def record(self, latency: float, ok: bool) -> None:
+        """记录一次请求结果"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._results.append(ok)
+            if ok:
+                self._latencies.append(latency)
+                self._consecutive_failures = 0
+                self._cooldown_until = 0.0
+            else:
+                self._consecutive_failures += 1
+                if self._consecutive_failures >= self.failure_threshold:
+                    extra = self._consecutive_failures - self.failure_threshold
+                    cooldown = min(self.max_cooldown, 2.0 ** extra)
+                    self._cooldown_until = time.monotonic() + cooldown
+
+    def cancel(self) -> None:
+        """请求被取消（异步对冲中落败），不计入延迟统计"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def waste(self) -> None:
+        """记录一次结果被丢弃的重复请求（对冲中落败，请求已发出，可能已计费）"""
+        with self._lock:
+            self._wasted += 1
+
+    @property
+    def consecutive_failures(self) -> int:
+        return self._consecutive_failures
+
+    @property
+    def healthy(self) -> bool:
+        """不在冷却期，且窗口内错误率不超过50%"""
+        with self._lock:
+            if time.monotonic() < self._cooldown_until:
+                return False
+            if len(self._results) >= 4 and self._results.count(False) * 2 > len(self._results):
+                return False
+            return True
+
+    def _percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def score(self) -> float:
+        """路由评分（越小越好）：p50延迟；没有样本时为0，优先探测"""
+        with self._lock:
+            p50 = self._percentile(0.5)
+            return p50 if p50 is not None else 0.0
+
+    def snapshot(self) -> dict:
+        """统计快照"""
+        with self._lock:
+            total = len(self._results)
+            errors = self._results.count(False)
+            return {
+                "requests": total,
+                "error_rate": round(errors / total, 3) if total else 0.0,
+                "p50": self._percentile(0.5),
+                "p99": self._percentile(0.99),
+                "in_flight": self._in_flight,
+                "wasted": self._wasted,
+                "consecutive_failures": self._consecutive_failures,
+                "cooling_down": time.monotonic() < self._cooldown_until,
+            }
+
+
+# 进程内共享的服务商统计，多个 Agent 实例共用
+_shared_stats: Dict[str, ProviderStats] = {}
+_shared_stats_lock = threading.Lock()
+
+# 对冲请求使用的线程池
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_provider_stats(name: str) -> ProviderStats:
+    """获取（必要时创建）进程内共享的服务商统计"""
+    with _shared_stats_lock:
+        stats = _shared_stats.get(name)
+        if stats is None:
+            stats = ProviderStats()
+            _shared_stats[name] = stats
+        return stats
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-router")
+        return _executor
+
+
+class RouterChatModel(BaseChatModel):
+    """
+    路由 LLM - 包装多个服务商的 ChatModel
+
+    用法:
+        router = RouterChatModel(providers={"deepseek": llm1, "zhipu": llm2}, hedge_delay=2.0)
+        agent = create_agent(model=router, tools=tools)
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    providers: Dict[str, Any]
+    """服务商名称 -> ChatModel（或 bind_tools 之后的 Runnable）"""
+
+    hedge_delay: Optional[float] = None
+    """对冲延迟（秒），None 表示不发送对冲请求"""
+
+    stats: Any = None
+    """服务商名称 -> ProviderStats，默认使用进程内共享统计（声明为 Any，避免 pydantic 校验时复制字典）"""
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        if self.stats is None:
+            self.stats = {}
+        for name in self.providers:
+            if name not in self.stats:
+                self.stats[name] = get_provider_stats(name)
+
+    @property
+    def _llm_type(self) -> str:
+        return "provider-router"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"providers": list(self.providers), "hedge_delay": self.hedge_delay}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "RouterChatModel":
+        """为每个服务商绑定工具，返回共享统计的新路由"""
+        return RouterChatModel(
+            providers={name: llm.bind_tools(tools, **kwargs) for name, llm in self.providers.items()},
+            hedge_delay=self.hedge_delay,
+            stats=self.stats
+        )
+
+    def ranked_providers(self) -> List[str]:
+        """按路由优先级排序：健康的在前，最近失败过的靠后，再按p50延迟升序"""
+        return sorted(
+            self.providers,
+            key=lambda name: (
+                not self.stats[name].healthy,
+                self.stats[name].consecutive_failures > 0,
+                self.stats[name].score()
+            )
+        )
+
+    def stats_snapshot(self) -> Dict[str, dict]:
+        """所有服务商的统计快照"""
+        return {name: self.stats[name].snapshot() for name in self.providers}
+
+    # ---------- 同步 ----------
+
+    @staticmethod
+    def _config(name: str, run_manager) -> Optional[dict]:
+        """
+        服务商调用的配置：作为路由这次运行的子运行（追踪中标记服务商名称）
+
+        LLM 的 run_manager 没有 get_child，按 ParentRunManager.get_child 的方式构造子回调
+        """
+        if run_manager is None:
+            return None
+        manager_class = AsyncCallbackManager if isinstance(run_manager, AsyncCallbackManagerForLLMRun) else CallbackManager
+        manager = manager_class(handlers=[], parent_run_id=run_manager.run_id)
+        manager.set_handlers(run_manager.inheritable_handlers)
+        manager.add_tags(run_manager.inheritable_tags)
+        manager.add_metadata(run_manager.inheritable_metadata)
+        manager.add_tags([f"provider:{name}"], inherit=False)
+        return {"callbacks": manager}
+
+    def _call(self, name: str, messages: List[BaseMessage], stop: Optional[List[str]],
+              run_manager=None, **kwargs) -> BaseMessage:
+        """调用单个服务商并记录统计"""
+        stats = self.stats[name]
+        stats.start()
+        start = time.perf_counter()
+        try:
+            message = self.providers[name].invoke(messages, config=self._config(name, run_manager), stop=stop, **kwargs)
+        except Exception:
+            stats.record(time.perf_counter() - start, ok=False)
+            raise
+        stats.record(time.perf_counter() - start, ok=True)
+        return message
+
+    def _result(self, name: str, message: BaseMessage) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"provider": name})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        ranked = self.ranked_providers()
+        last_error: Optional[Exception] = None
+
+        if self.hedge_delay is not None and len(ranked) >= 2:
+            try:
+                name, message = self._hedged(ranked[0], ranked[1], messages, stop, run_manager, **kwargs)
+                return self._result(name, message)
+            except Exception as e:
+                last_error = e
+            ranked = ranked[2:]
+
+        # 顺序故障切换
+        for name in ranked:
+            try:
+                return self._result(name, self._call(name, messages, stop, run_manager, **kwargs))
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _hedged(self, primary: str, secondary: str, messages, stop, run_manager=None, **kwargs):
+        """主请求超过 hedge_delay 未返回时发送对冲请求，返回 (服务商, 消息)"""
+        executor = _get_executor()
+
+        def submit(name: str):
+            # 线程池不会传递 contextvars（回调和追踪的上下文），每个请求复制一份当前上下文
+            context = contextvars.copy_context()
+            return executor.submit(context.run, self._call, name, messages, stop, run_manager, **kwargs)
+
+        futures = {submit(primary): primary}
+        done, _ = wait(futures, timeout=self.hedge_delay)
+        if not done or next(iter(done)).exception() is not None:
+            futures[submit(secondary)] = secondary
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # 落败的请求无法取消，继续在后台完成（延迟统计照常记录），结果丢弃并计为浪费
+                    for loser in pending:
+                        self.stats[futures[loser]].waste()
+                    return futures[future], future.result()
+                last_error = future.exception()
+        raise last_error
+
+    # ---------- 异步 ----------
+
+    async def _acall(self, name: str, messages: List[BaseMessage], stop: Optional[List[str]],
+                     run_manager=None, **kwargs) -> BaseMessage:
+        stats = self.stats[name]
+        stats.start()
+        start = time.perf_counter()
+        try:
+            message = await self.providers[name].ainvoke(messages, config=self._config(name, run_manager),
+                                                         stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            stats.cancel()
+            raise
+        except Exception:
+            stats.record(time.perf_counter() - start, ok=False)
+            raise
+        stats.record(time.perf_counter() - start, ok=True)
+        return message
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        ranked = self.ranked_providers()
+        last_error: Optional[Exception] = None
+
+        if self.hedge_delay is not None and len(ranked) >= 2:
+            try:
+                name, message = await self._ahedged(ranked[0], ranked[1], messages, stop, run_manager, **kwargs)
+                return self._result(name, message)
+            except Exception as e:
+                last_error = e
+            ranked = ranked[2:]
+
+        for name in ranked:
+            try:
+                return self._result(name, await self._acall(name, messages, stop, run_manager, **kwargs))
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def _ahedged(self, primary: str, secondary: str, messages, stop, run_manager=None, **kwargs):
+        """异步对冲：先返回的结果胜出，落败的请求被取消（计为浪费）"""
+        tasks = {asyncio.ensure_future(self._acall(primary, messages, stop, run_manager, **kwargs)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+        if not done or next(iter(done)).exception() is not None:
+            tasks[asyncio.ensure_future(self._acall(secondary, messages, stop, run_manager, **kwargs))] = secondary
+
+        pending = set(tasks)
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        for loser in pending:
+                            self.stats[tasks[loser]].waste()
+                        return tasks[task], task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
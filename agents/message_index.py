@@ -0,0 +1,121 @@
+"""
+消息索引 - 单遍解析Agent消息，提取计划、ReAct步骤和最终答案
+按 tool_call_id 建立索引，工具调用与 ToolMessage 的匹配为 O(1)，
+既可以在流式执行时逐条增量构建，也可以对完整消息列表一次性构建
+"""
+
+from typing import Dict, List, Optional
+
+
+# 识别任务规划的关键词
+PLAN_KEYWORDS = ["步骤", "计划", "首先", "然后", "接下来", "使用", "我将"]
+
+
+def is_ai_message(msg) -> bool:
+    """是否为AI消息（AIMessage / AIMessageChunk）"""
+    return 'AI' in type(msg).__name__
+
+
+class MessageIndex:
+    """
+    ReAct 消息索引
+
+    用法:
+        index = MessageIndex()
+        for msg in messages:
+            index.add(msg)
+        index.plan, index.react_steps, index.final_output()
+    """
+
+    def __init__(self, plan_keywords: Optional[List[str]] = None):
+        """
+        Args:
+            plan_keywords: 识别计划的关键词，默认 PLAN_KEYWORDS
+        """
+        self.plan_keywords = plan_keywords or PLAN_KEYWORDS
+        self.plan = ""
+        self.react_steps: List[dict] = []
+        self.message_count = 0
+        # tool_call_id -> 还在等待观察结果的步骤
+        self._pending_steps: Dict[str, dict] = {}
+        # 没有工具调用的AI回复（最终答案候选），按出现顺序
+        self._answers: List[str] = []
+        self._last_content = None
+
+    @classmethod
+    def from_messages(cls, messages: List, plan_keywords: Optional[List[str]] = None) -> "MessageIndex":
+        """对完整消息列表构建索引"""
+        index = cls(plan_keywords)
+        for msg in messages:
+            index.add(msg)
+        return index
+
+    def add(self, msg) -> List[dict]:
+        """
+        加入一条消息
+
+        Returns:
+            这条消息新产生的步骤（AI消息中的工具调用）
+        """
+        self.message_count += 1
+        content = getattr(msg, 'content', None)
+        if content:
+            self._last_content = content
+
+        # ToolMessage：填充对应步骤的观察结果
+        tool_call_id = getattr(msg, 'tool_call_id', None)
+        if tool_call_id is not None:
+            step_data = self._pending_steps.pop(tool_call_id, None)
+            if step_data is not None:
+                step_data["observation"] = content if content is not None else str(msg)
+            return []
+
+        if not is_ai_message(msg):
+            return []
+
+        # 计划：包含关键词的最长AI回复
+        if content and any(keyword in content for keyword in self.plan_keywords):
+            if not self.plan or len(content) > len(self.plan):
+                self.plan = content
+
+        tool_calls = getattr(msg, 'tool_calls', None)
+        if not tool_calls:
+            if content:
+                self._answers.append(content)
+            return []
+
+        new_steps = []
+        for tool_call in tool_calls:
+            step_data = {
+                "step": len(self.react_steps) + 1,
+                "tool": tool_call.get('name', 'unknown'),
+                "args": tool_call.get('args', {}),
+                "observation": ""
+            }
+            self.react_steps.append(step_data)
+            self._pending_steps[tool_call.get('id')] = step_data
+            new_steps.append(step_data)
+        return new_steps
+
+    def extend(self, messages: List) -> None:
+        """批量加入消息"""
+        for msg in messages:
+            self.add(msg)
+
+    def final_output(self, exclude_plan: bool = True) -> Optional[str]:
+        """
+        最终答案：最后一条没有工具调用的AI回复
+
+        Args:
+            exclude_plan: 是否跳过与计划文本相同的回复
+        """
+        for answer in reversed(self._answers):
+            if exclude_plan and answer == self.plan:
+                continue
+            return answer
+        return None
+
+    @property
+    def last_content(self):
+        """最后一条有内容的消息（任意类型）"""
+        return self._last_content
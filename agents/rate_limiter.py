@@ -0,0 +1,459 @@
+"""
+LLM 客户端限流
+- 按 服务商(base_url) + API Key 限流，进程内所有 Agent 共享同一个限流器
+- 令牌桶：每分钟请求数（RPM）、每分钟 token 数（TPM）
+- 并发上限：同时在途的请求数
+- 遇到 429 时按带抖动的指数退避重试，不再把过载错误抛给 Agent 触发整轮重跑
+  （底层 openai 客户端不再自行重试，max_retries=0：每次重试都重新经过限流器；
+  连接错误、超时、5xx 等 openai SDK 会重试的错误也在这里重试）
+- 限流参数通过环境变量配置（0 表示不限制）：
+    LLM_RPM                每分钟请求数
+    LLM_TPM                每分钟 token 数
+    LLM_MAX_IN_FLIGHT      最大并发请求数
+    LLM_RATE_LIMIT_RETRIES 429 等临时错误的最大重试次数（默认5）
+"""
+
+import os
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, AsyncIterator, List, Optional, Union
+from langchain_core.callbacks.manager import handle_event, ahandle_event
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from agents.tracing import QUEUE_EVENT
+
+
+def _env_int(name: str, default: int = 0) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """是否为服务商返回的 429 限流错误"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return type(error).__name__ == "RateLimitError"
+
+
+# openai SDK 会重试的状态码（另外还有 5xx）：请求超时、锁冲突、限流
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """是否为可以重试的临时错误（与 openai SDK 的重试条件一致）"""
+    if is_rate_limit_error(error):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS or status >= 500
+    # langchain_openai 把 openai 的异常包装为子类（如 OpenAIConnectionError），按继承链判断
+    return any(cls.__name__ in ("APIConnectionError", "APITimeoutError") for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """服务商在 Retry-After 响应头中要求的等待秒数"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """粗略估算 prompt token 数（UTF-8 字节数 / 4，中文约 0.75 token/字）"""
+    size = 0
+    for msg in messages:
+        content = msg.content if isinstance(msg.content, str) else str(msg.content)
+        size += len(content.encode("utf-8"))
+        tool_calls = getattr(msg, "tool_calls", None)
+        if tool_calls:
+            size += len(str(tool_calls).encode("utf-8"))
+    return max(1, size // 4)
+
+
+class TokenBucket:
+    """
+    令牌桶（线程安全）
+
+    预约式：reserve() 立即扣除并返回需要等待的秒数，余额可以为负，
+    后来的请求自然排在前面请求之后，不会饿死大请求
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """预约 amount 个令牌，返回需要等待的秒数"""
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """按实际用量修正（delta > 0 表示实际比预估多用了）"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class InFlightLimit:
+    """
+    并发上限（线程和多个事件循环共用，先到先得）
+
+    同步调用阻塞在 threading.Event 上，异步调用等待 future，不轮询；
+    release 把名额直接交给排在最前面的等待者
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._used = 0
+        self._waiters: Deque[Union[threading.Event, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._used < self.limit and not self._waiters:
+                self._used += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self) -> None:
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            if self._used < self.limit and not self._waiters:
+                self._used += 1
+                return
+            self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                    raise
+            # 取消前名额已经交给了本请求（或正在交给，由 _grant 转交下一个）
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _grant(self, future: asyncio.Future) -> None:
+        """在等待者的事件循环中执行：等待者已取消时把名额转交下一个"""
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                try:
+                    waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+                    return
+                except RuntimeError:
+                    continue  # 事件循环已关闭
+            self._used -= 1
+
+
+class RateLimiter:
+    """单个 服务商 + API Key 的限流器"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_in_flight: int = 0,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Args:
+            rpm: 每分钟请求数上限（0=不限制）
+            tpm: 每分钟 token 数上限（0=不限制）
+            max_in_flight: 最大并发请求数（0=不限制）
+            max_retries: 429 最大重试次数
+            base_delay: 退避初始等待秒数
+            max_delay: 退避最长等待秒数
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._request_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self._token_bucket = TokenBucket(tpm) if tpm > 0 else None
+        self._semaphore = InFlightLimit(max_in_flight) if max_in_flight > 0 else None
+
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._max_waiting = 0
+        self._requests = 0
+        self._throttled = 0
+        self._total_wait = 0.0
+
+    # ---------- 排队 ----------
+
+    def _enter_queue(self) -> None:
+        with self._lock:
+            self._waiting += 1
+            self._max_waiting = max(self._max_waiting, self._waiting)
+
+    def _leave_queue(self, waited: float) -> None:
+        with self._lock:
+            self._waiting -= 1
+            self._in_flight += 1
+            self._requests += 1
+            self._total_wait += waited
+
+    def _reserve(self, tokens: int) -> float:
+        """预约请求和 token 额度，返回需要等待的秒数"""
+        delay = 0.0
+        if self._request_bucket is not None:
+            delay = max(delay, self._request_bucket.reserve(1))
+        if self._token_bucket is not None:
+            delay = max(delay, self._token_bucket.reserve(tokens))
+        return delay
+
+    def acquire(self, tokens: int = 1) -> float:
+        """阻塞直到可以发送请求，返回排队等待的秒数"""
+        start = time.monotonic()
+        self._enter_queue()
+        try:
+            if self._semaphore is not None:
+                self._semaphore.acquire()
+            delay = self._reserve(tokens)
+            if delay > 0:
+                time.sleep(delay)
+        except BaseException:
+            with self._lock:
+                self._waiting -= 1
+            raise
+        waited = time.monotonic() - start
+        self._leave_queue(waited)
+        return waited
+
+    async def aacquire(self, tokens: int = 1) -> float:
+        """异步等待直到可以发送请求（不阻塞事件循环），返回排队等待的秒数"""
+        start = time.monotonic()
+        self._enter_queue()
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.aacquire()
+            delay = self._reserve(tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            with self._lock:
+                self._waiting -= 1
+            raise
+        waited = time.monotonic() - start
+        self._leave_queue(waited)
+        return waited
+
+    def release(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None) -> None:
+        """请求结束，按实际 token 用量修正令牌桶"""
+        with self._lock:
+            self._in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+        if self._token_bucket is not None and actual_tokens is not None:
+            self._token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    # ---------- 退避 ----------
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """第 attempt 次重试前的等待秒数（指数退避 + 抖动，不少于服务商要求的 Retry-After）"""
+        with self._lock:
+            self._throttled += 1
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.5)
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            delay = max(delay, min(requested, self.max_delay))
+        return delay
+
+    def metrics(self) -> dict:
+        """排队和限流指标"""
+        with self._lock:
+            return {
+                "queue_depth": self._waiting,
+                "max_queue_depth": self._max_waiting,
+                "in_flight": self._in_flight,
+                "requests": self._requests,
+                "throttled": self._throttled,
+                "avg_wait": round(self._total_wait / self._requests, 3) if self._requests else 0.0,
+                "limits": {"rpm": self.rpm, "tpm": self.tpm, "max_in_flight": self.max_in_flight},
+            }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(base_url: Optional[str], api_key: Optional[str]) -> RateLimiter:
+    """获取 服务商 + API Key 对应的进程内共享限流器（参数来自环境变量）"""
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    key = f"{(base_url or '').rstrip('/')}#{key_hash}"
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(
+                rpm=_env_int("LLM_RPM"),
+                tpm=_env_int("LLM_TPM"),
+                max_in_flight=_env_int("LLM_MAX_IN_FLIGHT"),
+                max_retries=_env_int("LLM_RATE_LIMIT_RETRIES", 5)
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def _report_wait(run_manager, waited: float) -> None:
+    """把排队时间通知回调（RunTracer 记录为模型调用的 queue 时间）"""
+    if run_manager is not None:
+        handle_event(run_manager.handlers, "on_custom_event", "ignore_custom_event", QUEUE_EVENT,
+                     {"wait": waited}, run_id=run_manager.run_id, tags=run_manager.tags,
+                     metadata=run_manager.metadata)
+
+
+async def _areport_wait(run_manager, waited: float) -> None:
+    if run_manager is not None:
+        await ahandle_event(run_manager.handlers, "on_custom_event", "ignore_custom_event", QUEUE_EVENT,
+                            {"wait": waited}, run_id=run_manager.run_id, tags=run_manager.tags,
+                            metadata=run_manager.metadata)
+
+
+def _usage_tokens(message) -> Optional[int]:
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("total_tokens")
+    return None
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+    """
+    带限流的 ChatOpenAI
+
+    与 ChatOpenAI 用法相同；同一 base_url + API Key 的所有实例共享限流器
+    """
+
+    max_retries: Optional[int] = 0
+    """底层 openai 客户端不重试：重试由本类负责，每次都经过限流器"""
+
+    @property
+    def request_limiter(self) -> RateLimiter:
+        """共享限流器（BaseChatModel 已有 rate_limiter 字段，这里换个名字）"""
+        api_key = self.openai_api_key.get_secret_value() if self.openai_api_key else None
+        return get_rate_limiter(self.openai_api_base, api_key)
+
+    def _estimate(self, messages: List[BaseMessage]) -> int:
+        return estimate_tokens(messages) + (self.max_tokens or 0)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        limiter = self.request_limiter
+        estimated = self._estimate(messages)
+        attempt = 0
+        while True:
+            _report_wait(run_manager, limiter.acquire(estimated))
+            actual = None
+            try:
+                result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                if result.generations:
+                    actual = _usage_tokens(result.generations[0].message)
+                return result
+            except Exception as e:
+                if not is_retryable_error(e) or attempt >= limiter.max_retries:
+                    raise
+                error = e
+            finally:
+                limiter.release(estimated, actual)
+            time.sleep(limiter.backoff(attempt, error))
+            attempt += 1
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        limiter = self.request_limiter
+        estimated = self._estimate(messages)
+        attempt = 0
+        while True:
+            await _areport_wait(run_manager, await limiter.aacquire(estimated))
+            actual = None
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                if result.generations:
+                    actual = _usage_tokens(result.generations[0].message)
+                return result
+            except Exception as e:
+                if not is_retryable_error(e) or attempt >= limiter.max_retries:
+                    raise
+                error = e
+            finally:
+                limiter.release(estimated, actual)
+            await asyncio.sleep(limiter.backoff(attempt, error))
+            attempt += 1
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # 只有在还没有输出任何内容时才重试，避免重复输出
+        limiter = self.request_limiter
+        estimated = self._estimate(messages)
+        attempt = 0
+        while True:
+            _report_wait(run_manager, limiter.acquire(estimated))
+            actual = None
+            started = False
+            try:
+                for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    actual = _usage_tokens(chunk.message) or actual
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not is_retryable_error(e) or attempt >= limiter.max_retries:
+                    raise
+                error = e
+            finally:
+                limiter.release(estimated, actual)
+            time.sleep(limiter.backoff(attempt, error))
+            attempt += 1
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        limiter = self.request_limiter
+        estimated = self._estimate(messages)
+        attempt = 0
+        while True:
+            await _areport_wait(run_manager, await limiter.aacquire(estimated))
+            actual = None
+            started = False
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    actual = _usage_tokens(chunk.message) or actual
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not is_retryable_error(e) or attempt >= limiter.max_retries:
+                    raise
+                error = e
+            finally:
+                limiter.release(estimated, actual)
+            await asyncio.sleep(limiter.backoff(attempt, error))
+            attempt += 1
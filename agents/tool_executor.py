@@ -0,0 +1,189 @@
+"""
+并行工具执行器
+同一条AI消息中的多个 tool_calls 并发执行：
+- 只读工具完全并发
+- 写文件工具按文件路径串行（同一路径同一时刻只有一个写入；write_files 按固定顺序锁住涉及的全部路径）
+- 其他有副作用的工具（终端命令、pip安装等）全局串行
+- 结果按 tool_calls 的原始顺序回放
+"""
+
+import os
+import json
+import asyncio
+import threading
+from contextlib import ExitStack
+from typing import Dict, List
+from langchain_core.tools import Tool
+
+
+# 只读工具（tools.py / game_dev_tools.py），可以安全并发
+READ_ONLY_TOOLS = {
+    "read_file",
+    "list_directory",
+    "calculator",
+    "web_search",
+    "get_webpage",
+    "get_current_time",
+    "analyze_json",
+    "analyze_python_file",
+    "find_function",
+    "analyze_project",
+    "find_symbol",
+    "search_code",
+    "check_syntax",
+    "pip_list",
+    "check_python_version",
+    "git_status",
+    "recall_observation",
+    "list_backups",
+}
+
+# 写文件工具，输入格式为 "文件路径|||..."，按路径加锁
+PATH_WRITE_TOOLS = {
+    "write_file",
+    "replace_function",
+    "insert_code",
+    "create_game_file",
+    "backup_file",
+    "restore_backup",
+    "create_test_file",
+}
+
+# 多文件写入工具，输入为 JSON 编辑列表（每项带 path）
+MULTI_PATH_WRITE_TOOLS = {
+    "write_files",
+}
+
+# 没有明确路径的副作用工具共用的锁键
+EXCLUSIVE_KEY = "__exclusive__"
+
+
+class ParallelToolExecutor:
+    """并行工具执行器 - 包装工具函数并提供 LangGraph 并发配置"""
+
+    def __init__(self, max_workers: int = 4):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 同一步骤内最多并发执行的工具数（线程池大小）
+        """
+        self.max_workers = max(1, max_workers)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def config(self) -> dict:
+        """传给 agent.stream / agent.invoke 的运行配置"""
+        return {"max_concurrency": self.max_workers}
+
+    def _get_lock(self, key: str) -> threading.Lock:
+        """获取（必要时创建）指定键的锁"""
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[key] = lock
+            return lock
+
+    @staticmethod
+    def _lock_keys(tool_name: str, tool_input) -> List[str]:
+        """计算工具调用需要持有的锁键（已排序，按顺序加锁避免死锁），只读工具返回空列表"""
+        if tool_name in READ_ONLY_TOOLS:
+            return []
+
+        if tool_name in PATH_WRITE_TOOLS and isinstance(tool_input, str):
+            filepath = tool_input.split("|||", 1)[0].strip()
+            if filepath:
+                return [os.path.abspath(filepath)]
+
+        if tool_name in MULTI_PATH_WRITE_TOOLS and isinstance(tool_input, str):
+            try:
+                edits = json.loads(tool_input)
+                if isinstance(edits, dict):
+                    edits = edits.get("edits", [edits])
+                paths = {os.path.abspath(str(edit["path"]).strip()) for edit in edits}
+            except (ValueError, TypeError, KeyError, AttributeError):
+                paths = set()
+            if paths:
+                return sorted(paths)
+
+        return [EXCLUSIVE_KEY]
+
+    def _wrap_func(self, tool_name: str, func):
+        """为工具函数加上按需加锁的逻辑"""
+        def wrapped(*args, **kwargs):
+            tool_input = args[0] if args else next(iter(kwargs.values()), None)
+            keys = self._lock_keys(tool_name, tool_input)
+            if not keys:
+                return func(*args, **kwargs)
+            with ExitStack() as stack:
+                for key in keys:
+                    stack.enter_context(self._get_lock(key))
+                return func(*args, **kwargs)
+
+        return wrapped
+
+    @staticmethod
+    def _async_wrap_func(func):
+        """异步包装：在线程中执行同步工具函数，不阻塞事件循环"""
+        async def wrapped(*args, **kwargs):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+        return wrapped
+
+    def wrap(self, tools: List[Tool]) -> List[Tool]:
+        """包装工具列表（同时提供同步和异步入口）"""
+        wrapped_tools = []
+        for tool in tools:
+            if isinstance(tool, Tool) and tool.func is not None:
+                func = self._wrap_func(tool.name, tool.func)
+                wrapped_tools.append(Tool(
+                    name=tool.name,
+                    func=func,
+                    coroutine=self._async_wrap_func(func),
+                    description=tool.description
+                ))
+            else:
+                wrapped_tools.append(tool)
+        return wrapped_tools
+
+
+class ToolResultOrderer:
+    """
+    工具结果排序器
+
+    并发执行时 ToolMessage 按完成顺序到达，这里按 AI 消息中
+    tool_calls 的顺序缓冲并释放，保证观察结果与步骤一一对应
+    """
+
+    def __init__(self):
+        self._pending: List[str] = []
+        self._buffer: Dict[str, object] = {}
+
+    def expect(self, tool_calls: List[dict]) -> None:
+        """登记一条AI消息中的工具调用顺序"""
+        for tool_call in tool_calls:
+            call_id = tool_call.get("id")
+            if call_id:
+                self._pending.append(call_id)
+
+    def add(self, msg) -> List:
+        """加入一条 ToolMessage，返回现在可以按序释放的消息列表"""
+        call_id = getattr(msg, "tool_call_id", None)
+        if call_id not in self._pending:
+            # 未登记的结果直接释放
+            return [msg]
+
+        self._buffer[call_id] = msg
+        ready = []
+        while self._pending and self._pending[0] in self._buffer:
+            ready.append(self._buffer.pop(self._pending.pop(0)))
+        return ready
+
+    def flush(self) -> List:
+        """释放所有剩余结果（流结束时调用）"""
+        ready = [self._buffer.pop(call_id) for call_id in self._pending if call_id in self._buffer]
+        self._pending = []
+        ready.extend(self._buffer.values())
+        self._buffer = {}
+        return ready
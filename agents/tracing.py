@@ -0,0 +1,305 @@
+"""
+执行追踪 - 记录 ReAct 循环中每一步的耗时和 token 用量
+- 模型调用：排队时间（限流等待）、首 token 时间（TTFT，仅流式调用）、总耗时、prompt / completion tokens
+- 工具调用：耗时、输出字节数
+- stream_callback 回调：分发次数和耗时
+结果以 span 列表的形式附加到 run 的返回值中，并可导出为 OpenTelemetry（OTLP JSON）格式的本地文件
+
+用法:
+    tracer = RunTracer(thread_id)
+    agent.invoke(inputs, config={"callbacks": [tracer], ...})
+    tracer.finish()
+    tracer.summary(), tracer.export("traces.jsonl")
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# 限流器排队等待时发出的自定义回调事件名（见 rate_limiter.RateLimitedChatOpenAI）
+QUEUE_EVENT = "llm_queue_wait"
+
+# OTLP span kind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+
+def _new_span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _ms(start_ns: int, end_ns: int) -> float:
+    return round((end_ns - start_ns) / 1e6, 3)
+
+
+def _output_size(output: Any) -> int:
+    """工具输出的字节数（ToolMessage 取 content）"""
+    content = getattr(output, "content", output)
+    if not isinstance(content, str):
+        content = str(content)
+    return len(content.encode("utf-8"))
+
+
+class RunTracer(BaseCallbackHandler):
+    """
+    单次执行的追踪器（LangChain 回调处理器，线程安全）
+
+    一次 run 使用一个实例；工具在线程池中执行，回调可能来自不同线程
+    """
+
+    def __init__(self, trace_id: Optional[str] = None, name: str = "agent.run"):
+        """
+        Args:
+            trace_id: 追踪ID（32位十六进制），默认随机生成；UniversalAgent 使用 thread_id
+            name: 根 span 名称
+        """
+        super().__init__()
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.root = {
+            "name": name,
+            "kind": "run",
+            "span_id": _new_span_id(),
+            "parent_span_id": None,
+            "start_ns": time.time_ns(),
+            "end_ns": None,
+            "status": "ok",
+            "attributes": {},
+        }
+        self.spans: List[dict] = []
+        self._open: Dict[Any, dict] = {}
+        self._finished: List[dict] = []
+        self._callback_stats = {"events": 0, "time_ns": 0, "max_ns": 0, "by_type": {}}
+        self._lock = threading.Lock()
+
+    # ---------- span ----------
+
+    def _start(self, run_id, name: str, kind: str, attributes: dict) -> None:
+        span = {
+            "name": name,
+            "kind": kind,
+            "span_id": _new_span_id(),
+            "parent_span_id": self.root["span_id"],
+            "start_ns": time.time_ns(),
+            "end_ns": None,
+            "status": "ok",
+            "attributes": attributes,
+        }
+        with self._lock:
+            self._open[run_id] = span
+
+    def _end(self, run_id, status: str = "ok", **attributes) -> Optional[dict]:
+        with self._lock:
+            span = self._open.pop(run_id, None)
+            if span is None:
+                return None
+            span["end_ns"] = time.time_ns()
+            span["status"] = status
+            span["attributes"].update(attributes)
+            span["attributes"]["duration_ms"] = _ms(span["start_ns"], span["end_ns"])
+            self.spans.append(span)
+            self._finished.append(span)
+            return span
+
+    # ---------- 模型调用 ----------
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None,
+                            tags=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        model = metadata.get("ls_model_name") or params.get("model") or params.get("model_name") or "unknown"
+        self._start(run_id, f"llm {model}", "llm", {
+            "llm.model": model,
+            "llm.provider": metadata.get("ls_provider", ""),
+            "llm.messages": len(messages[0]) if messages else 0,
+            "llm.queue_ms": 0.0,
+        })
+
+    def on_custom_event(self, name, data, *, run_id, tags=None, metadata=None, **kwargs):
+        if name != QUEUE_EVENT:
+            return
+        with self._lock:
+            span = self._open.get(run_id)
+            if span is not None:
+                span["attributes"]["llm.queue_ms"] += round(data.get("wait", 0.0) * 1000, 3)
+
+    def on_llm_new_token(self, token, *, chunk=None, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            span = self._open.get(run_id)
+            if span is not None and "llm.ttft_ms" not in span["attributes"]:
+                span["attributes"]["llm.ttft_ms"] = _ms(span["start_ns"], time.time_ns())
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        usage = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        if not usage and response.llm_output:
+            token_usage = response.llm_output.get("token_usage") or {}
+            usage = {"input_tokens": token_usage.get("prompt_tokens"),
+                     "output_tokens": token_usage.get("completion_tokens")}
+        self._end(run_id,
+                  **{"llm.prompt_tokens": usage.get("input_tokens"),
+                     "llm.completion_tokens": usage.get("output_tokens")})
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, status="error", **{"error": str(error)[:200]})
+
+    # ---------- 工具调用 ----------
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None,
+                      tags=None, metadata=None, inputs=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._start(run_id, f"tool {name}", "tool", {
+            "tool.name": name,
+            "tool.input_bytes": len(str(input_str).encode("utf-8")),
+        })
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, **{"tool.output_bytes": _output_size(output)})
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, status="error", **{"error": str(error)[:200]})
+
+    # ---------- 回调分发 ----------
+
+    def wrap_callback(self, stream_callback: Optional[Callable]) -> Optional[Callable]:
+        """包装 stream_callback，统计每次分发的耗时"""
+        if stream_callback is None:
+            return None
+
+        def traced_callback(event: dict):
+            start = time.perf_counter_ns()
+            try:
+                return stream_callback(event)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                with self._lock:
+                    stats = self._callback_stats
+                    stats["events"] += 1
+                    stats["time_ns"] += elapsed
+                    stats["max_ns"] = max(stats["max_ns"], elapsed)
+                    by_type = stats["by_type"].setdefault(event.get("type", "unknown"), {"events": 0, "time_ns": 0})
+                    by_type["events"] += 1
+                    by_type["time_ns"] += elapsed
+
+        return traced_callback
+
+    def drain(self) -> List[dict]:
+        """取出上次调用以来结束的 span（用于推送 trace 事件）"""
+        with self._lock:
+            finished, self._finished = self._finished, []
+        return [self._span_view(span) for span in finished]
+
+    # ---------- 汇总 ----------
+
+    def finish(self, status: str = "ok") -> None:
+        """结束根 span（未结束的子 span 标记为 cancelled）"""
+        with self._lock:
+            open_runs = list(self._open)
+        for run_id in open_runs:
+            self._end(run_id, status="cancelled")
+        with self._lock:
+            if self.root["end_ns"] is None:
+                self.root["end_ns"] = time.time_ns()
+                self.root["status"] = status
+                self.root["attributes"]["duration_ms"] = _ms(self.root["start_ns"], self.root["end_ns"])
+
+    def _span_view(self, span: dict) -> dict:
+        """面向 stream_callback / 返回值的 span（毫秒，省略内部字段）"""
+        view = {"name": span["name"], "kind": span["kind"], "status": span["status"],
+                "start_offset_ms": _ms(self.root["start_ns"], span["start_ns"])}
+        view.update(span["attributes"])
+        return view
+
+    def totals(self) -> dict:
+        """各类耗时和 token 汇总（毫秒）"""
+        with self._lock:
+            spans = list(self.spans)
+            callback = dict(self._callback_stats)
+            callback_by_type = {event_type: round(stats["time_ns"] / 1e6, 3)
+                                for event_type, stats in self._callback_stats["by_type"].items()}
+        llm = [s["attributes"] for s in spans if s["kind"] == "llm"]
+        tools = [s["attributes"] for s in spans if s["kind"] == "tool"]
+        ttfts = [a["llm.ttft_ms"] for a in llm if a.get("llm.ttft_ms") is not None]
+        return {
+            "wall_ms": self.root["attributes"].get("duration_ms"),
+            "llm_calls": len(llm),
+            "llm_ms": round(sum(a["duration_ms"] for a in llm), 3),
+            "llm_queue_ms": round(sum(a.get("llm.queue_ms", 0.0) for a in llm), 3),
+            "llm_ttft_avg_ms": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+            "prompt_tokens": sum(a.get("llm.prompt_tokens") or 0 for a in llm),
+            "completion_tokens": sum(a.get("llm.completion_tokens") or 0 for a in llm),
+            "tool_calls": len(tools),
+            "tool_ms": round(sum(a["duration_ms"] for a in tools), 3),
+            "tool_output_bytes": sum(a.get("tool.output_bytes", 0) for a in tools),
+            "callback_events": callback["events"],
+            "callback_ms": round(callback["time_ns"] / 1e6, 3),
+            "callback_max_ms": round(callback["max_ns"] / 1e6, 3),
+            "callback_ms_by_type": callback_by_type,
+        }
+
+    def summary(self) -> dict:
+        """返回值中的 trace 字段"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ns"])
+        return {"trace_id": self.trace_id, "totals": self.totals(), "spans": [self._span_view(s) for s in spans]}
+
+    # ---------- OpenTelemetry 导出 ----------
+
+    @staticmethod
+    def _otlp_value(value: Any) -> dict:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _otlp_span(self, span: dict) -> dict:
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "kind": SPAN_KIND_CLIENT if span["kind"] in ("llm", "tool") else SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(span["start_ns"]),
+            "endTimeUnixNano": str(span["end_ns"] or span["start_ns"]),
+            "attributes": [{"key": key, "value": self._otlp_value(value)}
+                           for key, value in span["attributes"].items() if value is not None],
+            "status": {"code": 1 if span["status"] == "ok" else 2},
+        }
+        if span["parent_span_id"]:
+            otlp["parentSpanId"] = span["parent_span_id"]
+        return otlp
+
+    def to_otlp(self, service_name: str = "ai-agent") -> dict:
+        """OTLP JSON（ExportTraceServiceRequest 格式）"""
+        root = dict(self.root)
+        root["attributes"] = dict(self.root["attributes"], **{
+            f"run.{key}": value for key, value in self.totals().items() if value is not None and not isinstance(value, dict)
+        })
+        with self._lock:
+            spans = [root] + list(self.spans)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "agents.tracing"},
+                    "spans": [self._otlp_span(span) for span in spans],
+                }],
+            }]
+        }
+
+    def export(self, path: str, service_name: str = "ai-agent") -> None:
+        """以 JSON Lines 追加写入本地文件（每次执行一行，与 OTel Collector 的 file exporter 格式相同）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        line = json.dumps(self.to_otlp(service_name), ensure_ascii=False)
+        with self._lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
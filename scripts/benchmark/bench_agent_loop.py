@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Agent 执行循环离线基准
+把 UniversalAgent / GameDevAgent / AIAgentChina 中的 LLM 替换为按脚本回放工具调用的假模型
+（scripts/benchmark/fake_llm.py），在不访问网络的情况下测量：
+- 每步框架开销（总耗时 - 模型 - 工具 - 回调 - 消息解析）
+- stream_callback 回调耗时
+- 消息解析耗时（MessageIndex）
+- 工具执行耗时
+结果输出为 JSON 报告，可以在不同提交之间对比
+
+用法:
+    python scripts/benchmark/bench_agent_loop.py
+    python scripts/benchmark/bench_agent_loop.py --agents universal game --repeat 10 --output before.json
+    python scripts/benchmark/bench_agent_loop.py --transcript recorded.json --compare before.json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import functools
+import tempfile
+import subprocess
+from datetime import datetime
+from statistics import median
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rich.console import Console
+from rich.table import Table
+from fake_llm import ScriptedChatModel, load_transcript
+
+console = Console()
+
+# 默认脚本：覆盖文件读写、目录、计算和代码分析，一轮中包含并发工具调用
+DEFAULT_TRANSCRIPT = [
+    {"content": "我将按以下步骤完成任务：1. 创建文件 2. 检查文件 3. 分析代码 4. 总结",
+     "tool_calls": [{"name": "write_file",
+                     "args": {"__arg1": "bench_demo.py|||def add(a, b):\n    return a + b\n\n"
+                                        "def mul(a, b):\n    return a * b\n\nprint(add(1, 2), mul(3, 4))\n"}}]},
+    {"content": "文件已创建，接下来读取文件并查看目录",
+     "tool_calls": [{"name": "read_file", "args": {"__arg1": "bench_demo.py"}},
+                    {"name": "list_directory", "args": {"__arg1": "."}}]},
+    {"content": "然后计算一下结果",
+     "tool_calls": [{"name": "calculator", "args": {"__arg1": "(1 + 2) * 3 * 4"}}]},
+    {"content": "接下来分析代码结构",
+     "tool_calls": [{"name": "analyze_python_file", "args": {"__arg1": "bench_demo.py"}}]},
+    {"content": "任务完成！已创建 bench_demo.py，包含 add 和 mul 两个函数，代码结构正常。"},
+]
+
+AGENT_NAMES = ["universal", "game", "china"]
+
+# 各 Agent 模块中创建 LLM 使用的类名（替换为假模型）
+AGENT_MODULES = {
+    "universal": "agents.agent_universal",
+    "game": "agents.agent_game",
+    "china": "agents.agent_china",
+}
+
+
+# ---------- 离线环境 ----------
+
+def block_network() -> None:
+    """禁止一切网络连接，保证基准完全离线（本地 unix socket 不受影响）"""
+    original_connect = socket.socket.connect
+
+    def guarded_connect(self, address):
+        if self.family in (socket.AF_INET, socket.AF_INET6):
+            raise RuntimeError(f"离线基准中禁止网络访问: {address}")
+        return original_connect(self, address)
+
+    socket.socket.connect = guarded_connect
+    socket.create_connection = lambda address, *args, **kwargs: (_ for _ in ()).throw(
+        RuntimeError(f"离线基准中禁止网络访问: {address}"))
+
+
+def prepare_env(workdir: str) -> None:
+    """占位 API Key（不会真正使用）、临时检查点、关闭上下文压缩以外的外部依赖"""
+    for name in ("DEEPSEEK_API_KEY", "DASHSCOPE_API_KEY"):
+        os.environ.setdefault(name, "sk-offline-benchmark")
+    os.environ["AGENT_CHECKPOINT_PATH"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ.pop("LLM_RPM", None)
+    os.environ.pop("LLM_TPM", None)
+
+
+# ---------- 计时 ----------
+
+class Timers:
+    """累计各部分耗时（安装在工具、消息索引和 LLM 上）"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.tool_time = 0.0
+        self.tool_calls = 0
+        self.parse_time = 0.0
+        self.parse_calls = 0
+        self.callback_time = 0.0
+        self.callback_events = 0
+
+    def install(self) -> None:
+        """给 Tool 执行和 MessageIndex.add 加上计时"""
+        from langchain_core.tools import Tool
+        from agents.message_index import MessageIndex
+
+        timers = self
+        original_run = Tool._run
+        original_arun = Tool._arun
+        original_add = MessageIndex.add
+
+        # functools.wraps 保留原签名（BaseTool 按签名决定是否传入 config / run_manager）
+        @functools.wraps(original_run)
+        def timed_run(tool, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_run(tool, *args, **kwargs)
+            finally:
+                timers.tool_time += time.perf_counter() - start
+                timers.tool_calls += 1
+
+        @functools.wraps(original_arun)
+        async def timed_arun(tool, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original_arun(tool, *args, **kwargs)
+            finally:
+                timers.tool_time += time.perf_counter() - start
+                timers.tool_calls += 1
+
+        @functools.wraps(original_add)
+        def timed_add(index, msg):
+            start = time.perf_counter()
+            try:
+                return original_add(index, msg)
+            finally:
+                timers.parse_time += time.perf_counter() - start
+                timers.parse_calls += 1
+
+        Tool._run = timed_run
+        Tool._arun = timed_arun
+        MessageIndex.add = timed_add
+
+    def callback(self):
+        """计时的 stream_callback（模拟前端：把事件序列化一次）"""
+        def stream_callback(event):
+            start = time.perf_counter()
+            json.dumps(event, ensure_ascii=False, default=str)
+            self.callback_time += time.perf_counter() - start
+            self.callback_events += 1
+        return stream_callback
+
+
+def install_fake_llm(turns: list, latency: float) -> ScriptedChatModel:
+    """把各 Agent 模块中的 RateLimitedChatOpenAI 替换为同一个脚本化模型"""
+    import importlib
+
+    fake = ScriptedChatModel(turns=turns, latency=latency)
+
+    def factory(model=None, **kwargs):
+        return fake
+
+    for module_name in AGENT_MODULES.values():
+        module = importlib.import_module(module_name)
+        module.RateLimitedChatOpenAI = factory
+        # Agent 的控制台输出不计入测量
+        if hasattr(module, "console"):
+            module.console = Console(quiet=True)
+    return fake
+
+
+def create_agent(name: str):
+    if name == "universal":
+        from agents.agent_universal import UniversalAgent
+        return UniversalAgent(verbose=False, scenario="general")
+    if name == "game":
+        from agents.agent_game import GameDevAgent
+        return GameDevAgent(verbose=False)
+    if name == "china":
+        from agents.agent_china import AIAgentChina
+        return AIAgentChina(verbose=False, service="deepseek")
+    raise ValueError(f"未知的 Agent: {name}")
+
+
+# ---------- 测量 ----------
+
+def measure(agent, fake: ScriptedChatModel, timers: Timers, task: str, with_callback: bool, repeat: int) -> dict:
+    """多次执行同一任务，各项指标取中位数"""
+    samples = []
+    for i in range(repeat + 1):
+        timers.reset()
+        fake.reset_stats()
+        start = time.perf_counter()
+        result = agent.run(task, stream_callback=timers.callback() if with_callback else None)
+        wall = time.perf_counter() - start
+        if i == 0:
+            continue  # 第一次为预热
+
+        llm = fake.stats()
+        steps = max(1, llm["llm_calls"])
+        overhead = wall - llm["llm_time"] - timers.tool_time - timers.callback_time - timers.parse_time
+        samples.append({
+            "wall": wall,
+            "llm_time": llm["llm_time"],
+            "tool_time": timers.tool_time,
+            "callback_time": timers.callback_time,
+            "parse_time": timers.parse_time,
+            "overhead": overhead,
+            "overhead_per_step": overhead / steps,
+            "llm_calls": llm["llm_calls"],
+            "tool_calls": timers.tool_calls,
+            "callback_events": timers.callback_events,
+            "parse_calls": timers.parse_calls,
+            "react_steps": len(result.get("react_steps", [])),
+            "error": result.get("error"),
+        })
+
+    report = {}
+    for key in samples[0]:
+        values = [sample[key] for sample in samples]
+        if key == "error":
+            report[key] = next((value for value in values if value), None)
+        elif isinstance(values[0], float):
+            report[key] = round(median(values) * 1000, 3)  # 毫秒
+        else:
+            report[key] = values[-1]
+    return report
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=PROJECT_ROOT, timeout=10).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def run_benchmark(agent_names: list, turns: list, repeat: int, latency: float) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_agent_loop_")
+    prepare_env(workdir)
+    block_network()
+
+    timers = Timers()
+    timers.install()
+    fake = install_fake_llm(turns, latency)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "llm_latency_ms": latency * 1000,
+            "transcript_turns": len(turns),
+            "unit": "ms",
+        },
+        "results": {},
+    }
+
+    original_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for name in agent_names:
+            agent = create_agent(name)
+            report["results"][name] = {
+                "no_callback": measure(agent, fake, timers, "创建 bench_demo.py 并分析", False, repeat),
+                "callback": measure(agent, fake, timers, "创建 bench_demo.py 并分析", True, repeat),
+            }
+    finally:
+        os.chdir(original_cwd)
+    return report
+
+
+# ---------- 输出 ----------
+
+SUMMARY_KEYS = ["wall", "overhead_per_step", "callback_time", "parse_time", "tool_time"]
+
+
+def print_report(report: dict) -> None:
+    table = Table(title=f"⏱️ Agent 执行循环基准 ({report['meta']['commit']}, 单位 ms)")
+    table.add_column("Agent")
+    table.add_column("模式")
+    for key in SUMMARY_KEYS:
+        table.add_column(key, justify="right")
+    table.add_column("LLM/工具/事件", justify="right")
+
+    for name, modes in report["results"].items():
+        for mode, data in modes.items():
+            table.add_row(
+                name, mode,
+                *[f"{data[key]:.2f}" for key in SUMMARY_KEYS],
+                f"{data['llm_calls']}/{data['tool_calls']}/{data['callback_events']}"
+            )
+            if data.get("error"):
+                console.print(f"[yellow]⚠️ {name}/{mode}: {data['error']}[/yellow]")
+    console.print(table)
+
+
+def print_comparison(old: dict, new: dict) -> None:
+    """对比两份报告（变化 = 新 / 旧 - 1）"""
+    table = Table(title=f"📊 对比 {old['meta']['commit']} → {new['meta']['commit']} (单位 ms)")
+    table.add_column("Agent / 模式")
+    table.add_column("指标")
+    table.add_column("旧", justify="right")
+    table.add_column("新", justify="right")
+    table.add_column("变化", justify="right")
+
+    for name, modes in new["results"].items():
+        for mode, data in modes.items():
+            previous = old.get("results", {}).get(name, {}).get(mode)
+            if not previous:
+                continue
+            for key in SUMMARY_KEYS:
+                before, after = previous.get(key), data.get(key)
+                if before is None or after is None:
+                    continue
+                change = (after / before - 1) * 100 if before else 0.0
+                color = "green" if change < -5 else "red" if change > 5 else "white"
+                table.add_row(f"{name}/{mode}", key, f"{before:.2f}", f"{after:.2f}",
+                              f"[{color}]{change:+.1f}%[/{color}]")
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent 执行循环离线基准")
+    parser.add_argument("--agents", nargs="+", default=AGENT_NAMES, choices=AGENT_NAMES, help="要测量的 Agent")
+    parser.add_argument("--transcript", help="回放的脚本文件（JSON，格式见 fake_llm.py），默认使用内置脚本")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数（另有一次预热）")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="模拟的模型延迟（秒）")
+    parser.add_argument("--output", default="bench_agent_loop.json", help="JSON 报告输出路径")
+    parser.add_argument("--compare", help="与之前的 JSON 报告对比")
+    args = parser.parse_args()
+
+    turns = load_transcript(args.transcript) if args.transcript else DEFAULT_TRANSCRIPT
+    report = run_benchmark(args.agents, turns, max(1, args.repeat), args.llm_latency)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    console.print(f"[dim]报告已保存: {args.output}[/dim]")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+消息解析性能基准
+对比旧版"方案3"（三遍扫描 + 嵌套查找 ToolMessage，O(n²)）与 MessageIndex（单遍，O(n)）
+
+用法:
+    python scripts/benchmark/bench_message_index.py
+    python scripts/benchmark/bench_message_index.py --sizes 1000 10000 --repeat 5
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from rich.console import Console
+from rich.table import Table
+from agents.message_index import MessageIndex
+
+console = Console()
+
+
+def build_transcript(num_messages: int, calls_per_turn: int = 3) -> list:
+    """构造约 num_messages 条消息的 ReAct 记录（AI工具调用 + ToolMessage + 最终答案）"""
+    messages = [HumanMessage(content="创建一个贪吃蛇游戏")]
+    messages.append(AIMessage(content="我将按以下步骤完成任务：1. 分析 2. 编写 3. 测试"))
+
+    call_id = 0
+    while len(messages) < num_messages - 1:
+        tool_calls = []
+        for _ in range(calls_per_turn):
+            call_id += 1
+            tool_calls.append({"name": "read_file", "args": {"__arg1": f"file_{call_id}.py"}, "id": f"call_{call_id}"})
+        messages.append(AIMessage(content="接下来读取文件", tool_calls=tool_calls))
+        for tool_call in tool_calls:
+            messages.append(ToolMessage(content=f"内容 {tool_call['id']}", name="read_file", tool_call_id=tool_call["id"]))
+
+    messages.append(AIMessage(content="任务完成！"))
+    return messages
+
+
+def legacy_extract(all_messages: list) -> tuple:
+    """旧版方案3的解析逻辑（保留用于对比）"""
+    plan_text = ""
+    react_steps = []
+    step_num = 0
+
+    for msg in all_messages:
+        if hasattr(msg, 'content') and msg.content:
+            if 'AI' in type(msg).__name__:
+                content = msg.content
+                if any(keyword in content for keyword in ["步骤", "计划", "首先", "然后", "接下来", "使用", "我将"]):
+                    if not plan_text or len(content) > len(plan_text):
+                        plan_text = content
+
+    for i, msg in enumerate(all_messages):
+        if hasattr(msg, 'tool_calls') and msg.tool_calls:
+            for tool_call in msg.tool_calls:
+                step_num += 1
+                step_data = {
+                    "step": step_num,
+                    "tool": tool_call.get('name', 'unknown'),
+                    "args": tool_call.get('args', {}),
+                    "observation": ""
+                }
+                for j in range(i+1, len(all_messages)):
+                    next_msg = all_messages[j]
+                    if hasattr(next_msg, 'tool_call_id') and next_msg.tool_call_id == tool_call.get('id'):
+                        step_data["observation"] = next_msg.content
+                        break
+                react_steps.append(step_data)
+
+    output = "未能获取响应"
+    for msg in reversed(all_messages):
+        if hasattr(msg, 'content') and msg.content:
+            if 'AI' in type(msg).__name__ and not (hasattr(msg, 'tool_calls') and msg.tool_calls):
+                if msg.content != plan_text:
+                    output = msg.content
+                    break
+
+    return plan_text, react_steps, output
+
+
+def indexed_extract(all_messages: list) -> tuple:
+    """MessageIndex 单遍解析"""
+    index = MessageIndex.from_messages(all_messages)
+    return index.plan, index.react_steps, index.final_output() or "未能获取响应"
+
+
+def best_of(func, messages: list, repeat: int) -> float:
+    """多次运行取最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(messages)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息解析性能基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="消息数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数")
+    args = parser.parse_args()
+
+    table = Table(title="📊 react_steps 解析耗时")
+    table.add_column("消息数", justify="right")
+    table.add_column("步骤数", justify="right")
+    table.add_column("旧版 (ms)", justify="right")
+    table.add_column("MessageIndex (ms)", justify="right")
+    table.add_column("加速比", justify="right")
+
+    for size in args.sizes:
+        messages = build_transcript(size)
+
+        # 结果必须一致
+        assert legacy_extract(messages) == indexed_extract(messages), f"解析结果不一致 (size={size})"
+
+        legacy_time = best_of(legacy_extract, messages, args.repeat)
+        indexed_time = best_of(indexed_extract, messages, args.repeat)
+        steps = len(indexed_extract(messages)[1])
+
+        table.add_row(
+            str(len(messages)),
+            str(steps),
+            f"{legacy_time * 1000:.2f}",
+            f"{indexed_time * 1000:.2f}",
+            f"{legacy_time / indexed_time:.1f}x" if indexed_time else "-"
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+工具集启动性能基准
+冷启动：新的Python进程中导入工具注册表并构建场景工具集（包含模块导入）
+增量：同上，但预先导入 langchain_core.tools（Agent进程中本来就会导入），只统计工具模块自身的开销
+热启动：同一进程内再次获取工具集（命中注册表缓存）
+
+用法:
+    python scripts/benchmark/bench_startup.py
+    python scripts/benchmark/bench_startup.py --scenarios general game_dev --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# 在子进程中执行：测量导入 + 构建耗时，并报告重依赖是否被导入
+# （requests 会被 langchain_core 间接导入，不计入）
+COLD_SCRIPT = """
+import sys, time, json
+if {preload!r}:
+    from langchain_core.tools import Tool
+start = time.perf_counter()
+from tools_package.registry import get_scenario_tools
+tools = get_scenario_tools({scenario!r})
+elapsed = time.perf_counter() - start
+heavy = [name for name in ("langchain_community", "bs4", "PIL", "duckduckgo_search", "ddgs") if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "tools": len(tools), "heavy": heavy}}))
+"""
+
+
+def measure_cold(scenario: str, repeat: int, preload: bool = False) -> dict:
+    """在全新进程中测量冷启动耗时（取最短）"""
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", COLD_SCRIPT.format(scenario=scenario, preload=preload)],
+            capture_output=True,
+            text=True,
+            cwd=PROJECT_ROOT,
+            timeout=120
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"冷启动测量失败 ({scenario}):\n{result.stderr}")
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or data["elapsed"] < best["elapsed"]:
+            best = data
+    return best
+
+
+def measure_warm(scenario: str, repeat: int) -> float:
+    """在当前进程中测量缓存命中后的耗时（取最短，秒）"""
+    from tools_package.registry import get_scenario_tools
+
+    get_scenario_tools(scenario)  # 预热
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get_scenario_tools(scenario)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工具集启动性能基准")
+    parser.add_argument("--scenarios", nargs="+",
+                        default=["general", "game_dev", "web_dev", "data_science", "devops"],
+                        help="要测量的场景")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数")
+    args = parser.parse_args()
+
+    table = Table(title="🚀 工具集启动耗时")
+    table.add_column("场景")
+    table.add_column("工具数", justify="right")
+    table.add_column("冷启动 (ms)", justify="right")
+    table.add_column("增量 (ms)", justify="right")
+    table.add_column("热启动 (ms)", justify="right")
+    table.add_column("已导入的重依赖")
+
+    for scenario in args.scenarios:
+        cold = measure_cold(scenario, args.repeat)
+        incremental = measure_cold(scenario, args.repeat, preload=True)
+        warm = measure_warm(scenario, args.repeat)
+        table.add_row(
+            scenario,
+            str(cold["tools"]),
+            f"{cold['elapsed'] * 1000:.1f}",
+            f"{incremental['elapsed'] * 1000:.1f}",
+            f"{warm * 1000:.3f}",
+            ", ".join(cold["heavy"]) or "无"
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+离线基准测试用的脚本化 LLM
+按预先录制的对话脚本（transcript）逐轮返回 AI 消息（含工具调用），不访问网络，结果完全确定
+
+脚本格式（JSON 列表，每项为一轮 AI 回复）:
+    [
+        {"content": "我将按以下步骤完成任务：...", "tool_calls": [{"name": "read_file", "args": {"__arg1": "a.py"}}]},
+        {"content": "任务完成！"}
+    ]
+"""
+
+import json
+import time
+import threading
+from typing import Any, Iterator, List, Optional, Sequence
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def load_transcript(path: str) -> List[dict]:
+    """读取脚本文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def transcript_from_messages(messages: List[BaseMessage]) -> List[dict]:
+    """从一次真实执行的消息记录中提取脚本（用于录制）"""
+    turns = []
+    for msg in messages:
+        if not isinstance(msg, AIMessage):
+            continue
+        turn = {"content": msg.content if isinstance(msg.content, str) else str(msg.content)}
+        if msg.tool_calls:
+            turn["tool_calls"] = [{"name": tc["name"], "args": tc["args"]} for tc in msg.tool_calls]
+        turns.append(turn)
+    return turns
+
+
+def save_transcript(messages: List[BaseMessage], path: str) -> None:
+    """把消息记录保存为脚本文件"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(transcript_from_messages(messages), f, ensure_ascii=False, indent=2)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    脚本化 ChatModel
+
+    每个新任务（最后一条消息是用户消息）从脚本第一轮重新开始；
+    脚本用完后返回最后一轮的文本内容（不再调用工具），保证 Agent 能正常结束
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    turns: List[dict]
+    """对话脚本"""
+
+    latency: float = 0.0
+    """每次调用模拟的模型延迟（秒）"""
+
+    _position: int = PrivateAttr(default=0)
+    _call_counter: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _llm_time: float = PrivateAttr(default=0.0)
+    _llm_calls: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._llm_time = 0.0
+            self._llm_calls = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"llm_calls": self._llm_calls, "llm_time": self._llm_time}
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        start = time.perf_counter()
+        with self._lock:
+            if messages and isinstance(messages[-1], HumanMessage):
+                self._position = 0
+
+            if self._position < len(self.turns):
+                turn = self.turns[self._position]
+                self._position += 1
+            else:
+                turn = {"content": self.turns[-1].get("content") or "任务完成"} if self.turns else {"content": "任务完成"}
+
+            tool_calls = []
+            for tool_call in turn.get("tool_calls", []):
+                self._call_counter += 1
+                tool_calls.append({
+                    "name": tool_call["name"],
+                    "args": tool_call.get("args", {}),
+                    "id": f"call_{self._call_counter}",
+                })
+            message = AIMessage(
+                content=turn.get("content", ""),
+                tool_calls=tool_calls,
+                id=f"run-{self._call_counter}-{self._position}",
+                usage_metadata={"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+            )
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._llm_time += time.perf_counter() - start
+            self._llm_calls += 1
+        return message
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        """按字符分块输出文本，最后输出工具调用块（与真实模型的流式行为一致）"""
+        message = self._next_message(messages)
+        content = message.content or ""
+        for i in range(0, len(content), 8):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=content[i:i + 8], id=message.id))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+        tool_call_chunks = [
+            {"name": tc["name"], "args": json.dumps(tc["args"], ensure_ascii=False), "id": tc["id"], "index": i}
+            for i, tc in enumerate(message.tool_calls)
+        ]
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            tool_call_chunks=tool_call_chunks,
+            id=message.id,
+            usage_metadata=message.usage_metadata
+        ))
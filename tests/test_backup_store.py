@@ -0,0 +1,100 @@
+"""
+测试文件 - 备份存储
+目标模块: tools_package.backup_store
+"""
+
+import pytest
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools_package import backup_store
+from tools_package.backup_store import BackupStore
+from tools_package.quality_tools import QualityTools
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """临时目录中的备份存储（每个文件保留3个版本），工作目录切换到临时目录"""
+    monkeypatch.chdir(tmp_path)
+    store = BackupStore(os.path.join(".agent_cache", "backups"), keep=3)
+    monkeypatch.setattr(backup_store, "_store", store)
+    return store
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class TestBackupStore:
+    """备份存储测试类"""
+
+    def test_unchanged_content_not_stored_again(self, store):
+        write("f.txt", "a")
+        first, created = store.backup("f.txt")
+        again, created_again = store.backup("f.txt")
+        assert created and not created_again
+        assert again.version == first.version
+        assert len(store.versions("f.txt")) == 1
+
+    def test_retention_limit(self, store):
+        for i in range(5):
+            write("f.txt", f"v{i}")
+            store.backup("f.txt")
+        assert [v.version for v in store.versions("f.txt")] == [5, 4, 3]
+        assert store.stats().objects == 3
+
+    def test_restore_oldest_version_at_retention_limit(self, store):
+        for i in range(1, 4):
+            write("f.txt", f"v{i}")
+            store.backup("f.txt")
+        write("f.txt", "current")
+
+        result = QualityTools.restore_backup("f.txt|||1")
+
+        assert result.startswith("✅"), result
+        assert read("f.txt") == "v1"
+        versions = [v.version for v in store.versions("f.txt")]
+        assert len(versions) == 3
+        assert 1 in versions
+        assert store.read(store.get("f.txt", 4)) == b"current"
+
+    def test_store_survives_chdir(self, store, tmp_path, monkeypatch):
+        write("f.txt", "a")
+        version, _ = store.backup("f.txt")
+        other = tmp_path / "other"
+        other.mkdir()
+        monkeypatch.chdir(other)
+        assert store.read(version) == b"a"
+
+    def test_tracked_file_named_like_backup(self, store):
+        write("data", "original")
+        write("data.bak_old.py", "v1")
+        store.backup("data.bak_old.py")
+        write("data.bak_old.py", "v2")
+
+        QualityTools.restore_backup("data.bak_old.py")
+
+        assert read("data.bak_old.py") == "v1"
+        assert read("data") == "original"
+
+    def test_legacy_backup_file(self, store):
+        write("c.txt", "old")
+        write("c.txt.bak_20240101_000000", "old")
+        write("c.txt", "new")
+
+        QualityTools.restore_backup("c.txt.bak_20240101_000000")
+
+        assert read("c.txt") == "old"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,65 @@
+"""
+测试文件 - 代码搜索
+目标模块: tools_package.code_search
+"""
+
+import pytest
+import sys
+import os
+import re
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools_package.code_search import TrigramIndex, parallel_search, scan_files
+
+
+# 大小写转换规则特殊的字符: İ 转小写是两个字符，ſ / ı / K 忽略大小写时与 ASCII 字母等价，词尾的 Σ 转为 ς
+CONTENTS = {
+    "dotted.py": "name = 'aİx'\n",
+    "long_s.py": "ſelf.value = 1\n",
+    "kelvin.py": "TEMP = 'K'\n",
+    "sigma.py": "x = 'ΑΣΒ'\n",
+    "chinese.py": "# 中文搜索测试\n",
+}
+
+QUERIES = [
+    "(?i)aix",
+    "(?i)self.value",
+    "(?i)temp = 'k'",
+    "ΑΣ",
+    "(?i)ασβ",
+    "文搜索",
+]
+
+
+@pytest.fixture
+def project(tmp_path):
+    for name, content in CONTENTS.items():
+        (tmp_path / name).write_text(content, encoding="utf-8")
+    return str(tmp_path)
+
+
+class TestCodeSearch:
+    """代码搜索测试类"""
+
+    @pytest.mark.parametrize("pattern", QUERIES)
+    def test_index_matches_scan(self, project, tmp_path, pattern):
+        """索引只能缩小候选文件，结果必须与逐个扫描相同"""
+        index = TrigramIndex(str(tmp_path / "index.db"))
+        files = [entry.path for entry in scan_files(project, (".py",))]
+        expected = parallel_search(files, re.compile(pattern), 30)
+        assert expected
+
+        results, _ = index.search(project, pattern)
+        assert results == expected
+
+    def test_dotted_capital_i_found_by_index(self, project, tmp_path):
+        index = TrigramIndex(str(tmp_path / "index.db"))
+        results, info = index.search(project, "(?i)name = 'aix'")
+        assert info["mode"] == "index"
+        assert len(results) == 1 and "dotted.py" in results[0]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
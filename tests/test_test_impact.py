@@ -0,0 +1,50 @@
+"""
+测试文件 - 受影响测试选择
+目标模块: tools_package.test_impact
+"""
+
+import pytest
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools_package.test_impact import DEFAULT_PYTHON_FILES, is_test_file, python_file_patterns, scan_project
+
+
+def make_project(tmp_path, config_name, config):
+    (tmp_path / config_name).write_text(config, encoding="utf-8")
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    for name in ("test_a.py", "check_b.py", "c_test.py", "helper.py"):
+        (tests / name).write_text("def test_x():\n    pass\n", encoding="utf-8")
+    return str(tests)
+
+
+class TestTestImpact:
+    """测试文件命名规则测试类"""
+
+    @pytest.mark.parametrize("config_name, config", [
+        ("pytest.ini", "[pytest]\npython_files = test_*.py check_*.py\n"),
+        ("pyproject.toml", '[tool.pytest.ini_options]\npython_files = ["test_*.py", "check_*.py"]\n'),
+        ("setup.cfg", "[tool:pytest]\npython_files =\n    test_*.py\n    check_*.py\n"),
+    ])
+    def test_python_files_from_config(self, tmp_path, config_name, config):
+        """与 pytest 相同，按配置中的 python_files 识别测试文件"""
+        target = make_project(tmp_path, config_name, config)
+        _, _, tests, patterns = scan_project(target)
+        assert patterns == ["test_*.py", "check_*.py"]
+        assert sorted(os.path.basename(test) for test in tests) == ["check_b.py", "test_a.py"]
+
+    def test_default_without_pytest_section(self, tmp_path):
+        target = make_project(tmp_path, "tox.ini", "[tox]\nenvlist = py311\n")
+        assert python_file_patterns(target) == list(DEFAULT_PYTHON_FILES)
+
+    def test_pattern_with_directory(self):
+        assert is_test_file(os.path.join(os.sep, "p", "tests", "unit", "x.py"), ["tests/unit/*.py"])
+        assert not is_test_file(os.path.join(os.sep, "p", "other", "unit", "x.py"), ["tests/unit/*.py"])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -2,6 +2,8 @@
 from .tools import create_tools, FileTools, WebTools, SystemTools, CalculatorTools
 from .game_dev_tools import create_game_dev_tools
 from .clip_tools import create_clip_tools
+from .registry import get_toolset, get_scenario_tools
+from .tool_cache import get_tool_cache
 
 __all__ = [
     'create_tools',
@@ -10,6 +12,9 @@ __all__ = [
     'SystemTools',
     'CalculatorTools',
     'create_game_dev_tools',
-    'create_clip_tools'
+    'create_clip_tools',
+    'get_toolset',
+    'get_scenario_tools',
+    'get_tool_cache'
 ]
 
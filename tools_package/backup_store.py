@@ -0,0 +1,301 @@
+"""
+文件备份存储 - 按内容寻址、去重、压缩，每个文件保留多个版本
+- 内容: objects/<sha256前2位>/<sha256其余部分>，文件名为原始内容的 sha256；
+  安装了 zstandard 时用 zstd 压缩，否则用 zlib；相同内容只保存一份
+- 索引: index.db（SQLite），(文件路径, 版本号) -> 内容哈希、大小、权限、备份时间
+- 去重: 文件内容与最近一次备份相同时不新增版本、不写任何数据
+- 保留: 每个文件最多保留 BACKUP_KEEP 个版本，超出时删除最旧的版本，不再被任何版本引用的内容随之删除
+- 恢复: 按 (路径, 版本号) 查到内容哈希，读取一个对象解压后原子写回，与版本数量无关
+- 旧格式: 以前的 backup_file 生成的 原文件.bak_年月日_时分秒 仍可直接恢复
+
+- 存储目录: 环境变量 BACKUP_STORE_PATH（默认 .agent_cache/backups）
+- 每个文件保留的版本数: 环境变量 BACKUP_KEEP（默认 20）
+"""
+
+import os
+import re
+import stat
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+from .file_transaction import atomic_write
+from .tool_cache import first_arg_path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+DEFAULT_BACKUP_PATH = os.path.join(".agent_cache", "backups")
+
+BACKUP_KEEP = max(1, int(os.getenv("BACKUP_KEEP", "20")))
+
+# 旧版本 backup_file 生成的备份文件后缀
+LEGACY_BACKUP_SUFFIX = re.compile(r"\.bak_\d{8}_\d{6}$")
+
+# 对象文件的第一个字节: 压缩方式
+CODEC_ZSTD = b"S"
+CODEC_ZLIB = b"Z"
+CODEC_RAW = b"R"
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS versions (
+        path TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mode INTEGER NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (path, version)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_versions_hash ON versions(hash)",
+]
+
+
+class BackupVersion(NamedTuple):
+    path: str          # 绝对路径
+    version: int       # 从 1 开始，每个文件单独编号
+    hash: str          # 内容的 sha256
+    size: int          # 原始大小（字节）
+    mode: int          # 文件权限
+    created: float     # 备份时间（时间戳）
+
+
+class StoreStats(NamedTuple):
+    files: int
+    versions: int
+    objects: int
+    original_bytes: int    # 所有版本的原始大小之和
+    stored_bytes: int      # 对象文件实际占用
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        packed = CODEC_ZSTD + zstandard.ZstdCompressor(level=3).compress(data)
+    else:
+        packed = CODEC_ZLIB + zlib.compress(data, 6)
+    # 已压缩过的内容（图片、压缩包等）原样保存
+    return packed if len(packed) < len(data) + 1 else CODEC_RAW + data
+
+
+def _decompress(packed: bytes) -> bytes:
+    codec, body = packed[:1], packed[1:]
+    if codec == CODEC_RAW:
+        return body
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(body)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("该备份使用 zstd 压缩，需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"未知的压缩方式: {codec!r}")
+
+
+class BackupStore:
+    """按内容寻址的备份存储（线程安全）"""
+
+    def __init__(self, root: str = DEFAULT_BACKUP_PATH, keep: int = BACKUP_KEEP):
+        # 绝对路径：工作目录改变后（如 batch_runner 切换到任务目录）内容和索引仍在同一个目录
+        root = os.path.abspath(root)
+        self.root = root
+        self.keep = keep
+        self._objects = os.path.join(root, "objects")
+        self._lock = threading.Lock()
+
+        os.makedirs(self._objects, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    # ---------- 对象 ----------
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], digest[2:])
+
+    def _put_object(self, digest: str, data: bytes) -> None:
+        """保存内容（已存在时跳过）"""
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".obj.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_compress(data))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _get_object(self, digest: str) -> bytes:
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"备份内容 {digest[:12]} 已丢失")
+        with open(path, 'rb') as f:
+            data = _decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"备份内容 {digest[:12]} 已损坏")
+        return data
+
+    # ---------- 版本 ----------
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> BackupVersion:
+        return BackupVersion(row["path"], row["version"], row["hash"], row["size"], row["mode"], row["created"])
+
+    def _latest(self, path: str) -> Optional[BackupVersion]:
+        row = self._conn.execute("SELECT * FROM versions WHERE path = ? ORDER BY version DESC LIMIT 1",
+                                 (path,)).fetchone()
+        return self._row(row) if row else None
+
+    def backup(self, filepath: str, protect: Optional[int] = None) -> Tuple[BackupVersion, bool]:
+        """
+        备份文件
+
+        Args:
+            filepath: 文件路径
+            protect: 清理旧版本时保留的版本号（恢复该版本前备份当前内容时使用）
+
+        Returns:
+            (版本, 是否新建)；内容与最近一次备份相同时返回该版本和 False
+        """
+        path = os.path.abspath(filepath)
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+
+        with self._lock:
+            latest = self._latest(path)
+            if latest is not None and latest.hash == digest:
+                return latest, False
+            self._put_object(digest, data)
+            version = BackupVersion(path, latest.version + 1 if latest else 1, digest, len(data), mode, time.time())
+            self._conn.execute("INSERT INTO versions (path, version, hash, size, mode, created) VALUES (?, ?, ?, ?, ?, ?)",
+                               version)
+            self._prune(path, protect)
+            self._conn.commit()
+        return version, True
+
+    def _prune(self, path: str, protect: Optional[int] = None) -> None:
+        """删除超出保留数量的旧版本（protect 除外），以及不再被引用的内容（调用方持有锁）"""
+        keep = self.keep
+        if protect is not None and self._conn.execute("SELECT 1 FROM versions WHERE path = ? AND version = ?",
+                                                      (path, protect)).fetchone():
+            keep = max(keep - 1, 1)
+        rows = self._conn.execute("SELECT version, hash FROM versions WHERE path = ? AND version IS NOT ? "
+                                  "ORDER BY version DESC LIMIT -1 OFFSET ?",
+                                  (path, protect, keep)).fetchall()
+        if not rows:
+            return
+        self._conn.executemany("DELETE FROM versions WHERE path = ? AND version = ?",
+                               [(path, row["version"]) for row in rows])
+        for digest in {row["hash"] for row in rows}:
+            if self._conn.execute("SELECT 1 FROM versions WHERE hash = ? LIMIT 1", (digest,)).fetchone() is None:
+                try:
+                    os.unlink(self._object_path(digest))
+                except OSError:
+                    continue
+
+    def get(self, filepath: str, version: Optional[int] = None) -> Optional[BackupVersion]:
+        """文件的指定版本（默认最新版本），不存在时返回 None"""
+        path = os.path.abspath(filepath)
+        with self._lock:
+            if version is None:
+                return self._latest(path)
+            row = self._conn.execute("SELECT * FROM versions WHERE path = ? AND version = ?",
+                                     (path, version)).fetchone()
+        return self._row(row) if row else None
+
+    def versions(self, filepath: str) -> List[BackupVersion]:
+        """文件的所有版本（新的在前）"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM versions WHERE path = ? ORDER BY version DESC",
+                                      (os.path.abspath(filepath),)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def read(self, version: BackupVersion) -> bytes:
+        return self._get_object(version.hash)
+
+    def restore(self, version: BackupVersion, data: Optional[bytes] = None) -> None:
+        """
+        把版本的内容原子写回原文件（恢复备份时的权限）
+
+        Args:
+            version: 要恢复的版本
+            data: 已读取的版本内容（默认从存储读取）
+        """
+        atomic_write(version.path, self.read(version) if data is None else data)
+        try:
+            os.chmod(version.path, version.mode)
+        except OSError:
+            pass
+
+    # ---------- 汇总 ----------
+
+    def files(self) -> List[Tuple[str, int, float]]:
+        """有备份的文件: (路径, 版本数, 最近备份时间)，最近备份的在前"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, COUNT(*) AS count, MAX(created) AS latest FROM versions "
+                                      "GROUP BY path ORDER BY latest DESC").fetchall()
+        return [(row["path"], row["count"], row["latest"]) for row in rows]
+
+    def stats(self) -> StoreStats:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(DISTINCT path) AS files, COUNT(*) AS versions, "
+                                     "COUNT(DISTINCT hash) AS objects, COALESCE(SUM(size), 0) AS size "
+                                     "FROM versions").fetchone()
+            digests = [r["hash"] for r in self._conn.execute("SELECT DISTINCT hash FROM versions")]
+        stored = 0
+        for digest in digests:
+            try:
+                stored += os.path.getsize(self._object_path(digest))
+            except OSError:
+                continue
+        return StoreStats(row["files"], row["versions"], row["objects"], row["size"], stored)
+
+
+_store: Optional[BackupStore] = None
+_store_lock = threading.Lock()
+
+
+def get_backup_store() -> BackupStore:
+    """进程内共享的备份存储（目录来自环境变量 BACKUP_STORE_PATH）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BackupStore(os.getenv("BACKUP_STORE_PATH", DEFAULT_BACKUP_PATH))
+        return _store
+
+
+def legacy_backup_target(filepath: str) -> Optional[str]:
+    """
+    旧格式备份文件（原文件.bak_年月日_时分秒）对应的原文件
+
+    不是旧格式的备份文件、或者该路径本身在备份存储中有版本（文件名恰好含 .bak_）时返回 None
+    """
+    if not LEGACY_BACKUP_SUFFIX.search(filepath) or not os.path.isfile(filepath):
+        return None
+    if get_backup_store().get(filepath) is not None:
+        return None
+    return LEGACY_BACKUP_SUFFIX.sub("", filepath)
+
+
+def restore_target_path(path_and_version: str) -> str:
+    """restore_backup 恢复的目标文件（用于使工具结果缓存失效）"""
+    filepath = first_arg_path(path_and_version)
+    if "|||" not in str(path_and_version):
+        return legacy_backup_target(filepath) or filepath
+    return filepath
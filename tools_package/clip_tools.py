@@ -5,7 +5,6 @@ CLIP图像分析工具
 
 import os
 from typing import List, Dict, Optional
-from PIL import Image
 
 
 class CLIPTools:
@@ -73,6 +72,7 @@ class CLIPTools:
             # 加载和处理图像
             import torch
             import clip
+            from PIL import Image
             
             image = self.preprocess(Image.open(image_path)).unsqueeze(0).to(self.device)
             text = clip.tokenize(labels).to(self.device)
@@ -139,6 +139,7 @@ class CLIPTools:
             # 加载所有图片
             import torch
             import clip
+            from PIL import Image
             
             images = []
             valid_files = []
@@ -220,6 +221,7 @@ class CLIPTools:
             
             import torch
             import clip
+            from PIL import Image
             
             # 加载图像
             image = self.preprocess(Image.open(image_path)).unsqueeze(0).to(self.device)
@@ -281,6 +283,7 @@ class CLIPTools:
             
             # 加载所有图片
             import torch
+            from PIL import Image
             
             images = []
             for img_path in image_paths:
@@ -0,0 +1,364 @@
+"""
+代码搜索 - 三元组（trigram）索引 + 并行扫描
+- 索引: 每个文件内容（小写）中出现的所有3字节片段，保存在本地SQLite，按 mtime / 大小增量更新
+- 搜索: 从正则表达式中提取必须出现的字面量，用三元组求交集得到候选文件，只在候选文件中逐行匹配
+- 索引未建立（冷启动）时直接并行扫描返回结果，同时在后台建立索引
+- 文件遍历和并行读取使用 file_scanner（遵守 .gitignore，结果顺序固定）
+- 数据库路径: 环境变量 SEARCH_INDEX_PATH（默认 .agent_cache/search_index.db）
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants  # Python 3.11+
+except ImportError:  # Python 3.10 及以下
+    import sre_parse
+    import sre_constants
+
+from .file_scanner import SCAN_WORKERS, FileEntry, map_files, scan_files
+
+
+DEFAULT_SEARCH_INDEX_PATH = os.path.join(".agent_cache", "search_index.db")
+
+# 默认只搜索Python文件
+DEFAULT_EXTENSIONS = (".py",)
+
+# 超过该大小的文件不建索引（始终作为候选文件扫描）
+MAX_INDEX_BYTES = 2 * 1024 * 1024
+
+# 索引格式版本（三元组的提取方式改变时递增，旧版本的索引清空后重建）
+INDEX_VERSION = 3
+
+# 需要更新的文件不超过该数量时同步更新索引，否则本次并行扫描、后台建索引
+SYNC_UPDATE_LIMIT = 32
+
+
+# ---------- 三元组 ----------
+
+# 忽略大小写匹配时与ASCII字母等价、但 str.lower() 不会转换成单个ASCII字母的字符
+# （re 的 (?i)s 可以匹配 ſ；'İ'.lower() 是 i 加组合附加点两个字符），在转小写之前替换
+_CASE_FOLD = str.maketrans({"ſ": "s", "ı": "i", "İ": "i", "K": "k"})
+
+# 忽略大小写时可以匹配非ASCII字符的ASCII字母（i: ı İ，k: K，s: ſ），提取字面量时在这些字母处断开
+_AMBIGUOUS_FOLD = set("iksIKS")
+
+
+def fold_text(text: str) -> str:
+    """
+    建索引和提取查询三元组时统一的大小写归一化
+
+    逐字符转换：str.lower() 与上下文有关（词尾的 Σ 转为 ς，其他位置转为 σ），
+    整段转换时文件内容与查询中的同一字符可能得到不同结果
+    """
+    if text.isascii():
+        return text.lower()
+    return "".join(map(str.lower, text.translate(_CASE_FOLD)))
+
+
+def trigrams_of(data: bytes) -> Set[int]:
+    """字节串中所有3字节片段（编码为整数）"""
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+def _literal_runs(parsed, ignore_case: bool) -> List[str]:
+    """正则语法树中必须按顺序出现的字面量片段"""
+    runs = []
+    current = []
+
+    def flush():
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    for op, arg in parsed:
+        if op is sre_constants.LITERAL:
+            char = chr(arg)
+            # 非ASCII字符: 忽略大小写时匹配规则与 str.lower() 不完全一致，区分大小写时只用无大小写的字符（如汉字）筛选
+            if not char.isascii() and (ignore_case or char.lower() != char or char.upper() != char):
+                flush()
+            elif ignore_case and char in _AMBIGUOUS_FOLD:
+                flush()
+            else:
+                current.append(char)
+        elif op is sre_constants.SUBPATTERN:
+            # 分组本身必须出现：其中的字面量同样是必需的（分组边界处断开）
+            flush()
+            runs.extend(_literal_runs(arg[-1], ignore_case or bool(arg[1] & re.IGNORECASE)))
+        elif op in (sre_constants.AT,):
+            continue  # ^ $ \b 不消耗字符
+        else:
+            flush()
+    flush()
+    return runs
+
+
+def required_trigrams(pattern: str, flags: int = 0) -> Set[int]:
+    """正则表达式匹配时必须出现的三元组（无法确定时返回空集合，表示不能筛选）"""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return set()
+    ignore_case = bool((flags | parsed.state.flags) & re.IGNORECASE)
+    required = set()
+    for run in _literal_runs(parsed, ignore_case):
+        required |= trigrams_of(fold_text(run).encode("utf-8"))
+    return required
+
+
+def normalize_extensions(types: Optional[str]) -> Tuple[str, ...]:
+    """
+    解析文件类型过滤: "py,js,ts" / "*.md" / ".html" / "all"（所有文本文件）
+
+    Returns:
+        扩展名元组（带点，小写）；空元组表示不过滤
+    """
+    if not types or not types.strip():
+        return DEFAULT_EXTENSIONS
+    if types.strip().lower() in ("all", "*", "*.*"):
+        return ()
+    extensions = []
+    for item in re.split(r"[,\s;]+", types.strip()):
+        item = item.strip().lstrip("*").lower()
+        if item:
+            extensions.append(item if item.startswith(".") else "." + item)
+    return tuple(extensions) or DEFAULT_EXTENSIONS
+
+
+# ---------- 匹配 ----------
+
+def search_file(filepath: str, regex: "re.Pattern", limit: int) -> List[str]:
+    """在单个文件中逐行匹配（非UTF-8文件跳过），最多返回 limit 条"""
+    results = []
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for i, line in enumerate(f, 1):
+                if regex.search(line):
+                    results.append(f"{filepath}:{i}: {line.strip()}")
+                    if len(results) >= limit:
+                        break
+    except (OSError, UnicodeDecodeError):
+        return []
+    return results
+
+
+def parallel_search(files: Sequence[str], regex: "re.Pattern", limit: int,
+                    workers: int = SCAN_WORKERS) -> List[str]:
+    """
+    并行扫描文件，按文件顺序返回前 limit 条结果
+
+    攒够 limit 条结果后不再读取后面的文件
+    """
+    results: List[str] = []
+    for matches in map_files(lambda path: search_file(path, regex, limit), files, workers):
+        results.extend(matches)
+        if len(results) >= limit:
+            return results[:limit]
+    return results
+
+
+# ---------- 索引 ----------
+
+class TrigramIndex:
+    """三元组索引（线程安全，多个进程可共用同一个数据库文件）"""
+
+    def __init__(self, path: str = DEFAULT_SEARCH_INDEX_PATH):
+        """
+        Args:
+            path: SQLite 数据库文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._building: Set[str] = set()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " id INTEGER PRIMARY KEY,"
+            " path TEXT UNIQUE NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " indexed INTEGER NOT NULL)"   # 0 = 过大或无法读取，始终作为候选
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " trigram INTEGER NOT NULL,"
+            " file_id INTEGER NOT NULL,"
+            " PRIMARY KEY (trigram, file_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_file ON postings(file_id)")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < INDEX_VERSION:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self._conn.commit()
+
+    def _stored(self, paths: Sequence[str]) -> Dict[str, tuple]:
+        """路径 -> (id, mtime_ns, size, indexed)"""
+        stored = {}
+        with self._lock:
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT path, id, mtime_ns, size, indexed FROM files WHERE path IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                stored.update({row[0]: row[1:] for row in rows})
+        return stored
+
+    @staticmethod
+    def _read_trigrams(path: str, size: int) -> Optional[Set[int]]:
+        if size > MAX_INDEX_BYTES:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            return trigrams_of(fold_text(data.decode('utf-8', errors='ignore')).encode('utf-8'))
+        except OSError:
+            return None
+
+    def update(self, changed: Sequence[Tuple[str, int, int]], commit_every: int = 100) -> None:
+        """重新索引 (绝对路径, mtime_ns, size) 列表中的文件（每 commit_every 个文件提交一次）"""
+        # 读文件、提取三元组在线程池中进行，写入串行
+        read = map_files(lambda item: self._read_trigrams(item[0], item[2]), changed)
+        for count, ((path, mtime_ns, size), grams) in enumerate(zip(changed, read), 1):
+            with self._lock:
+                row = self._conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+                if row:
+                    file_id = row[0]
+                    self._conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+                    self._conn.execute("UPDATE files SET mtime_ns = ?, size = ?, indexed = ? WHERE id = ?",
+                                       (mtime_ns, size, int(grams is not None), file_id))
+                else:
+                    file_id = self._conn.execute(
+                        "INSERT INTO files (path, mtime_ns, size, indexed) VALUES (?, ?, ?, ?)",
+                        (path, mtime_ns, size, int(grams is not None))
+                    ).lastrowid
+                if grams:
+                    self._conn.executemany("INSERT OR IGNORE INTO postings (trigram, file_id) VALUES (?, ?)",
+                                           [(gram, file_id) for gram in sorted(grams)])
+                if count % commit_every == 0 or count == len(changed):
+                    self._conn.commit()
+
+    def forget(self, filepath: str) -> None:
+        """从索引中删除文件（下次搜索时重新索引）"""
+        path = os.path.abspath(filepath)
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM postings WHERE file_id = ?", (row[0],))
+                self._conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                self._conn.commit()
+
+    def stale_files(self, entries: Sequence[FileEntry]) -> Tuple[List[Tuple[str, int, int]], Dict[str, tuple]]:
+        """
+        找出需要重新索引的文件（使用扫描时取得的 mtime / 大小）
+
+        Returns:
+            (需要更新的 (绝对路径, mtime_ns, size) 列表, 已索引的 路径 -> (id, mtime_ns, size, indexed))
+        """
+        absolute = [os.path.abspath(entry.path) for entry in entries]
+        stored = self._stored(absolute)
+        changed = []
+        for path, entry in zip(absolute, entries):
+            known = stored.get(path)
+            if known is None or known[1] != entry.mtime_ns or known[2] != entry.size:
+                changed.append((path, entry.mtime_ns, entry.size))
+        return changed, stored
+
+    def candidates(self, file_ids: Dict[int, str], unindexed: Set[str], grams: Set[int]) -> Set[str]:
+        """包含全部三元组的文件（加上未建索引的文件）"""
+        remaining = set(file_ids)
+        # 从最少出现的三元组开始求交集
+        with self._lock:
+            counts = sorted(
+                (self._conn.execute("SELECT COUNT(*) FROM postings WHERE trigram = ?", (gram,)).fetchone()[0], gram)
+                for gram in grams
+            )
+            for _, gram in counts:
+                if not remaining:
+                    break
+                rows = self._conn.execute("SELECT file_id FROM postings WHERE trigram = ?", (gram,)).fetchall()
+                remaining &= {row[0] for row in rows}
+        return {file_ids[file_id] for file_id in remaining} | unindexed
+
+    def build_in_background(self, root: str, changed: Sequence[Tuple[str, int, int]]) -> None:
+        """后台建立索引（同一目录同时只有一个后台任务）"""
+        with self._lock:
+            if root in self._building:
+                return
+            self._building.add(root)
+
+        def build():
+            try:
+                self.update(changed)
+            finally:
+                with self._lock:
+                    self._building.discard(root)
+
+        threading.Thread(target=build, name="search-index", daemon=True).start()
+
+    def search(self, directory: str, pattern: str, extensions: Sequence[str] = DEFAULT_EXTENSIONS,
+               limit: int = 30, flags: int = 0) -> Tuple[List[str], dict]:
+        """
+        搜索目录下匹配正则的代码行
+
+        Returns:
+            (结果列表（file_scanner 遍历顺序，最多 limit 条）, 搜索信息)
+        """
+        regex = re.compile(pattern, flags)
+        entries = scan_files(directory, extensions)
+        files = [entry.path for entry in entries]
+        info = {"files": len(files), "candidates": len(files), "mode": "scan"}
+
+        changed, stored = self.stale_files(entries)
+        if len(changed) > SYNC_UPDATE_LIMIT:
+            # 冷启动：本次直接并行扫描，后台建立索引
+            self.build_in_background(os.path.abspath(directory), changed)
+            info["mode"] = "scan (索引建立中)"
+            return parallel_search(files, regex, limit), info
+
+        if changed:
+            self.update(changed)
+            stored = self._stored([os.path.abspath(path) for path in files])
+
+        grams = required_trigrams(pattern, flags)
+        if not grams:
+            return parallel_search(files, regex, limit), info
+
+        file_ids = {}
+        unindexed = set()
+        for path in files:
+            entry = stored.get(os.path.abspath(path))
+            if entry is None or not entry[3]:
+                unindexed.add(path)
+            else:
+                file_ids[entry[0]] = path
+        candidate_set = self.candidates(file_ids, unindexed, grams)
+        candidate_files = [path for path in files if path in candidate_set]
+        info.update({"candidates": len(candidate_files), "mode": "index"})
+        return parallel_search(candidate_files, regex, limit), info
+
+
+_index: Optional[TrigramIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> TrigramIndex:
+    """进程内共享的三元组索引（路径来自环境变量 SEARCH_INDEX_PATH）"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            from .tool_cache import get_tool_cache
+            _index = TrigramIndex(os.getenv("SEARCH_INDEX_PATH", DEFAULT_SEARCH_INDEX_PATH))
+            get_tool_cache().add_listener(_index.forget)
+        return _index
@@ -4,9 +4,9 @@
 """
 
 import os
-import subprocess
 from typing import List
 from langchain_core.tools import Tool
+from .process_runner import run_streaming
 
 
 class DataScienceTools:
@@ -203,14 +203,11 @@ plt.show()
         try:
             package_list = [p.strip() for p in packages.split(',')]
             
-            result = subprocess.run(
-                ['pip', 'install'] + package_list,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                timeout=120
-            )
+            result = run_streaming(['pip', 'install'] + package_list, timeout=120,
+                                   tool="install_data_science_packages")
             
+            if result.timed_out:
+                return f"⏱️ 安装超时: {', '.join(package_list)}"
             if result.returncode == 0:
                 return f"✅ 成功安装包: {', '.join(package_list)}\n{result.stdout}"
             else:
@@ -4,9 +4,9 @@ DevOps专用工具集
 """
 
 import os
-import subprocess
 from typing import List
 from langchain_core.tools import Tool
+from .process_runner import run_streaming
 
 
 class DevOpsTools:
@@ -184,14 +184,10 @@ jobs:
             if any(keyword in command.lower() for keyword in dangerous_keywords):
                 return "❌ 错误：不允许执行危险命令"
             
-            result = subprocess.run(
-                command.split(),
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                timeout=60
-            )
+            result = run_streaming(command.split(), timeout=60, tool="run_docker_command")
             
+            if result.timed_out:
+                return f"⏱️ Docker命令执行超时 (>60秒):\n{result.stdout}{result.stderr}"
             if result.returncode == 0:
                 return f"✅ Docker命令执行成功:\n{result.stdout}"
             else:
@@ -0,0 +1,272 @@
+"""
+按范围读取文件 - 内存映射（mmap），大文件只解码需要的部分
+- 编码: 根据文件开头的样本（BOM / UTF-8 / GBK / latin-1）判断一次，不再整文件多次重试
+- 范围: 字节偏移、行范围、开头 N 行、末尾 N 行；默认从头读取一页
+- 分页: 每页最多 PAGE_CHARS 个字符，尽量在行尾结束，返回下一页的字节偏移
+"""
+
+import os
+import re
+import mmap
+import codecs
+from typing import NamedTuple, Optional, Tuple
+
+
+# 每页最多返回的字符数（与原来的截断长度一致）
+PAGE_CHARS = 5000
+
+# 判断编码时读取的样本大小
+SNIFF_BYTES = 64 * 1024
+
+# 按顺序尝试的编码（gb2312 是 gbk 的子集，不单独尝试）
+CANDIDATE_ENCODINGS = ('utf-8', 'gbk')
+FALLBACK_ENCODING = 'latin-1'
+
+# 样本中无法按UTF-8解码的字节不超过该比例时仍按UTF-8读取（如夹杂少量二进制内容的日志）
+UTF8_TOLERANCE = 0.01
+
+# 无法解码的字节（surrogateescape 产生的代理字符），显示时替换为 �
+_ESCAPED_BYTES = re.compile('[\udc80-\udcff]')
+
+# 统计换行符时每次读取的块大小
+LINE_SCAN_CHUNK = 1 << 20
+
+# tail 读取时，文件不超过该大小才统计起始行号（需要扫描 tail 之前的全部内容）
+TAIL_LINE_NUMBER_LIMIT = 32 * 1024 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+
+class TextRange(NamedTuple):
+    """读取结果"""
+    text: str
+    start: int            # 起始字节偏移
+    end: int              # 结束字节偏移（不含）
+    size: int             # 文件总字节数
+    encoding: str
+    truncated: bool = False            # 请求的范围是否超过一页（end 之后还有未读内容）
+    first_line: Optional[int] = None   # 按行读取时的起止行号（从1开始）
+    last_line: Optional[int] = None
+
+
+def _display(text: str) -> str:
+    """返回给模型的文本：无法解码的字节显示为 �，换行统一为 \\n（与文本模式读取一致）"""
+    return _ESCAPED_BYTES.sub('\ufffd', text).replace('\r\n', '\n').replace('\r', '\n')
+
+
+def sniff_encoding(sample: bytes, complete: bool) -> Tuple[str, int]:
+    """
+    根据样本判断编码
+
+    Args:
+        sample: 文件开头的字节
+        complete: 样本是否为完整文件（否则末尾被截断的多字节字符不算错误）
+
+    Returns:
+        (编码, BOM 字节数)
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding, len(bom)
+    for encoding in CANDIDATE_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=complete)
+            return encoding, 0
+        except UnicodeDecodeError:
+            continue
+    text = codecs.getincrementaldecoder('utf-8')(errors='replace').decode(sample, final=complete)
+    if text and text.count('\ufffd') <= len(text) * UTF8_TOLERANCE:
+        return 'utf-8', 0
+    return FALLBACK_ENCODING, 0
+
+
+def parse_range(spec: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """
+    解析范围参数
+
+    支持: "lines=10-20" / "lines=100-" / "head=50" / "tail=50" / "bytes=0-4096" / "offset=5000"
+
+    Returns:
+        (类型, 起始, 结束)；类型为 lines / head / tail / bytes
+    """
+    match = re.fullmatch(r"\s*(lines|head|tail|bytes|offset)\s*[=:]\s*(\d*)\s*(?:-\s*(\d*))?\s*", spec or "")
+    if not match:
+        raise ValueError(f"无法识别的范围 '{spec}'，可用: lines=10-20, head=50, tail=50, bytes=0-4096, offset=5000")
+    kind, first, second = match.group(1), match.group(2), match.group(3)
+    start = int(first) if first else None
+    end = int(second) if second else None
+    if kind == "offset":
+        return "bytes", start or 0, None
+    if kind in ("head", "tail"):
+        if start is None:
+            raise ValueError(f"{kind} 需要行数，如 {kind}=50")
+        return kind, start, None
+    if kind == "lines" and start is not None and start < 1:
+        raise ValueError("行号从1开始")
+    return kind, start, end
+
+
+class MappedFile:
+    """
+    内存映射的只读文件
+
+    用法:
+        with MappedFile(path) as f:
+            f.read_page(0)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._map = None
+        self.size = 0
+        self.encoding = FALLBACK_ENCODING
+        self.bom = 0
+
+    def __enter__(self) -> "MappedFile":
+        self._file = open(self.path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.encoding, self.bom = sniff_encoding(self._bytes(0, SNIFF_BYTES), self.size <= SNIFF_BYTES)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def _bytes(self, start: int, end: int) -> bytes:
+        return self._map[start:end] if self._map is not None else b""
+
+    @property
+    def _wide(self) -> bool:
+        """UTF-16 文件的换行符不是单字节 \\n，按行操作时需要整体解码"""
+        return self.encoding.startswith('utf-16')
+
+    # ---------- 定位 ----------
+
+    def align(self, pos: int) -> int:
+        """把字节偏移调整到字符边界（跳过 BOM；UTF-8 跳过续字节；UTF-16 对齐到偶数字节）"""
+        pos = max(self.bom, min(pos, self.size))
+        if self._wide:
+            return pos - (pos - self.bom) % 2
+        if self.encoding == 'utf-8':
+            while pos < self.size and 0x80 <= self._map[pos] < 0xC0:
+                pos += 1
+        return pos
+
+    def line_offset(self, line: int) -> int:
+        """第 line 行（从1开始）的起始字节偏移，超出行数时返回文件大小"""
+        remaining = line - 1
+        pos = 0
+        while remaining > 0 and pos < self.size:
+            chunk = self._bytes(pos, pos + LINE_SCAN_CHUNK)
+            count = chunk.count(b"\n")
+            if count < remaining:
+                remaining -= count
+                pos += len(chunk)
+                continue
+            found = -1
+            for _ in range(remaining):
+                found = chunk.find(b"\n", found + 1)
+            return pos + found + 1
+        return self.size if remaining > 0 else pos
+
+    def line_number(self, pos: int) -> int:
+        """字节偏移所在的行号（分块统计换行符）"""
+        count = 1
+        for start in range(0, pos, LINE_SCAN_CHUNK):
+            count += self._bytes(start, min(pos, start + LINE_SCAN_CHUNK)).count(b"\n")
+        return count
+
+    def tail_offset(self, lines: int) -> int:
+        """末尾 lines 行的起始字节偏移"""
+        end = self.size
+        if end and self._map[end - 1:end] == b"\n":
+            end -= 1    # 最后的换行符不算一行
+        pos = end
+        for _ in range(lines):
+            found = self._map.rfind(b"\n", 0, pos) if self._map is not None else -1
+            if found == -1:
+                return 0
+            pos = found
+        return pos + 1
+
+    # ---------- 读取 ----------
+
+    def decode(self, start: int, end: int) -> str:
+        """
+        解码字节范围；无法解码的字节保留为代理字符（surrogateescape），
+        重新编码后字节数不变，用于计算下一页的偏移
+        """
+        errors = 'replace' if self._wide else 'surrogateescape'
+        return self._bytes(max(start, self.bom), end).decode(self.encoding, errors=errors)
+
+    def encoded_size(self, text: str) -> int:
+        return len(text.encode(self.encoding, errors='replace' if self._wide else 'surrogateescape'))
+
+    def read_page(self, start: int, end: Optional[int] = None, max_chars: int = PAGE_CHARS) -> TextRange:
+        """
+        从 start 字节开始读取一页（不超过 end 字节和 max_chars 个字符）
+
+        截断时尽量在最后一个换行符处结束，返回的 end 即下一页的起点
+        """
+        start = self.align(start)
+        limit = self.size if end is None else self.align(min(end, self.size))
+        # 每个字符最多4字节（UTF-8），多读一些保证能凑满一页
+        window_end = self.align(min(limit, start + max_chars * 4 + 4))
+        text = self.decode(start, window_end)
+        if len(text) <= max_chars and window_end == limit:
+            return TextRange(_display(text), start, limit, self.size, self.encoding)
+
+        text = text[:max_chars]
+        cut = text.rfind("\n")
+        if cut >= max_chars // 2:
+            text = text[:cut + 1]
+        end = start + self.encoded_size(text)
+        return TextRange(_display(text), start, end, self.size, self.encoding, True)
+
+
+def read_range(path: str, spec: Optional[str] = None, max_chars: int = PAGE_CHARS) -> TextRange:
+    """
+    按范围读取文件（spec 见 parse_range，为空时从头读取一页）
+
+    结果最多 max_chars 个字符；行范围过长时同样截断，end 指向未读部分
+    """
+    kind, first, second = parse_range(spec) if spec else ("bytes", 0, None)
+    with MappedFile(path) as f:
+        if f._wide and kind != "bytes":
+            # UTF-16：整体解码后按行切分（这类文件很少且通常不大）
+            lines = f.decode(f.bom, f.size).splitlines(keepends=True)
+            if kind == "head":
+                first, second = 1, first
+            elif kind == "tail":
+                first, second = max(1, len(lines) - first + 1), len(lines)
+            first = first or 1
+            second = min(second or len(lines), len(lines))
+            text = _display("".join(lines[first - 1:second]))
+            return TextRange(text[:max_chars], 0, f.size, f.size, f.encoding, len(text) > max_chars, first, second)
+
+        if kind == "bytes":
+            return f.read_page(first or 0, second, max_chars)
+
+        if kind == "head":
+            first_line, start, end = 1, 0, f.line_offset(first + 1)
+        elif kind == "tail":
+            start, end = f.tail_offset(first), f.size
+            if start > TAIL_LINE_NUMBER_LIMIT:
+                return f.read_page(start, end, max_chars)
+            first_line = f.line_number(start)
+        else:
+            first_line = first or 1
+            start = f.line_offset(first_line)
+            end = f.line_offset(second + 1) if second else f.size
+
+        page = f.read_page(start, end, max_chars)
+        last_line = first_line + page.text.count("\n") - (1 if page.text.endswith("\n") else 0)
+        return page._replace(first_line=first_line, last_line=max(first_line, last_line))
@@ -0,0 +1,308 @@
+"""
+项目文件扫描 - 项目级工具（analyze_project、search_code、find_symbol、create_requirements_web）共用
+- 遍历: os.scandir，跳过虚拟环境 / 缓存目录，遵守 .gitignore（含子目录中的 .gitignore）
+- 顺序: 每个目录内按名称排序，先列出文件再进入子目录；同一目录多次扫描结果顺序一致
+- 并行: 读取 / 解析文件使用有界的线程池（或进程池），同时在途的任务数有上限，结果按输入顺序返回
+- 截断: 各工具统一用 truncate() 截断输出并注明未显示的数量
+- 环境变量:
+    SCAN_WORKERS  线程池大小（默认 min(16, CPU数*2)）
+"""
+
+import os
+import re
+import itertools
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+# 遍历项目时跳过的目录
+SKIP_DIRS = {'venv', '.venv', '__pycache__', '.git', 'node_modules', '.agent_cache'}
+
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", min(16, (os.cpu_count() or 4) * 2)))
+
+# 项目级工具的默认输出条数
+MAX_LISTED_FILES = 20
+MAX_SEARCH_RESULTS = 30
+MAX_SYMBOL_MATCHES = 50
+
+
+class FileEntry(NamedTuple):
+    """扫描到的文件（path 与传入的 directory 形式一致）"""
+    path: str
+    mtime_ns: int
+    size: int
+
+
+# ---------- .gitignore ----------
+
+def _glob_to_regex(pattern: str) -> str:
+    """gitignore 通配符 -> 正则（* 不跨目录，** 跨任意层目录）"""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif char == "*":
+            out.append("[^/]*")
+            i += 1
+        elif char == "?":
+            out.append("[^/]")
+            i += 1
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(char))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end + 1
+        elif char == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(char))
+            i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """
+    .gitignore 规则（不可变，进入带 .gitignore 的子目录时派生新对象）
+
+    每条规则相对于所在 .gitignore 的目录匹配；后出现的规则优先，"!" 表示重新包含
+    """
+
+    def __init__(self, rules: Tuple[tuple, ...] = ()):
+        # (所在目录的绝对路径 + 分隔符, 编译后的正则, 是否取反, 是否只匹配目录, 是否只匹配文件名)
+        self.rules = rules
+        # 同一 .gitignore 的规则合并成一个正则（文件用 / 目录用），大多数路径一次匹配即可排除
+        self._groups = []
+        for prefix, rules_in_file in itertools.groupby(rules, key=lambda rule: rule[0]):
+            rules_in_file = list(rules_in_file)
+            self._groups.append((prefix, rules_in_file,
+                                 self._combine([r for r in rules_in_file if not r[3]]),
+                                 self._combine(rules_in_file)))
+
+    @staticmethod
+    def _combine(rules: List[tuple]) -> Optional["re.Pattern"]:
+        """任一规则可能匹配相对路径时匹配成功的正则"""
+        if not rules:
+            return None
+        parts = [("(?:.*/)?" if name_only else "") + "(?:" + regex.pattern + ")"
+                 for _, regex, _, _, name_only in rules]
+        return re.compile("|".join(parts), re.DOTALL)
+
+    @staticmethod
+    def parse(lines: Iterable[str], base_dir: str) -> List[tuple]:
+        prefix = base_dir.rstrip(os.sep) + os.sep
+        rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip("\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+            if not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\!") or line.startswith("\\#"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # 不含 "/" 的模式匹配任意层级的文件名，含 "/" 的模式相对 .gitignore 所在目录匹配
+            name_only = "/" not in line
+            regex = re.compile(_glob_to_regex(line.lstrip("/")) + r"\Z", re.DOTALL)
+            rules.append((prefix, regex, negate, dir_only, name_only))
+        return rules
+
+    def extend_from(self, directory: str) -> "IgnoreRules":
+        """加上 directory/.gitignore 中的规则（文件不存在时返回自身）"""
+        try:
+            with open(os.path.join(directory, ".gitignore"), 'r', encoding='utf-8', errors='ignore') as f:
+                rules = self.parse(f, os.path.abspath(directory))
+        except OSError:
+            return self
+        return IgnoreRules(self.rules + tuple(rules)) if rules else self
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        """path 为绝对路径"""
+        # 从最后一条规则往前找，第一条匹配的规则决定结果
+        name = os.path.basename(path)
+        for prefix, rules, file_any, dir_any in reversed(self._groups):
+            combined = dir_any if is_dir else file_any
+            if combined is None or not path.startswith(prefix):
+                continue
+            relative = path[len(prefix):].replace(os.sep, "/")
+            if not combined.match(relative):
+                continue
+            for _, regex, negate, dir_only, name_only in reversed(rules):
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(name if name_only else relative):
+                    return not negate
+        return False
+
+    @classmethod
+    def for_directory(cls, directory: str) -> "IgnoreRules":
+        """扫描起点适用的规则：从所在 git 仓库根目录到起点目录的各级 .gitignore"""
+        directory = os.path.abspath(directory)
+        chain = [directory]
+        current = directory
+        while not os.path.exists(os.path.join(current, ".git")):
+            parent = os.path.dirname(current)
+            if parent == current:
+                chain = [directory]    # 不在 git 仓库中：只使用起点目录的 .gitignore
+                break
+            current = parent
+            chain.append(current)
+        rules = cls()
+        for ancestor in reversed(chain):
+            rules = rules.extend_from(ancestor)
+        return rules
+
+
+# ---------- 遍历 ----------
+
+def _matches_extension(name: str, extensions: Sequence[str]) -> bool:
+    return not extensions or name.lower().endswith(tuple(extensions))
+
+
+def iter_files(directory: str, extensions: Sequence[str] = (".py",), gitignore: bool = True,
+               skip_dirs: Iterable[str] = SKIP_DIRS) -> Iterator[FileEntry]:
+    """
+    遍历目录下的文件
+
+    Args:
+        directory: 起点目录
+        extensions: 扩展名（带点，小写）；空元组表示所有文件
+        gitignore: 是否遵守 .gitignore
+        skip_dirs: 始终跳过的目录名
+    """
+    skip_dirs = set(skip_dirs)
+    root_rules = IgnoreRules.for_directory(directory) if gitignore else IgnoreRules()
+    stack = [(directory, root_rules)]
+    while stack:
+        current, rules = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        if gitignore and current != directory and any(entry.name == ".gitignore" for entry in entries):
+            rules = rules.extend_from(current)
+
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in skip_dirs or entry.is_symlink():
+                    continue
+                if rules.rules and rules.ignored(os.path.abspath(entry.path), True):
+                    continue
+                subdirs.append(entry.path)
+                continue
+            if not _matches_extension(entry.name, extensions):
+                continue
+            if rules.rules and rules.ignored(os.path.abspath(entry.path), False):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield FileEntry(entry.path, stat.st_mtime_ns, stat.st_size)
+
+        # 栈后进先出：倒序压栈，保证按名称顺序进入子目录
+        stack.extend((subdir, rules) for subdir in reversed(subdirs))
+
+
+def scan_files(directory: str, extensions: Sequence[str] = (".py",), gitignore: bool = True) -> List[FileEntry]:
+    """iter_files 的列表形式"""
+    return list(iter_files(directory, extensions, gitignore))
+
+
+# ---------- 并行读取 ----------
+
+_process_context = get_context("spawn")
+
+
+def map_files(func: Callable, items: Iterable, workers: int = SCAN_WORKERS,
+              processes: bool = False, window: Optional[int] = None) -> Iterator:
+    """
+    并行执行 func(item)，按输入顺序逐个返回结果
+
+    同时在途的任务不超过 window 个（默认 workers*4），读取大量文件时内存有上限；
+    调用方提前停止迭代时，未开始的任务被取消
+
+    Args:
+        func: 处理函数（processes=True 时必须是模块级函数）
+        items: 输入（通常是文件路径）
+        workers: 线程 / 进程数
+        processes: 是否使用进程池（适合 CPU 密集的解析；进程启动需要导入本模块，开销较大）
+        window: 在途任务数上限
+    """
+    workers = max(1, workers)
+    window = window or workers * 4
+    items = iter(items)
+    if workers == 1 and not processes:
+        for item in items:
+            yield func(item)
+        return
+
+    executor: Executor = (ProcessPoolExecutor(max_workers=workers, mp_context=_process_context) if processes
+                          else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file-scan"))
+    pending = deque()
+    try:
+        for item in itertools.islice(items, window):
+            pending.append(executor.submit(func, item))
+        while pending:
+            result = pending.popleft().result()
+            for item in itertools.islice(items, 1):
+                pending.append(executor.submit(func, item))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def read_text(path: str, errors: str = "strict") -> Optional[str]:
+    """读取UTF-8文本文件（无法读取或解码失败时返回 None）"""
+    try:
+        with open(path, 'r', encoding='utf-8', errors=errors) as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+# ---------- 输出截断 ----------
+
+def truncate(items: Sequence, limit: int, exact: bool = True) -> Tuple[list, str]:
+    """
+    截取前 limit 项，并返回说明未显示数量的提示行（未截断时为空字符串）
+
+    Args:
+        items: 全部结果
+        limit: 显示数量
+        exact: items 是否为完整结果；搜索只多取一项用于判断是否截断时传 False
+    """
+    shown = list(items[:limit])
+    if len(items) <= limit:
+        return shown, ""
+    if exact:
+        return shown, f"... 还有 {len(items) - limit} 项未显示（共 {len(items)} 项）\n"
+    return shown, f"... 仅显示前 {limit} 项，还有更多结果（请缩小范围）\n"
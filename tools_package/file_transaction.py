@@ -0,0 +1,242 @@
+"""
+原子写文件 - 临时文件 + rename，多文件事务
+- 单文件: 写入同目录下的临时文件，fsync 后用 os.replace 替换目标文件，中途崩溃不会留下写了一半的文件
+- 多文件: 先把所有文件写到临时文件，统一 fsync，再依次 rename；任何一步失败都回滚到修改前的内容
+- 目录的 fsync 按目录去重，一次事务每个目录只做一次
+- 写入完成后使工具结果缓存（及符号索引、搜索索引）中对应文件失效
+
+编辑操作（write_files 工具的 JSON 输入中的每一项）:
+    {"path": "a.py", "content": "..."}                       整个文件写入
+    {"path": "a.py", "function": "name", "code": "..."}      替换函数（同 replace_function）
+    {"path": "a.py", "line": 10, "code": "..."}              在第 line 行插入（同 insert_code）
+    {"path": "a.py", "find": "old", "replace": "new"}        替换文本（必须存在，默认替换全部）
+"""
+
+import io
+import os
+import ast
+import stat
+import tempfile
+from typing import Dict, List, Optional, Tuple, Union
+
+from .tool_cache import get_tool_cache
+
+
+# 设置为 0 时跳过 fsync（测试或临时目录中可加快速度）
+FSYNC = os.getenv("WRITE_FSYNC", "1") != "0"
+
+# 新建文件的权限与 open(path, 'w') 一致（mkstemp 默认 0600）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+# ---------- 编辑 ----------
+
+def replace_function_source(code: str, function_name: str, new_code: str) -> Optional[str]:
+    """替换 ast.walk 顺序中第一个同名函数，未找到时返回 None"""
+    tree = ast.parse(code)
+    lines = code.split('\n')
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name == function_name:
+            return '\n'.join(lines[:node.lineno - 1] + [new_code] + lines[node.end_lineno:])
+    return None
+
+
+def insert_source(code: str, line_num: int, new_code: str) -> str:
+    """在第 line_num 行之前插入一行代码"""
+    lines = io.StringIO(code).readlines()
+    lines.insert(line_num - 1, new_code + '\n')
+    return ''.join(lines)
+
+
+def apply_edit(content: Optional[str], edit: dict) -> str:
+    """
+    把一个编辑操作应用到文件内容上
+
+    Args:
+        content: 当前内容（文件不存在时为 None）
+        edit: 编辑操作（见模块说明）
+
+    Raises:
+        ValueError: 操作格式错误或无法应用
+    """
+    if "content" in edit:
+        return str(edit["content"])
+    if content is None:
+        raise ValueError("文件不存在（新文件只能使用 content 写入）")
+    if "function" in edit:
+        result = replace_function_source(content, str(edit["function"]), str(edit.get("code", "")))
+        if result is None:
+            raise ValueError(f"未找到函数: {edit['function']}")
+        return result
+    if "line" in edit:
+        return insert_source(content, int(edit["line"]), str(edit.get("code", "")))
+    if "find" in edit:
+        find, replace = str(edit["find"]), str(edit.get("replace", ""))
+        occurrences = content.count(find) if find else 0
+        if not occurrences:
+            raise ValueError(f"未找到要替换的文本: {find[:60]!r}")
+        count = int(edit.get("count", -1))
+        return content.replace(find, replace, count)
+    raise ValueError("编辑操作需要 content / function / line / find 之一")
+
+
+# ---------- 写入 ----------
+
+def _fsync_directory(directory: str) -> None:
+    """让 rename 持久化（不支持目录 fsync 的平台忽略）"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class FileTransaction:
+    """
+    多文件写入事务
+
+    用法:
+        txn = FileTransaction()
+        txn.stage("a.py", "...")
+        txn.stage("b.py", "...")
+        txn.commit()    # 全部生效或全部不生效
+    """
+
+    def __init__(self, fsync: bool = FSYNC):
+        self.fsync = fsync
+        # 绝对路径 -> 新内容（按暂存顺序；bytes 按原样写入，如恢复备份的二进制文件）
+        self._staged: Dict[str, Union[str, bytes]] = {}
+
+    def read(self, path: str) -> Optional[str]:
+        """文件在本事务中的当前内容（已暂存的优先），不存在时返回 None"""
+        path = os.path.abspath(path)
+        if path in self._staged:
+            content = self._staged[path]
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def stage(self, path: str, content: Union[str, bytes]) -> None:
+        self._staged[os.path.abspath(path)] = content
+
+    @property
+    def paths(self) -> List[str]:
+        return list(self._staged)
+
+    @staticmethod
+    def _target(path: str) -> str:
+        """实际写入的文件（符号链接写入其指向的文件，不替换链接本身）"""
+        return os.path.realpath(path)
+
+    def _write_temp(self, path: str, content: Union[str, bytes]) -> str:
+        """写入目标文件同目录下的临时文件（保留原文件权限）"""
+        path = self._target(path)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+        try:
+            if isinstance(content, bytes):
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+            else:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(content)
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else NEW_FILE_MODE
+                os.chmod(temp_path, mode)
+            except OSError:
+                pass
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return temp_path
+
+    def commit(self) -> List[str]:
+        """
+        应用所有暂存的写入
+
+        Returns:
+            写入的文件（绝对路径，按暂存顺序）
+
+        Raises:
+            OSError: 写入失败（已回滚，所有文件保持原内容）
+        """
+        temps: List[Tuple[str, str]] = []
+        originals: Dict[str, Optional[bytes]] = {}
+        replaced: List[str] = []
+        try:
+            # 1. 全部写入临时文件
+            for path, content in self._staged.items():
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        originals[path] = f.read()
+                else:
+                    originals[path] = None
+                temps.append((path, self._write_temp(path, content)))
+
+            # 2. 统一 fsync 临时文件
+            if self.fsync:
+                for _, temp_path in temps:
+                    fd = os.open(temp_path, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+
+            # 3. 依次 rename
+            for path, temp_path in temps:
+                os.replace(temp_path, self._target(path))
+                replaced.append(path)
+        except BaseException:
+            self._rollback(replaced, originals)
+            for path, temp_path in temps:
+                if path not in replaced and os.path.exists(temp_path):
+                    os.unlink(temp_path)
+            raise
+        finally:
+            # 回滚也修改了文件，同样需要使缓存失效
+            cache = get_tool_cache()
+            for path in replaced:
+                cache.invalidate(path)
+
+        # 4. 每个目录 fsync 一次，让 rename 持久化
+        if self.fsync:
+            for directory in dict.fromkeys(os.path.dirname(self._target(path)) for path in replaced):
+                _fsync_directory(directory)
+
+        committed = list(self._staged)
+        self._staged.clear()
+        return committed
+
+    def _rollback(self, replaced: List[str], originals: Dict[str, Optional[bytes]]) -> None:
+        """恢复已经 rename 的文件（新建的文件删除）"""
+        for path in reversed(replaced):
+            original = originals.get(path)
+            path = self._target(path)
+            try:
+                if original is None:
+                    os.unlink(path)
+                    continue
+                directory = os.path.dirname(path)
+                fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".rollback", dir=directory)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(original)
+                os.replace(temp_path, path)
+            except OSError:
+                continue
+
+
+def atomic_write(path: str, content: Union[str, bytes], fsync: bool = FSYNC) -> None:
+    """原子写入单个文件"""
+    txn = FileTransaction(fsync=fsync)
+    txn.stage(path, content)
+    txn.commit()
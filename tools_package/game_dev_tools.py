@@ -9,12 +9,20 @@ import re
 import subprocess
 from typing import Dict, List, Optional
 from langchain_core.tools import Tool
+from .tool_cache import memoize_by_file, invalidates_file
+from .symbol_index import get_symbol_index
+from .code_search import get_search_index, normalize_extensions
+from .file_transaction import atomic_write, insert_source, replace_function_source
+from .file_scanner import MAX_LISTED_FILES, MAX_SEARCH_RESULTS, MAX_SYMBOL_MATCHES, truncate
+from .python_pool import WorkerError, get_python_pool
+from .process_runner import get_background_jobs, run_streaming
 
 
 class CodeAnalysisTools:
     """代码分析工具 - 理解代码结构"""
     
     @staticmethod
+    @memoize_by_file("analyze_python_file")
     def analyze_python_file(filepath: str) -> str:
         """
         深度分析Python文件结构
@@ -24,46 +32,27 @@ class CodeAnalysisTools:
             if not os.path.exists(filepath):
                 return f"错误：文件 {filepath} 不存在"
             
-            with open(filepath, 'r', encoding='utf-8') as f:
-                code = f.read()
-            
-            tree = ast.parse(code)
+            # 从符号索引读取（文件未修改时不重新解析）
+            index = get_symbol_index()
+            index.update_file(filepath)
+            error = index.file_error(filepath)
+            if error:
+                return f"代码分析错误: {error}"
             
+            symbols = index.file_symbols(filepath)
             result = {
-                "imports": [],
-                "classes": [],
-                "functions": [],
+                "imports": index.file_imports(filepath),
+                "classes": [
+                    {"name": s["name"], "methods": s["methods"], "docstring": s["docstring"] or "无文档"}
+                    for s in symbols if s["kind"] == "class"
+                ],
+                "functions": [
+                    {"name": s["name"], "args": s["args"], "docstring": s["docstring"] or "无文档"}
+                    for s in symbols if s["kind"] == "function" and s["col_offset"] == 0
+                ],
                 "global_vars": []
             }
             
-            for node in ast.walk(tree):
-                # 导入语句
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        result["imports"].append(alias.name)
-                elif isinstance(node, ast.ImportFrom):
-                    module = node.module or ""
-                    for alias in node.names:
-                        result["imports"].append(f"{module}.{alias.name}")
-                
-                # 类定义
-                elif isinstance(node, ast.ClassDef):
-                    methods = [m.name for m in node.body if isinstance(m, ast.FunctionDef)]
-                    result["classes"].append({
-                        "name": node.name,
-                        "methods": methods,
-                        "docstring": ast.get_docstring(node) or "无文档"
-                    })
-                
-                # 函数定义（顶层）
-                elif isinstance(node, ast.FunctionDef) and node.col_offset == 0:
-                    args = [arg.arg for arg in node.args.args]
-                    result["functions"].append({
-                        "name": node.name,
-                        "args": args,
-                        "docstring": ast.get_docstring(node) or "无文档"
-                    })
-            
             # 格式化输出
             output = f"📄 文件分析: {filepath}\n\n"
             output += f"📦 导入 ({len(result['imports'])}个):\n"
@@ -87,6 +76,7 @@ class CodeAnalysisTools:
             return f"代码分析错误: {str(e)}"
     
     @staticmethod
+    @memoize_by_file("find_function")
     def find_function_in_file(filepath_and_function: str) -> str:
         """
         在文件中查找特定函数的代码
@@ -102,20 +92,24 @@ class CodeAnalysisTools:
             if not os.path.exists(filepath):
                 return f"错误：文件 {filepath} 不存在"
             
+            # 用符号索引定位行号范围，只读取源码截取函数
+            index = get_symbol_index()
+            index.update_file(filepath)
+            error = index.file_error(filepath)
+            if error:
+                return f"查找函数错误: {error}"
+            
+            symbol = index.find_in_file(filepath, function_name)
+            if symbol is None:
+                return f"未找到函数: {function_name}"
+            
             with open(filepath, 'r', encoding='utf-8') as f:
                 code = f.read()
             
-            tree = ast.parse(code)
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef) and node.name == function_name:
-                    # 获取函数代码
-                    lines = code.split('\n')
-                    func_code = '\n'.join(lines[node.lineno-1:node.end_lineno])
-                    
-                    return f"找到函数 {function_name}:\n\n```python\n{func_code}\n```"
+            lines = code.split('\n')
+            func_code = '\n'.join(lines[symbol["lineno"]-1:symbol["end_lineno"]])
             
-            return f"未找到函数: {function_name}"
+            return f"找到函数 {function_name}:\n\n```python\n{func_code}\n```"
         
         except Exception as e:
             return f"查找函数错误: {str(e)}"
@@ -125,6 +119,7 @@ class CodeEditingTools:
     """代码编辑工具 - 智能修改代码"""
     
     @staticmethod
+    @invalidates_file()
     def replace_function(filepath_and_code: str) -> str:
         """
         替换文件中的某个函数
@@ -143,31 +138,19 @@ class CodeEditingTools:
             with open(filepath, 'r', encoding='utf-8') as f:
                 code = f.read()
             
-            tree = ast.parse(code)
-            lines = code.split('\n')
+            new_content = replace_function_source(code, function_name, new_code)
+            if new_content is None:
+                return f"未找到函数: {function_name}"
             
-            # 找到函数位置
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef) and node.name == function_name:
-                    # 替换函数代码
-                    start_line = node.lineno - 1
-                    end_line = node.end_lineno
-                    
-                    new_lines = lines[:start_line] + [new_code] + lines[end_line:]
-                    new_content = '\n'.join(new_lines)
-                    
-                    # 写回文件
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
-                    
-                    return f"✅ 成功替换函数 {function_name} 在文件 {filepath}"
-            
-            return f"未找到函数: {function_name}"
+            # 原子写回（临时文件 + rename）
+            atomic_write(filepath, new_content)
+            return f"✅ 成功替换函数 {function_name} 在文件 {filepath}"
         
         except Exception as e:
             return f"替换函数错误: {str(e)}"
     
     @staticmethod
+    @invalidates_file()
     def insert_code(filepath_and_params: str) -> str:
         """
         在文件指定位置插入代码
@@ -184,13 +167,10 @@ class CodeEditingTools:
                 return f"错误：文件 {filepath} 不存在"
             
             with open(filepath, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # 插入代码
-            lines.insert(line_num - 1, new_code + '\n')
+                code = f.read()
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
+            # 插入代码并原子写回
+            atomic_write(filepath, insert_source(code, line_num, new_code))
             
             return f"✅ 成功在文件 {filepath} 的第 {line_num} 行插入代码"
         
@@ -367,15 +347,9 @@ class ProjectTools:
             if not os.path.exists(directory):
                 return f"错误：目录 {directory} 不存在"
             
-            python_files = []
-            for root, dirs, files in os.walk(directory):
-                # 跳过虚拟环境和缓存目录
-                dirs[:] = [d for d in dirs if d not in ['venv', '__pycache__', '.git', 'node_modules']]
-                
-                for file in files:
-                    if file.endswith('.py'):
-                        filepath = os.path.join(root, file)
-                        python_files.append(filepath)
+            # 增量更新符号索引（只解析新增或修改过的文件）
+            index = get_symbol_index()
+            python_files = index.refresh(directory)
             
             if not python_files:
                 return "未找到Python文件"
@@ -383,71 +357,96 @@ class ProjectTools:
             result = f"📁 项目结构分析 ({directory})\n\n"
             result += f"找到 {len(python_files)} 个Python文件:\n\n"
             
-            for filepath in python_files[:20]:  # 限制显示数量
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        code = f.read()
-                    
-                    tree = ast.parse(code)
-                    classes = [node.name for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]
-                    functions = [node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef) and node.col_offset == 0]
-                    
-                    result += f"📄 {filepath}\n"
-                    if classes:
-                        result += f"   类: {', '.join(classes[:5])}\n"
-                    if functions:
-                        result += f"   函数: {', '.join(functions[:5])}\n"
-                    result += "\n"
-                
-                except:
+            shown, note = truncate(python_files, MAX_LISTED_FILES)
+            for filepath in shown:
+                if index.file_error(filepath):
                     result += f"📄 {filepath} (无法解析)\n\n"
-            
-            return result
+                    continue
+                
+                symbols = index.file_symbols(filepath)
+                classes = [s["name"] for s in symbols if s["kind"] == "class"]
+                functions = [s["name"] for s in symbols if s["kind"] == "function" and s["col_offset"] == 0]
+                
+                result += f"📄 {filepath}\n"
+                if classes:
+                    result += f"   类: {', '.join(classes[:5])}\n"
+                if functions:
+                    result += f"   函数: {', '.join(functions[:5])}\n"
+                result += "\n"
+            
+            return result + note
         
         except Exception as e:
             return f"项目分析错误: {str(e)}"
     
+    @staticmethod
+    def find_symbol(directory_and_name: str) -> str:
+        """
+        在项目中按名称查找类 / 函数 / 方法的定义（查符号索引）
+        输入格式: "directory|||name" 或 "name"（默认当前目录）
+        """
+        try:
+            parts = directory_and_name.split("|||")
+            directory, name = (parts[0].strip(), parts[1].strip()) if len(parts) == 2 else (".", parts[0].strip())
+            
+            if not os.path.exists(directory):
+                return f"错误：目录 {directory} 不存在"
+            
+            index = get_symbol_index()
+            # 按项目扫描顺序排列（与 analyze_project / search_code 一致）
+            order = {os.path.abspath(path): i for i, path in enumerate(index.refresh(directory))}
+            matches = index.lookup(name, directory, limit=-1)
+            matches.sort(key=lambda symbol: order.get(symbol["path"], len(order)))
+            
+            if not matches:
+                return f"未找到符号: {name}"
+            
+            shown, note = truncate(matches, MAX_SYMBOL_MATCHES)
+            output = f"🔎 符号 '{name}' ({len(matches)}处):\n\n"
+            for symbol in shown:
+                location = os.path.relpath(symbol["path"], directory)
+                owner = f" (类 {symbol['parent']} 的方法)" if symbol["parent"] else ""
+                output += f"{location}:{symbol['lineno']}-{symbol['end_lineno']}  {symbol['kind']} {name}{owner}\n"
+            return output + note
+        
+        except Exception as e:
+            return f"查找符号错误: {str(e)}"
+    
     @staticmethod
     def search_code(directory_and_pattern: str) -> str:
         """
-        在项目中搜索代码模式
-        输入格式: "directory|||search_pattern"
+        在项目中搜索代码模式（正则表达式，使用三元组索引筛选候选文件）
+        输入格式: "directory|||search_pattern" 或 "directory|||search_pattern|||文件类型"
+        文件类型: 逗号分隔的扩展名（如 "py,js,html"），"all" 表示所有文件，默认只搜索 .py
         """
         try:
             parts = directory_and_pattern.split("|||")
-            if len(parts) != 2:
-                return "错误：参数格式应为 'directory|||search_pattern'"
+            if len(parts) not in (2, 3):
+                return "错误：参数格式应为 'directory|||search_pattern' 或 'directory|||search_pattern|||文件类型'"
             
             directory, pattern = parts[0].strip(), parts[1].strip()
+            extensions = normalize_extensions(parts[2] if len(parts) == 3 else None)
             
             if not os.path.exists(directory):
                 return f"错误：目录 {directory} 不存在"
             
-            results = []
-            for root, dirs, files in os.walk(directory):
-                dirs[:] = [d for d in dirs if d not in ['venv', '__pycache__', '.git']]
-                
-                for file in files:
-                    if file.endswith('.py'):
-                        filepath = os.path.join(root, file)
-                        try:
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                lines = f.readlines()
-                            
-                            for i, line in enumerate(lines, 1):
-                                if re.search(pattern, line):
-                                    results.append(f"{filepath}:{i}: {line.strip()}")
-                        except:
-                            continue
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                return f"错误：无效的正则表达式 '{pattern}': {e}"
+            
+            # 多取一条，用于判断结果是否被截断
+            results, _ = get_search_index().search(directory, pattern, extensions, limit=MAX_SEARCH_RESULTS + 1)
             
             if not results:
                 return f"未找到匹配 '{pattern}' 的代码"
             
+            shown, note = truncate(results, MAX_SEARCH_RESULTS, exact=False)
             output = f"🔍 搜索结果 (模式: '{pattern}'):\n\n"
-            for result in results[:30]:  # 限制显示数量
+            for result in shown:
                 output += f"{result}\n"
             
-            return output
+            return output + note
         
         except Exception as e:
             return f"搜索错误: {str(e)}"
@@ -465,13 +464,27 @@ class TestingTools:
             if not os.path.exists(filepath):
                 return f"错误：文件 {filepath} 不存在"
             
-            result = subprocess.run(
-                ['python', filepath],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                timeout=10
-            )
+            result = None
+            pool = get_python_pool()
+            if pool is not None:
+                # 预热的工作进程中 fork 执行，省去解释器启动和导入常用库的时间
+                try:
+                    result = pool.run("file", filepath, timeout=10)
+                except WorkerError as e:
+                    if e.delivered:
+                        # 文件可能已经部分执行，不再重新运行（避免重复产生副作用）
+                        return f"❌ 运行中断: 工作进程异常（{e}），文件可能已部分执行，未重新运行"
+                    result = None
+                if result is not None and result.timed_out:
+                    return "⏱️ 执行超时 (>10秒)"
+            if result is None:
+                result = subprocess.run(
+                    ['python', filepath],
+                    capture_output=True,
+                    text=True,
+                    encoding='utf-8',
+                    timeout=10
+                )
             
             output = f"🚀 运行文件: {filepath}\n\n"
             
@@ -490,6 +503,7 @@ class TestingTools:
             return f"运行错误: {str(e)}"
     
     @staticmethod
+    @memoize_by_file("check_syntax")
     def check_syntax(filepath: str) -> str:
         """
         检查Python文件的语法错误
@@ -517,17 +531,17 @@ class TerminalTools:
     @staticmethod
     def run_terminal_command(command: str) -> str:
         """
-        执行终端命令并返回结果
+        执行终端命令并返回结果（输出边执行边推送，超时后返回已有的输出）
         """
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                timeout=30
-            )
+            result = run_streaming(command, timeout=30, shell=True, tool="run_command")
+            
+            if result.timed_out:
+                output = f"⏱️ 命令执行超时 (>30秒): {command}\n"
+                output += "长时间运行的命令请使用 run_command_background 在后台执行\n"
+                if result.stdout or result.stderr:
+                    output += f"\n超时前的输出:\n{result.stdout}{result.stderr}"
+                return output
             
             output = f"🔧 命令: {command}\n"
             output += f"📊 退出码: {result.returncode}\n\n"
@@ -543,10 +557,68 @@ class TerminalTools:
             
             return output
         
-        except subprocess.TimeoutExpired:
-            return f"⏱️ 命令执行超时 (>30秒): {command}"
         except Exception as e:
             return f"执行命令错误: {str(e)}"
+    
+    @staticmethod
+    def _format_job(status) -> str:
+        """后台任务状态 + 新输出"""
+        if status.running:
+            output = f"⏳ 任务 {status.job_id} 运行中 ({status.elapsed:.0f}秒): {status.command}\n"
+        else:
+            icon = "✅" if status.returncode == 0 else "❌"
+            output = f"{icon} 任务 {status.job_id} 已结束 (退出码: {status.returncode}, 用时 {status.elapsed:.0f}秒): {status.command}\n"
+        if status.output:
+            output += f"\n新输出:\n{status.output}"
+        else:
+            output += "\n（没有新输出）"
+        return output
+    
+    @staticmethod
+    def run_background_command(command: str) -> str:
+        """
+        在后台启动长时间运行的命令（如开发服务器、长时间的构建），立即返回任务编号
+        """
+        try:
+            job_id = get_background_jobs().start(command)
+            return (f"🚀 已在后台启动任务 {job_id}: {command}\n"
+                    f"使用 check_command 查看输出（输入: {job_id}），stop_command 结束任务")
+        except Exception as e:
+            return f"启动后台命令错误: {str(e)}"
+    
+    @staticmethod
+    def check_background_command(job_id: str = "") -> str:
+        """
+        查看后台任务的状态和上次查看之后的新输出；输入为空时列出所有任务
+        """
+        try:
+            jobs = get_background_jobs()
+            if not job_id.strip():
+                statuses = jobs.list()
+                if not statuses:
+                    return "没有后台任务"
+                lines = ["📋 后台任务:"]
+                for status in statuses:
+                    state = "运行中" if status.running else f"已结束 (退出码: {status.returncode})"
+                    lines.append(f"  [{status.job_id}] {state} {status.elapsed:.0f}秒 - {status.command}")
+                return "\n".join(lines)
+            return TerminalTools._format_job(jobs.poll(job_id))
+        except KeyError as e:
+            return f"错误：{e.args[0]}"
+        except Exception as e:
+            return f"查看后台任务错误: {str(e)}"
+    
+    @staticmethod
+    def stop_background_command(job_id: str) -> str:
+        """
+        结束后台任务
+        """
+        try:
+            return TerminalTools._format_job(get_background_jobs().stop(job_id))
+        except KeyError as e:
+            return f"错误：{e.args[0]}"
+        except Exception as e:
+            return f"结束后台任务错误: {str(e)}"
 
 
 class PythonTools:
@@ -558,21 +630,19 @@ class PythonTools:
         安装Python包
         """
         try:
-            result = subprocess.run(
-                ['pip', 'install', package],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                timeout=120
-            )
+            result = run_streaming(['pip', 'install', package], timeout=120, tool="pip_install")
             
+            if result.timed_out:
+                return f"⏱️ 安装超时: {package}"
             if result.returncode == 0:
+                # 预热的工作进程中已导入的模块可能已被升级，重新启动
+                pool = get_python_pool()
+                if pool is not None:
+                    pool.restart()
                 return f"✅ 成功安装包: {package}\n{result.stdout}"
             else:
                 return f"❌ 安装失败: {package}\n{result.stderr}"
         
-        except subprocess.TimeoutExpired:
-            return f"⏱️ 安装超时: {package}"
         except Exception as e:
             return f"安装错误: {str(e)}"
     
@@ -750,10 +820,15 @@ def create_game_dev_tools() -> List[Tool]:
             func=ProjectTools.analyze_project_structure,
             description="分析项目结构，列出所有Python文件及其组成。输入：目录路径（默认'.'）。Analyze project structure."
         ),
+        Tool(
+            name="find_symbol",
+            func=ProjectTools.find_symbol,
+            description="在项目中按名称查找类/函数/方法的定义位置（使用符号索引，很快）。输入格式：'目录|||名称' 或 '名称'。Find symbol definition."
+        ),
         Tool(
             name="search_code",
             func=ProjectTools.search_code,
-            description="在项目中搜索代码模式。输入格式：'目录|||搜索模式'。Search code in project."
+            description="在项目中搜索代码模式（正则表达式）。输入格式：'目录|||搜索模式' 或 '目录|||搜索模式|||文件类型'（如 'py,js,html'，默认 py，'all' 为所有文件）。Search code in project."
         ),
         
         # ==================== 测试验证工具 ====================
@@ -772,7 +847,22 @@ def create_game_dev_tools() -> List[Tool]:
         Tool(
             name="run_command",
             func=TerminalTools.run_terminal_command,
-            description="执行终端命令。输入：命令字符串（如 'ls -la' 或 'npm install'）。Run terminal command."
+            description="执行终端命令（最多30秒，输出实时显示）。输入：命令字符串（如 'ls -la' 或 'npm install'）。Run terminal command."
+        ),
+        Tool(
+            name="run_command_background",
+            func=TerminalTools.run_background_command,
+            description="在后台启动长时间运行的命令（开发服务器、长时间构建等），立即返回任务编号。输入：命令字符串。Run command in background."
+        ),
+        Tool(
+            name="check_command",
+            func=TerminalTools.check_background_command,
+            description="查看后台任务的状态和新输出。输入：任务编号（为空时列出所有后台任务）。Check background command."
+        ),
+        Tool(
+            name="stop_command",
+            func=TerminalTools.stop_background_command,
+            description="结束后台任务。输入：任务编号。Stop background command."
         ),
         
         # ==================== Python环境工具 ====================
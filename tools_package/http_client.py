@@ -0,0 +1,226 @@
+"""
+共享HTTP客户端 - 进程内复用连接池
+- LLM客户端按 base_url 各自一个连接池（同一服务商的所有Agent共用，TLS连接保持复用）
+- 异步客户端的连接属于创建它的事件循环，每个事件循环各自一个连接池（asyncio.run 每次都新建事件循环）
+- 网页类工具共用一个客户端（httpx 内部按域名维护 keep-alive 连接）
+- 安装了 h2 时启用 HTTP/2
+- 连接池大小可通过环境变量配置：
+    HTTP_MAX_CONNECTIONS       每个连接池的最大连接数（默认100）
+    HTTP_MAX_KEEPALIVE         每个连接池保持的空闲连接数（默认20）
+    HTTP_KEEPALIVE_EXPIRY      空闲连接保持秒数（默认30）
+    HTTP2_ENABLED              是否启用HTTP/2（默认1，未安装 h2 时自动关闭）
+"""
+
+import os
+import asyncio
+import threading
+from typing import Callable, Dict, Optional
+import httpx
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    # 与 openai SDK 默认客户端保持一致的超时、重定向等设置
+    from openai import DefaultHttpxClient, DefaultAsyncHttpxClient
+except ImportError:  # 旧版本 openai
+    DefaultHttpxClient = None
+    DefaultAsyncHttpxClient = None
+
+
+# openai SDK 的默认超时（旧版本 openai 没有 DefaultHttpxClient 时使用）
+LLM_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+# 默认的 base_url（未指定时 openai SDK 使用官方地址）
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def apparent_encoding(content: bytes) -> Optional[str]:
+    """根据内容推测编码（与 requests 的 apparent_encoding 相同，使用 charset_normalizer）"""
+    try:
+        from charset_normalizer import from_bytes
+    except ImportError:
+        return None
+    best = from_bytes(content[:65536]).best()
+    return best.encoding if best else None
+
+
+_AsyncClientBase = DefaultAsyncHttpxClient if DefaultAsyncHttpxClient is not None else httpx.AsyncClient
+
+
+class LoopBoundAsyncClient(_AsyncClientBase):
+    """
+    按事件循环分配连接池的异步客户端
+
+    ChatOpenAI 创建时就固定了 http_async_client，而 httpx 的连接不能跨事件循环使用：
+    第一次 asyncio.run 结束后，第二次调用会复用已关闭循环上的连接，报 "Event loop is closed"。
+    本客户端只负责构造请求，发送时交给当前事件循环对应的客户端，循环关闭后丢弃。
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncClient]):
+        super().__init__()
+        self._factory = factory
+        self._loop_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._loop_lock = threading.Lock()
+
+    def _loop_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            for closed in [other for other in self._loop_clients if other.is_closed()]:
+                del self._loop_clients[closed]
+            client = self._loop_clients.get(loop)
+            if client is None:
+                client = self._loop_clients[loop] = self._factory()
+            return client
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await self._loop_client().send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的连接池"""
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            client = self._loop_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+        await super().aclose()
+
+
+class HTTPClientManager:
+    """HTTP客户端管理器 - 按 base_url 缓存 httpx 客户端"""
+
+    def __init__(self,
+                 max_connections: Optional[int] = None,
+                 max_keepalive: Optional[int] = None,
+                 keepalive_expiry: Optional[float] = None,
+                 http2: Optional[bool] = None):
+        """
+        初始化管理器（参数为 None 时读取环境变量）
+
+        Args:
+            max_connections: 每个连接池的最大连接数
+            max_keepalive: 每个连接池保持的空闲连接数
+            keepalive_expiry: 空闲连接保持秒数
+            http2: 是否启用HTTP/2（需要安装 h2）
+        """
+        self.max_connections = max_connections or _env_int("HTTP_MAX_CONNECTIONS", 100)
+        self.max_keepalive = max_keepalive or _env_int("HTTP_MAX_KEEPALIVE", 20)
+        self.keepalive_expiry = keepalive_expiry or float(_env_int("HTTP_KEEPALIVE_EXPIRY", 30))
+        if http2 is None:
+            http2 = os.getenv("HTTP2_ENABLED", "1").lower() in ("1", "true", "yes")
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        self._clients: Dict[str, object] = {}
+        self._async_clients: Dict[str, object] = {}
+        self._web_client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    @staticmethod
+    def _key(base_url: Optional[str]) -> str:
+        return (base_url or DEFAULT_BASE_URL).rstrip("/")
+
+    def get_client(self, base_url: Optional[str] = None):
+        """获取 base_url 对应的同步客户端（供 openai SDK 使用）"""
+        key = self._key(base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if DefaultHttpxClient is not None:
+                    client = DefaultHttpxClient(limits=self._limits(), http2=self.http2)
+                else:
+                    client = httpx.Client(limits=self._limits(), http2=self.http2,
+                                          timeout=LLM_TIMEOUT, follow_redirects=True)
+                self._clients[key] = client
+            return client
+
+    def _new_async_client(self) -> httpx.AsyncClient:
+        if DefaultAsyncHttpxClient is not None:
+            return DefaultAsyncHttpxClient(limits=self._limits(), http2=self.http2)
+        return httpx.AsyncClient(limits=self._limits(), http2=self.http2,
+                                 timeout=LLM_TIMEOUT, follow_redirects=True)
+
+    def get_async_client(self, base_url: Optional[str] = None):
+        """获取 base_url 对应的异步客户端（供 openai SDK 使用，每个事件循环各自一个连接池）"""
+        key = self._key(base_url)
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                client = LoopBoundAsyncClient(self._new_async_client)
+                self._async_clients[key] = client
+            return client
+
+    def llm_client_kwargs(self, base_url: Optional[str] = None) -> dict:
+        """ChatOpenAI 的 http_client / http_async_client 参数"""
+        return {
+            "http_client": self.get_client(base_url),
+            "http_async_client": self.get_async_client(base_url),
+        }
+
+    def web_client(self) -> httpx.Client:
+        """网页类工具共用的客户端"""
+        with self._lock:
+            if self._web_client is None:
+                self._web_client = httpx.Client(
+                    limits=self._limits(),
+                    http2=self.http2,
+                    follow_redirects=True
+                )
+            return self._web_client
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        """使用共享客户端发送 GET 请求"""
+        return self.web_client().get(url, **kwargs)
+
+    def stats(self) -> dict:
+        """连接池信息"""
+        with self._lock:
+            return {
+                "llm_pools": sorted(self._clients),
+                "async_llm_pools": sorted(self._async_clients),
+                "web_client": self._web_client is not None,
+                "http2": self.http2,
+                "max_connections": self.max_connections,
+                "max_keepalive": self.max_keepalive,
+                "keepalive_expiry": self.keepalive_expiry,
+            }
+
+    def close(self) -> None:
+        """关闭同步客户端（异步客户端需在事件循环中关闭，这里只丢弃引用）"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            if self._web_client is not None:
+                self._web_client.close()
+            self._clients.clear()
+            self._async_clients.clear()
+            self._web_client = None
+
+
+_manager: Optional[HTTPClientManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_http_manager() -> HTTPClientManager:
+    """进程内共享的 HTTPClientManager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = HTTPClientManager()
+        return _manager
@@ -0,0 +1,310 @@
+"""
+代码检查 - 语法（ast）、风格（ruff）、类型（mypy）三项检查并发执行（mypy 跳过有语法错误的文件）
+- ruff: 一次调用检查一批文件（--output-format json），结果按文件分组；ruff 自身的缓存在项目的 .ruff_cache 中
+- mypy: 缓存目录固定在 .agent_cache 下（增量模式，只重新分析修改过的文件及依赖它们的文件）
+    - 单个文件: 通过 dmypy 守护进程检查，守护进程在内存中保留已分析的模块（包括导入的第三方库），
+      多次检查同一批文件时比读取缓存还快；dmypy 不可用或崩溃时退回 mypy 命令；进程退出时结束守护进程
+    - 整个项目: mypy 命令（守护进程同一时刻只保留一组文件，分批检查时来回切换要重新分析，读取缓存更快）
+    - 模块名冲突的文件（如多个脚本目录中都有 config.py）分批检查
+- check_code_quality（单个文件）和 check_project_quality（整个项目）共用
+- 环境变量:
+    MYPY_DAEMON          0 表示不使用 dmypy，每次运行 mypy 命令
+    LINT_TIMEOUT         单个文件每项检查的超时秒数（默认60；dmypy 首次启动需要分析全部依赖）
+    PROJECT_LINT_TIMEOUT 整个项目每项检查的超时秒数（默认300）
+    DMYPY_IDLE_TIMEOUT   守护进程空闲多少秒后自动退出（默认1800）
+"""
+
+import os
+import re
+import ast
+import json
+import time
+import atexit
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from .file_scanner import map_files, read_text
+
+
+LINT_TIMEOUT = float(os.getenv("LINT_TIMEOUT", 60))
+PROJECT_LINT_TIMEOUT = float(os.getenv("PROJECT_LINT_TIMEOUT", 300))
+
+# 绝对路径：工作目录改变后（如 batch_runner 切换到任务目录）仍连接同一个守护进程、使用同一个缓存
+DMYPY_STATUS_FILE = os.path.abspath(os.path.join(".agent_cache", "dmypy.json"))
+MYPY_CACHE_DIR = os.path.abspath(os.path.join(".agent_cache", "mypy_cache"))
+
+# 每次 ruff 调用最多检查的文件数（避免命令行过长）
+RUFF_BATCH = 500
+
+# mypy 输出行: 路径:行:[列:] error|note: 信息
+_MYPY_LINE = re.compile(r"^(.+?):(\d+):(?:\d+:)? (error|note|warning): ")
+# mypy 的阻断性错误（没有行号，如 "路径: error: Duplicate module named ..."）
+_MYPY_BLOCKING = re.compile(r"^\S.*?: error: ", re.MULTILINE)
+
+
+class LintResult(NamedTuple):
+    """一个检查器的结果"""
+    tool: str
+    available: bool                 # 是否已安装
+    timed_out: bool
+    issues: Dict[str, List[str]]    # 绝对路径 -> 问题（每行一条）
+    error: str = ""                 # 检查器本身出错时的输出
+
+    @property
+    def total(self) -> int:
+        return sum(len(lines) for lines in self.issues.values())
+
+
+class QualityReport(NamedTuple):
+    """一批文件的检查结果"""
+    files: List[str]
+    syntax: Dict[str, str]          # 绝对路径 -> 语法错误
+    ruff: LintResult
+    mypy: LintResult
+
+
+def _syntax_error(path: str) -> Optional[str]:
+    code = read_text(path, errors='replace')
+    if code is None:
+        return "无法读取文件"
+    try:
+        ast.parse(code, filename=path)
+    except SyntaxError as e:
+        return f"第{e.lineno}行 - {e.msg}"
+    return None
+
+
+def check_syntax(paths: Sequence[str]) -> Dict[str, str]:
+    """ast 语法检查，返回 {绝对路径: 错误}（只包含有错误的文件）"""
+    errors = {}
+    for path, error in zip(paths, map_files(_syntax_error, paths)):
+        if error:
+            errors[os.path.abspath(path)] = error
+    return errors
+
+
+def run_ruff(paths: Sequence[str], timeout: float = LINT_TIMEOUT) -> LintResult:
+    """ruff 批量检查（每 RUFF_BATCH 个文件一次调用）"""
+    issues: Dict[str, List[str]] = {}
+    for start in range(0, len(paths), RUFF_BATCH):
+        batch = [os.path.abspath(path) for path in paths[start:start + RUFF_BATCH]]
+        try:
+            result = subprocess.run(
+                ['ruff', 'check', '--output-format', 'json', '--force-exclude', *batch],
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                timeout=timeout
+            )
+        except FileNotFoundError:
+            return LintResult("ruff", False, False, {})
+        except subprocess.TimeoutExpired:
+            return LintResult("ruff", True, True, issues)
+        if result.returncode not in (0, 1):
+            return LintResult("ruff", True, False, issues, result.stderr.strip())
+        try:
+            diagnostics = json.loads(result.stdout or "[]")
+        except json.JSONDecodeError:
+            return LintResult("ruff", True, False, issues, result.stdout[:500])
+        for item in diagnostics:
+            path = os.path.abspath(item["filename"])
+            location = item.get("location") or {}
+            code = f"{item['code']} " if item.get("code") else ""
+            issues.setdefault(path, []).append(
+                f"{location.get('row', 0)}:{location.get('column', 0)}: {code}{item['message']}")
+    return LintResult("ruff", True, False, issues)
+
+
+# 同一个守护进程同一时刻只处理一个请求；进程内的调用排队，避免客户端之间互相等待超时
+_dmypy_lock = threading.Lock()
+
+# 守护进程当前检查的文件（模块名 -> 路径）。守护进程只保留这些文件及其导入的模块，换成另一组文件时
+# 被移出的模块下次要从头分析，所以每次检查在这组文件的基础上增加文件（模块名冲突时才替换），结果只取请求的文件
+_daemon_files: Dict[str, str] = {}
+
+# 是否已注册进程退出时结束守护进程
+_exit_hook_registered = False
+
+
+def _mypy_command(paths: List[str], daemon: bool) -> List[str]:
+    options = ['--cache-dir', MYPY_CACHE_DIR, '--show-absolute-path', '--no-error-summary']
+    if not daemon:
+        return ['mypy', *options, *paths]
+    return ['dmypy', '--status-file', DMYPY_STATUS_FILE, 'run',
+            '--timeout', os.getenv("DMYPY_IDLE_TIMEOUT", "1800"), '--', *options, *paths]
+
+
+def _kill_daemon() -> None:
+    """结束守护进程并删除状态文件（dmypy kill 不删除状态文件，之后的 dmypy run 会一直连接失败而不是重新启动）"""
+    try:
+        subprocess.run(['dmypy', '--status-file', DMYPY_STATUS_FILE, 'kill'], capture_output=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+    try:
+        os.remove(DMYPY_STATUS_FILE)
+    except OSError:
+        pass
+    _daemon_files.clear()
+
+
+def _register_exit_hook() -> None:
+    """第一次使用守护进程时注册：进程退出时结束守护进程（调用方持有 _dmypy_lock）"""
+    global _exit_hook_registered
+    if not _exit_hook_registered:
+        atexit.register(_kill_daemon)
+        _exit_hook_registered = True
+
+
+def _parse_mypy(output: str) -> Dict[str, List[str]]:
+    issues: Dict[str, List[str]] = {}
+    path = None
+    for line in output.splitlines():
+        match = _MYPY_LINE.match(line)
+        if match:
+            path = os.path.abspath(match.group(1))
+            issues.setdefault(path, []).append(line[len(match.group(1)) + 1:])
+        elif path and line.strip():
+            # 多行的 note 等接在上一条之后
+            issues[path].append(line)
+    return issues
+
+
+def _module_name(path: str) -> tuple:
+    """mypy 为文件推断的模块名及其所在的根目录（向上查找 __init__.py）"""
+    directory = os.path.dirname(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    parts = [] if stem == "__init__" else [stem]
+    while os.path.exists(os.path.join(directory, "__init__.py")):
+        parts.insert(0, os.path.basename(directory))
+        directory = os.path.dirname(directory)
+    return directory, ".".join(parts)
+
+
+def _mypy_batches(paths: List[str]) -> List[List[str]]:
+    """
+    把文件分成模块名互不重复的几批
+
+    mypy 一次检查中不允许两个文件对应同一个模块名（如多个脚本目录中都有 config.py），
+    同一根目录下的文件放在同一批（目录内的相互导入能正确解析），根目录之间模块名不冲突时合并
+    """
+    groups: Dict[str, Dict[str, str]] = {}
+    for path in paths:
+        root, module = _module_name(path)
+        groups.setdefault(root, {}).setdefault(module, path)
+    batches: List[Dict[str, str]] = []
+    for modules in sorted(groups.values(), key=len, reverse=True):
+        for batch in batches:
+            if batch.keys().isdisjoint(modules):
+                batch.update(modules)
+                break
+        else:
+            batches.append(dict(modules))
+    return [list(batch.values()) for batch in batches]
+
+
+def _run_mypy_batch(paths: List[str], timeout: float, daemon: bool) -> LintResult:
+    """检查一批模块名不冲突的文件"""
+    deadline = time.monotonic() + timeout
+    requested = {_module_name(path)[1]: path for path in paths}
+    wanted = set(requested.values())
+    with _dmypy_lock:
+        # 依次尝试: dmypy（加上守护进程中已有的文件）、dmypy（只检查请求的文件；崩溃后守护进程自动重新启动）、mypy
+        attempts = []
+        # 有语法错误的文件不交给守护进程（守护进程出现语法错误后停止检查其余文件，文件修复或移出后错误也可能不清除）
+        if daemon and os.getenv("MYPY_DAEMON", "1") != "0" and not any(map(_syntax_error, paths)):
+            resident = {module: path for module, path in _daemon_files.items() if os.path.exists(path)}
+            if all(resident.get(module, path) == path for module, path in requested.items()):
+                attempts.append((True, {**resident, **requested}))
+            attempts.append((True, requested))
+        attempts.append((False, requested))
+        
+        while attempts:
+            use_daemon, files = attempts.pop(0)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return LintResult("mypy", True, True, {})
+            if use_daemon:
+                _daemon_files.clear()
+                _register_exit_hook()
+            try:
+                result = subprocess.run(
+                    _mypy_command(list(files.values()), use_daemon),
+                    capture_output=True,
+                    text=True,
+                    encoding='utf-8',
+                    timeout=remaining
+                )
+            except FileNotFoundError:
+                continue
+            except subprocess.TimeoutExpired:
+                # 守护进程继续分析，下次检查时可以直接使用结果
+                return LintResult("mypy", True, True, {})
+            if result.returncode in (0, 1):
+                issues = _parse_mypy(result.stdout)
+                if use_daemon and any(path not in wanted and any(line.endswith("[syntax]") for line in lines)
+                                      for path, lines in issues.items()):
+                    # 守护进程中已有的文件后来出现了语法错误，其余文件没有被检查：结束守护进程，改用 mypy 命令
+                    _kill_daemon()
+                    attempts = [(False, requested)]
+                    continue
+                if use_daemon:
+                    _daemon_files.update(files)
+                return LintResult("mypy", True, False,
+                                  {path: issues[path] for path in paths if path in issues})
+            output = (result.stdout + result.stderr).strip()
+            # mypy 本身报告的阻断性错误（模块名冲突、配置错误等）：只检查请求的文件时换一种方式结果相同，直接返回；
+            # 内部错误、守护进程崩溃或连接失败时结束守护进程，换下一种方式
+            blocking = _MYPY_BLOCKING.search(output) and "Traceback (most recent call last)" not in output
+            if not attempts or (blocking and files == requested):
+                issues = _parse_mypy(result.stdout)
+                if blocking and issues:
+                    # 语法错误等带行号的错误
+                    return LintResult("mypy", True, False,
+                                      {path: issues[path] for path in paths if path in issues})
+                return LintResult("mypy", True, False, {}, output[-500:])
+            if use_daemon and not blocking:
+                _kill_daemon()
+    return LintResult("mypy", False, False, {})
+
+
+def run_mypy(paths: Sequence[str], timeout: float = LINT_TIMEOUT, daemon: bool = True) -> LintResult:
+    """
+    mypy 类型检查（模块名冲突的文件分批检查）
+
+    Args:
+        paths: 文件路径
+        timeout: 超时秒数
+        daemon: 是否优先通过 dmypy 守护进程（适合反复检查少量文件）
+    """
+    os.makedirs(os.path.dirname(DMYPY_STATUS_FILE), exist_ok=True)
+    deadline = time.monotonic() + timeout
+    issues: Dict[str, List[str]] = {}
+    # 最大的一批最后检查（使用守护进程时检查后留在守护进程中）
+    for batch in reversed(_mypy_batches([os.path.abspath(path) for path in paths])):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return LintResult("mypy", True, True, issues)
+        result = _run_mypy_batch(batch, remaining, daemon)
+        if not result.available or result.timed_out or result.error:
+            return result._replace(issues={**issues, **result.issues})
+        issues.update(result.issues)
+    return LintResult("mypy", True, False, issues)
+
+
+def check_files(paths: Sequence[str], timeout: float = LINT_TIMEOUT, daemon: bool = True) -> QualityReport:
+    """
+    并发执行三项检查（daemon 见 run_mypy）
+
+    ruff 与语法检查同时开始；mypy 在语法检查之后开始，跳过有语法错误的文件
+    （mypy 遇到语法错误时停止检查其余文件）
+    """
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="lint") as executor:
+        ruff = executor.submit(run_ruff, paths, timeout)
+        syntax = check_syntax(paths)
+        valid = [path for path in paths if os.path.abspath(path) not in syntax]
+        mypy = executor.submit(run_mypy, valid, timeout, daemon) if valid else None
+        return QualityReport(paths, syntax, ruff.result(),
+                             mypy.result() if mypy else LintResult("mypy", True, False, {}))
@@ -0,0 +1,381 @@
+"""
+增量执行子进程 - 长时间运行的命令边执行边输出
+- 流式: 读到的输出（每 0.1 秒合并一次）通过 LangGraph 自定义流（stream_mode="custom"）推送 {"type": "tool_output", ...}，
+  UniversalAgent 转发给 stream_callback；不在 Agent 中调用时不推送
+- 有界缓冲: 每个输出流只保留开头和末尾（OutputBuffer），长输出不会占满内存，也不会撑爆观察结果
+- 后台运行: get_background_jobs().start() 返回任务编号，之后用 poll() 取新输出和状态，stop() 结束
+- 超时: 结束整个进程组（包括 shell 启动的子进程），返回超时前已有的输出
+"""
+
+import os
+import time
+import codecs
+import queue
+import atexit
+import signal
+import itertools
+import threading
+import subprocess
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+
+# 每个输出流保留的开头 / 末尾字符数（与原来的观察结果长度相当）
+HEAD_CHARS = 2000
+TAIL_CHARS = 6000
+
+# 每次从管道读取的最大字节数
+READ_CHUNK = 64 * 1024
+
+# 推送间隔（秒）：期间到达的输出合并成一个事件；单个事件最多 STREAM_EVENT_CHARS 个字符（超出只保留末尾）
+STREAM_INTERVAL = 0.1
+STREAM_EVENT_CHARS = 4000
+
+# 同时运行的后台任务上限，已结束的任务最多保留的个数
+MAX_BACKGROUND_JOBS = 8
+MAX_FINISHED_JOBS = 20
+
+# 流式推送的事件类型
+OUTPUT_EVENT = "tool_output"
+
+
+class OutputBuffer:
+    """
+    只保留开头 head_chars 和末尾约 tail_chars 个字符的输出缓冲
+
+    按块追加（不逐行处理），开头在行尾截断，末尾从完整的行开始，中间注明省略的行数
+    """
+
+    def __init__(self, head_chars: int = HEAD_CHARS, tail_chars: int = TAIL_CHARS):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self._head: List[str] = []
+        self._head_size = 0
+        self._head_full = False
+        self._tail: deque = deque()
+        self._tail_size = 0
+        self._dropped = False
+        self.lines = 0      # 换行符个数
+        self.chars = 0
+
+    def append(self, text: str) -> None:
+        if not text:
+            return
+        self.chars += len(text)
+        self.lines += text.count("\n")
+        if not self._head_full:
+            room = self.head_chars - self._head_size
+            if len(text) <= room:
+                self._head.append(text)
+                self._head_size += len(text)
+                return
+            cut = text.rfind("\n", 0, room) + 1
+            self._head.append(text[:cut])
+            self._head_size += cut
+            self._head_full = True
+            text = text[cut:]
+        self._tail.append(text)
+        self._tail_size += len(text)
+        while self._tail_size - len(self._tail[0]) >= self.tail_chars:
+            self._tail_size -= len(self._tail.popleft())
+            self._dropped = True
+
+    def text(self) -> str:
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if not self._dropped and len(tail) <= self.tail_chars:
+            return head + tail
+        tail = tail[-self.tail_chars:]
+        newline = tail.find("\n")
+        if 0 <= newline < len(tail) - 1:
+            tail = tail[newline + 1:]
+        omitted = self.lines - head.count("\n") - tail.count("\n")
+        return head + f"\n... 省略 {omitted} 行 ...\n\n" + tail
+
+    def __bool__(self) -> bool:
+        return self.chars > 0
+
+
+class ProcessResult(NamedTuple):
+    """执行结果（字段与 subprocess.CompletedProcess 对应，输出为截断后的文本）"""
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    timed_out: bool
+    duration: float
+
+
+def _stream_writer() -> Optional[Callable]:
+    """当前 LangGraph 运行的自定义流写入函数（不在图中执行时返回 None）"""
+    try:
+        from langgraph.config import get_stream_writer
+        return get_stream_writer()
+    except (ImportError, RuntimeError):
+        return None
+
+
+class StreamingProcess:
+    """
+    输出逐行读取的子进程
+
+    两个读取线程分别读取 stdout / stderr，写入有界缓冲；
+    stream=True 时同时放入队列，由调用 wait() 的线程推送（保证推送发生在工具所在的上下文中）
+    """
+
+    def __init__(self, args: Union[str, List[str]], shell: bool = False, cwd: Optional[str] = None,
+                 stream: bool = True):
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        self.args = args
+        self.command = args if isinstance(args, str) else " ".join(args)
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.process = subprocess.Popen(
+            args,
+            shell=shell,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=(os.name != 'nt'),
+        )
+        self.stdout = OutputBuffer()
+        self.stderr = OutputBuffer()
+        # 上次 poll 之后的新输出（stdout / stderr 按到达顺序交错）
+        self.unread = OutputBuffer()
+        self.timed_out = False
+        self._queue: Optional[queue.Queue] = queue.Queue() if stream else None
+        self._lock = threading.Lock()
+        self._readers = [
+            threading.Thread(target=self._read, args=(self.process.stdout, "stdout", self.stdout),
+                             name="process-stdout", daemon=True),
+            threading.Thread(target=self._read, args=(self.process.stderr, "stderr", self.stderr),
+                             name="process-stderr", daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def _read(self, pipe, name: str, buffer: OutputBuffer) -> None:
+        """按块读取（read1 有多少读多少，不等满块），解码后写入缓冲和推送队列"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            while True:
+                data = pipe.read1(READ_CHUNK)
+                text = decoder.decode(data, final=not data).replace("\r\n", "\n")
+                if text:
+                    with self._lock:
+                        buffer.append(text)
+                        self.unread.append(text)
+                    if self._queue is not None:
+                        self._queue.put((name, text))
+                if not data:
+                    break
+        except (OSError, ValueError):
+            pass
+        finally:
+            pipe.close()
+            if self._queue is not None:
+                self._queue.put((name, None))
+
+    @property
+    def running(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self) -> None:
+        """结束进程（POSIX 上结束整个进程组，shell 已退出时也结束它留下的子进程）"""
+        try:
+            if os.name != 'nt':
+                os.killpg(self.process.pid, signal.SIGKILL)
+            elif self.process.poll() is None:
+                self.process.kill()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _flush(chunks: List[tuple], writer: Optional[Callable], tool: str) -> None:
+        """连续的同一输出流的内容合并成一个事件推送（过长时只推送末尾）"""
+        if writer is None:
+            return
+        for name, group in itertools.groupby(chunks, key=lambda item: item[0]):
+            content = "".join(text for _, text in group)
+            if len(content) > STREAM_EVENT_CHARS:
+                content = "...\n" + content[-STREAM_EVENT_CHARS:]
+            writer({"type": OUTPUT_EVENT, "tool": tool, "stream": name, "content": content})
+
+    def wait(self, timeout: float, tool: str = "") -> ProcessResult:
+        """
+        等待进程结束，期间推送输出；超时则结束进程组
+
+        Args:
+            timeout: 超时秒数
+            tool: 推送事件中的工具名
+        """
+        writer = _stream_writer() if self._queue is not None else None
+        deadline = self.started + timeout
+        open_streams = len(self._readers) if self._queue is not None else 0
+        pending: List[tuple] = []
+        next_flush = 0.0
+        while open_streams:
+            now = time.monotonic()
+            if now >= deadline:
+                self.timed_out = True
+                self.kill()
+                break
+            if pending and now >= next_flush:
+                self._flush(pending, writer, tool)
+                pending = []
+                next_flush = now + STREAM_INTERVAL
+            wait_until = min(deadline, next_flush) if pending else deadline
+            try:
+                name, text = self._queue.get(timeout=max(0.0, wait_until - now))
+            except queue.Empty:
+                continue
+            if text is None:
+                open_streams -= 1
+            else:
+                pending.append((name, text))
+        self._flush(pending, writer, tool)
+
+        try:
+            self.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            self.timed_out = True
+            self.kill()
+            self.process.wait()
+        self.finished = time.monotonic()
+        for reader in self._readers:
+            # 进程组已结束，管道很快关闭；脱离进程组的后代进程可能仍持有管道，不无限等待
+            reader.join(timeout=1)
+        return self.result()
+
+    def result(self) -> ProcessResult:
+        with self._lock:
+            stdout, stderr = self.stdout.text(), self.stderr.text()
+        return ProcessResult(self.process.poll(), stdout, stderr, self.timed_out,
+                             (self.finished or time.monotonic()) - self.started)
+
+    def take_unread(self) -> str:
+        """取出上次调用之后的新输出"""
+        with self._lock:
+            text = self.unread.text()
+            self.unread = OutputBuffer()
+        return text
+
+
+def run_streaming(args: Union[str, List[str]], timeout: float, shell: bool = False,
+                  tool: str = "", cwd: Optional[str] = None) -> ProcessResult:
+    """
+    执行命令并等待结束，输出边读边推送（替代 subprocess.run(capture_output=True)）
+
+    超时不抛出 TimeoutExpired，而是返回 timed_out=True 和超时前的输出
+    """
+    process = StreamingProcess(args, shell=shell, cwd=cwd)
+    return process.wait(timeout, tool=tool)
+
+
+# ---------- 后台任务 ----------
+
+class JobStatus(NamedTuple):
+    """后台任务的状态"""
+    job_id: str
+    command: str
+    running: bool
+    returncode: Optional[int]
+    elapsed: float
+    output: str       # 上次查看之后的新输出
+
+
+class BackgroundJobs:
+    """后台运行的命令（线程安全，进程退出时结束仍在运行的任务）"""
+
+    def __init__(self):
+        self._jobs: Dict[str, StreamingProcess] = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, command: str, cwd: Optional[str] = None) -> str:
+        """
+        在后台启动 shell 命令
+
+        Returns:
+            任务编号
+
+        Raises:
+            RuntimeError: 同时运行的任务过多
+        """
+        with self._lock:
+            running = [job for job in self._jobs.values() if job.running]
+            if len(running) >= MAX_BACKGROUND_JOBS:
+                raise RuntimeError(f"后台任务过多（最多同时运行 {MAX_BACKGROUND_JOBS} 个），请先结束不需要的任务")
+            job_id = str(next(self._counter))
+            self._jobs[job_id] = StreamingProcess(command, shell=True, cwd=cwd, stream=False)
+            self._prune()
+        return job_id
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if not job.running]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _get(self, job_id: str) -> StreamingProcess:
+        with self._lock:
+            job = self._jobs.get(job_id.strip())
+        if job is None:
+            raise KeyError(f"后台任务 {job_id} 不存在")
+        return job
+
+    def _status(self, job_id: str, job: StreamingProcess) -> JobStatus:
+        returncode = job.process.poll()
+        if returncode is not None and job.finished is None:
+            job.finished = time.monotonic()
+        return JobStatus(job_id, job.command, returncode is None, returncode,
+                         (job.finished or time.monotonic()) - job.started, job.take_unread())
+
+    def poll(self, job_id: str) -> JobStatus:
+        """
+        查看任务状态和上次查看之后的新输出
+
+        Raises:
+            KeyError: 任务不存在
+        """
+        return self._status(job_id.strip(), self._get(job_id))
+
+    def stop(self, job_id: str) -> JobStatus:
+        """结束任务（已结束时直接返回状态）"""
+        job = self._get(job_id)
+        job.kill()
+        try:
+            job.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        for reader in job._readers:
+            reader.join(timeout=1)
+        return self._status(job_id.strip(), job)
+
+    def list(self) -> List[JobStatus]:
+        """全部任务（不取出新输出）"""
+        with self._lock:
+            jobs = list(self._jobs.items())
+        return [JobStatus(job_id, job.command, job.running, job.process.poll(),
+                          (job.finished or time.monotonic()) - job.started, "")
+                for job_id, job in jobs]
+
+    def stop_all(self) -> None:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.kill()
+
+
+_jobs: Optional[BackgroundJobs] = None
+_jobs_lock = threading.Lock()
+
+
+def get_background_jobs() -> BackgroundJobs:
+    """进程内共享的后台任务表"""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = BackgroundJobs()
+            atexit.register(_jobs.stop_all)
+        return _jobs
@@ -0,0 +1,250 @@
+"""
+预热的 Python 进程池 - run_python / run_tests 不再每次启动新的解释器
+- 每个工作进程（python_worker.py）启动时预先导入常用库，之后每次执行 fork 一个子进程运行目标文件或 pytest
+- 子进程彼此隔离（独立的模块状态、工作目录、环境变量），超时语义与 subprocess.run(timeout=...) 一致
+- 平台不支持 fork（Windows）或已关闭时 get_python_pool() 返回 None；工作进程异常时抛出 WorkerError，
+  只有请求确定没有送达工作进程（delivered 为 False）时才重试 / 调用方退回 subprocess，
+  已送达的请求可能已经部分执行，重新执行会重复产生副作用
+- 环境变量:
+    PY_WORKER_POOL     0 表示关闭进程池（默认开启）
+    PY_WORKER_SIZE     工作进程数（默认2，同时最多执行的请求数）
+    PY_WORKER_PRELOAD  额外预先导入的模块，逗号分隔（默认导入已安装的 pytest、pygame、numpy、pandas）
+    PY_WORKER_PYTHON   解释器（默认 python，与原来的 subprocess 调用一致）
+"""
+
+import os
+import sys
+import json
+import shutil
+import select
+import threading
+import subprocess
+import importlib.util
+from typing import List, NamedTuple, Optional
+
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+
+# 已安装时预先导入的库（导入慢、游戏 / 数据分析 / 测试代码常用）
+DEFAULT_PRELOAD = ("pytest", "pygame", "numpy", "pandas")
+
+# 等待工作进程启动（导入预加载模块）的最长时间
+STARTUP_TIMEOUT = 60
+
+
+class RunResult(NamedTuple):
+    """一次执行的结果（字段与 subprocess.CompletedProcess 对应）"""
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool
+    duration_ms: float
+
+
+class WorkerError(Exception):
+    """工作进程异常退出或无响应"""
+
+    def __init__(self, message: str, delivered: bool = False):
+        """
+        Args:
+            message: 错误信息
+            delivered: 请求是否已经发给工作进程（目标代码可能已经开始执行，不能重试）
+        """
+        super().__init__(message)
+        self.delivered = delivered
+
+
+class _Worker:
+    """一个预热的工作进程（同一时刻只处理一个请求）"""
+
+    def __init__(self, python: str, preload: List[str]):
+        env = dict(os.environ, PY_WORKER_PRELOAD=",".join(preload))
+        self.process = subprocess.Popen(
+            [python, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            text=True,
+            encoding='utf-8',
+            bufsize=1,
+        )
+        ready = self._read_line(STARTUP_TIMEOUT)
+        if not ready.get("ready"):
+            self.close()
+            raise WorkerError(f"工作进程启动失败: {ready}")
+        self.preloaded = ready.get("preloaded", [])
+
+    def _read_line(self, timeout: float) -> dict:
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise WorkerError("工作进程无响应")
+        line = self.process.stdout.readline()
+        if not line:
+            raise WorkerError("工作进程已退出")
+        return json.loads(line)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def request(self, payload: dict) -> dict:
+        if not self.alive:
+            raise WorkerError("工作进程已退出")
+        try:
+            self.process.stdin.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"工作进程已退出: {e}")
+        # 超时由工作进程处理；这里多等一段时间，防止工作进程本身卡住
+        try:
+            response = self._read_line(float(payload.get("timeout") or 10) + 10)
+        except (WorkerError, ValueError) as e:
+            self.close()  # 卡住或输出异常的工作进程不再使用
+            raise WorkerError(str(e), delivered=True)
+        if "error" in response:
+            raise WorkerError(response["error"], delivered=True)
+        return response
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class WarmPythonPool:
+    """预热的 Python 工作进程池（线程安全）"""
+
+    def __init__(self, size: int = 2, python: str = "python", preload: Optional[List[str]] = None):
+        """
+        Args:
+            size: 工作进程数
+            python: 解释器
+            preload: 预先导入的模块（None 表示使用默认列表中已安装的模块）
+        """
+        self.size = max(1, size)
+        self.python = shutil.which(python) or python
+        if preload is None:
+            preload = [name for name in DEFAULT_PRELOAD if importlib.util.find_spec(name) is not None]
+        self.preload = preload
+        self._idle: List[_Worker] = []
+        self._created = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        # 有空闲工作进程、或有名额创建新进程时通知等待者（包括执行中的工作进程崩溃后）
+        self._available = threading.Condition(self._lock)
+        self.stats = {"runs": 0, "respawns": 0}
+
+    def _acquire(self) -> _Worker:
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+            generation = self._generation
+        try:
+            worker = _Worker(self.python, self.preload)
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+        worker.generation = generation
+        return worker
+
+    def _release(self, worker: _Worker) -> None:
+        with self._available:
+            if worker.alive and worker.generation == self._generation:
+                self._idle.append(worker)
+                self._available.notify()
+                return
+        self._discard(worker)
+
+    def _discard(self, worker: _Worker) -> None:
+        """结束工作进程，空出名额"""
+        worker.close()
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def run(self, kind: str, path: str, args: Optional[List[str]] = None, timeout: float = 10,
+            cwd: Optional[str] = None) -> RunResult:
+        """
+        在预热的子进程中执行
+
+        Args:
+            kind: "file"（相当于 python path args...）或 "pytest"（相当于 pytest path args...）
+            path: 文件 / 测试路径
+            args: 额外参数
+            timeout: 超时秒数（超时后子进程及其派生进程全部结束）
+            cwd: 工作目录（默认当前目录）
+
+        Raises:
+            WorkerError: 工作进程异常；delivered 为 False 时请求没有送达（已换用新的工作进程重试一次），
+                         为 True 时目标代码可能已经部分执行，不会重试
+        """
+        payload = {
+            "kind": kind,
+            "path": path,
+            "args": list(args or []),
+            "cwd": cwd or os.getcwd(),
+            "env": dict(os.environ),
+            "timeout": timeout,
+        }
+        for attempt in range(2):
+            worker = self._acquire()
+            try:
+                response = worker.request(payload)
+            except WorkerError as e:
+                if e.delivered and worker.alive:
+                    # 工作进程返回了错误但仍可用
+                    self._release(worker)
+                    raise
+                self._discard(worker)
+                with self._lock:
+                    self.stats["respawns"] += 1
+                if e.delivered or attempt:
+                    raise
+                continue
+            self._release(worker)
+            with self._lock:
+                self.stats["runs"] += 1
+            return RunResult(**response)
+        raise WorkerError("工作进程不可用")
+
+    def has_module(self, name: str) -> bool:
+        """预加载列表中是否包含该模块（如 pytest）"""
+        return name in self.preload
+
+    def restart(self) -> None:
+        """重启所有工作进程（如 pip 安装 / 升级依赖后，预先导入的模块已过期）"""
+        with self._available:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._discard(worker)
+
+    def close(self) -> None:
+        self.restart()
+
+
+_pool: Optional[WarmPythonPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_python_pool() -> Optional[WarmPythonPool]:
+    """进程内共享的预热进程池；不支持 fork 或已通过环境变量关闭时返回 None"""
+    global _pool
+    if os.getenv("PY_WORKER_POOL", "1") == "0" or not hasattr(os, "fork") or sys.platform == "win32":
+        return None
+    with _pool_lock:
+        if _pool is None:
+            extra = [name.strip() for name in os.getenv("PY_WORKER_PRELOAD", "").split(",") if name.strip()]
+            preload = [name for name in DEFAULT_PRELOAD if importlib.util.find_spec(name) is not None]
+            _pool = WarmPythonPool(
+                size=int(os.getenv("PY_WORKER_SIZE", 2)),
+                python=os.getenv("PY_WORKER_PYTHON", "python"),
+                preload=preload + [name for name in extra if name not in preload],
+            )
+        return _pool
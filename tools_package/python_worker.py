@@ -0,0 +1,219 @@
+"""
+预热的 Python 工作进程（forkserver 方式）- 由 python_pool.WarmPythonPool 启动，不要直接导入
+
+启动时预先导入常用的第三方库（pytest、pygame、pandas 等），然后从 stdin 逐行读取 JSON 请求，
+每个请求 fork 一个子进程执行：子进程继承已导入的模块，省去解释器启动和导入的时间。
+- 子进程中: 新的会话（超时时整组进程一起结束）、stdin 为 /dev/null、stdout/stderr 重定向到临时文件
+- 父进程中: 等待子进程结束（超时则 SIGKILL），读取输出，向 stdout 写一行 JSON 结果
+
+本文件作为脚本运行，不导入 tools_package（避免加载 langchain 等与执行代码无关的模块）
+
+请求: {"kind": "file" | "pytest", "path": ..., "args": [...], "cwd": ..., "env": {...}, "timeout": 秒}
+结果: {"returncode": int, "stdout": str, "stderr": str, "timed_out": bool, "duration_ms": float}
+"""
+
+import os
+import sys
+import json
+import time
+import select
+import signal
+import tempfile
+import importlib
+import traceback
+
+
+# 每个输出流最多返回的字节数
+MAX_OUTPUT_BYTES = 1024 * 1024
+
+# 已预先导入的 pytest 插件的顶层包（pytest 无法再对其做断言重写，忽略对应的警告）
+PRELOADED_PLUGINS = []
+
+
+def _run_child(request: dict, stdout_fd: int, stderr_fd: int) -> int:
+    """在 fork 出的子进程中执行请求，返回退出码"""
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', encoding='utf-8', errors='backslashreplace', closefd=False)
+    sys.stderr = open(2, 'w', encoding='utf-8', errors='backslashreplace', closefd=False)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    os.chdir(request.get("cwd") or os.getcwd())
+    env = request.get("env")
+    if env is not None:
+        os.environ.clear()
+        os.environ.update(env)
+
+    path = request["path"]
+    args = [str(arg) for arg in request.get("args") or []]
+
+    if request.get("kind") == "pytest":
+        import pytest
+        for package in dict.fromkeys(PRELOADED_PLUGINS):
+            args += ["-W", f"ignore:Module already imported so cannot be rewritten; {package}"
+                           ":pytest.PytestAssertRewriteWarning"]
+        sys.argv = ["pytest", path] + args
+        return int(pytest.main([path] + args))
+
+    # 与 "python path args..." 一致：sys.argv[0] 为脚本路径，sys.path[0] 为脚本所在目录
+    import runpy
+    sys.argv = [path] + args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    try:
+        runpy.run_path(path, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        # 去掉 runpy 和本文件的栈帧，输出与直接运行脚本时相同的 traceback
+        tb = e.__traceback__
+        while tb is not None and (tb.tb_frame.f_globals is globals()
+                                  or tb.tb_frame.f_globals.get("__name__") == "runpy"):
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+        return 1
+
+
+def _finish_child() -> None:
+    """模拟解释器正常退出：等待非守护线程、执行 atexit、刷新输出"""
+    import atexit
+    import threading
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread() and not thread.daemon:
+            thread.join()
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+
+
+def _wait(pid: int, timeout: float) -> tuple:
+    """等待子进程结束，返回 (退出码, 是否超时)"""
+    deadline = time.monotonic() + timeout
+    pidfd = None
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError:
+            pidfd = None
+    try:
+        delay = 0.0005
+        while True:
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return os.waitstatus_to_exitcode(status), False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if pidfd is not None:
+                select.select([pidfd], [], [], remaining)
+            else:
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.02)
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status), True
+
+
+def _read_output(f) -> str:
+    f.seek(0)
+    data = f.read(MAX_OUTPUT_BYTES + 1)
+    text = data[:MAX_OUTPUT_BYTES].decode('utf-8', errors='replace')
+    if len(data) > MAX_OUTPUT_BYTES:
+        text += f"\n...(输出超过 {MAX_OUTPUT_BYTES // 1024}KB，已截断)"
+    return text
+
+
+def handle(request: dict, protocol_fds: tuple) -> dict:
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                for fd in protocol_fds:
+                    os.close(fd)
+                code = _run_child(request, out.fileno(), err.fileno())
+                _finish_child()
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code if 0 <= code <= 255 else 1)
+
+        returncode, timed_out = _wait(pid, float(request.get("timeout") or 10))
+        return {
+            "returncode": returncode,
+            "stdout": _read_output(out),
+            "stderr": _read_output(err),
+            "timed_out": timed_out,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+
+def _preload_pytest_plugins() -> None:
+    """预先导入通过 entry point 注册的 pytest 插件（如 langsmith 的插件，导入要数百毫秒，每次 pytest.main 都会加载）"""
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group="pytest11"):
+        module = entry_point.value.split(":")[0].strip()
+        try:
+            importlib.import_module(module)
+        except Exception:
+            continue
+        PRELOADED_PLUGINS.append(module.split(".")[0])
+
+
+def main() -> None:
+    # 协议使用原来的 stdin/stdout；预先导入的库打印的内容（如 pygame 的欢迎信息）写到 /dev/null
+    protocol_in = os.dup(0)
+    protocol_out = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    sys.path = [p for p in sys.path if os.path.abspath(p or ".") != os.path.dirname(os.path.abspath(__file__))]
+
+    preloaded = []
+    for name in filter(None, (os.getenv("PY_WORKER_PRELOAD") or "").split(",")):
+        try:
+            importlib.import_module(name.strip())
+            preloaded.append(name.strip())
+        except Exception:
+            continue
+    if "pytest" in preloaded:
+        _preload_pytest_plugins()
+
+    reader = os.fdopen(protocol_in, 'r', encoding='utf-8')
+    writer = os.fdopen(protocol_out, 'w', encoding='utf-8')
+    writer.write(json.dumps({"ready": True, "pid": os.getpid(), "preloaded": preloaded}) + "\n")
+    writer.flush()
+
+    for line in reader:
+        if not line.strip():
+            continue
+        try:
+            response = handle(json.loads(line), (protocol_in, protocol_out))
+        except Exception as e:
+            response = {"error": f"{type(e).__name__}: {e}"}
+        writer.write(json.dumps(response, ensure_ascii=False) + "\n")
+        writer.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,48 @@
 """
 
 import os
+import time
 import shutil
+import hashlib
 import subprocess
-import ast
-from typing import List
+from typing import Dict, List
 from datetime import datetime
 from langchain_core.tools import Tool
+from .tool_cache import invalidates_file
+from .test_impact import run_impacted_tests, run_test_file
+from .linters import PROJECT_LINT_TIMEOUT, LintResult, check_files
+from .file_scanner import MAX_LISTED_FILES, scan_files, truncate
+from .backup_store import get_backup_store, legacy_backup_target, restore_target_path
+
+
+# check_project_quality 中每个文件每个检查器最多显示的问题数
+MAX_ISSUES_PER_FILE = 5
+
+
+def _format_lint(lint: LintResult, label: str, display: Dict[str, str], summary: bool = False) -> str:
+    """
+    格式化 ruff / mypy 的结果
+
+    Args:
+        lint: 检查结果
+        label: "代码风格" 或 "类型"
+        display: 绝对路径 -> 显示的路径
+        summary: 只输出问题数量（项目检查）
+    """
+    if not lint.available:
+        skipped = "代码风格检查" if lint.tool == "ruff" else "类型检查"
+        return f"ℹ️  {lint.tool}未安装，跳过{skipped}"
+    if lint.timed_out:
+        return f"⏱️ {label}检查超时 ({lint.tool})"
+    if lint.error:
+        return f"⚠️ {lint.tool} 执行失败:\n{lint.error}"
+    if not lint.total:
+        return f"✅ {label}检查: 通过 ({lint.tool})"
+    if summary:
+        return f"⚠️ {label}问题 ({lint.tool}): {lint.total} 个（{len(lint.issues)} 个文件）"
+    lines = [f"{display.get(path) or os.path.relpath(path)}:{line}"
+             for path, issues in lint.issues.items() for line in issues]
+    return f"⚠️ {label}问题 ({lint.tool}):\n" + "\n".join(lines)
 
 
 class QualityTools:
@@ -18,84 +54,132 @@ class QualityTools:
     @staticmethod
     def check_code_quality(filepath: str) -> str:
         """
-        检查代码质量（语法、风格、类型）
+        检查代码质量（语法、风格、类型，三项并发执行）
         输入: 文件路径
+
+        不按文件内容缓存结果：类型检查的结果还取决于被导入的模块（dmypy 本身是增量的）
         """
         try:
             if not os.path.exists(filepath):
                 return f"错误：文件 {filepath} 不存在"
             
+            report = check_files([filepath])
             results = []
             
             # 1. 语法检查
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    code = f.read()
-                ast.parse(code)
+            error = report.syntax.get(os.path.abspath(filepath))
+            if error:
+                results.append(f"❌ 语法错误: {error}")
+            else:
                 results.append("✅ 语法检查: 通过")
-            except SyntaxError as e:
-                results.append(f"❌ 语法错误: 第{e.lineno}行 - {e.msg}")
             
-            # 2. 尝试使用ruff检查（如果可用）
-            try:
-                result = subprocess.run(
-                    ['ruff', 'check', filepath],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                if result.returncode == 0:
-                    results.append("✅ 代码风格检查: 通过 (ruff)")
-                else:
-                    results.append(f"⚠️ 代码风格问题 (ruff):\n{result.stdout}")
-            except (FileNotFoundError, subprocess.TimeoutExpired):
-                results.append("ℹ️  ruff未安装，跳过代码风格检查")
+            # 2. ruff（如果可用）
+            results.append(_format_lint(report.ruff, "代码风格", {os.path.abspath(filepath): filepath}))
             
-            # 3. 尝试使用mypy检查（如果可用）
-            try:
-                result = subprocess.run(
-                    ['mypy', filepath],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                if result.returncode == 0:
-                    results.append("✅ 类型检查: 通过 (mypy)")
-                else:
-                    results.append(f"⚠️ 类型问题 (mypy):\n{result.stdout[:500]}")
-            except (FileNotFoundError, subprocess.TimeoutExpired):
-                results.append("ℹ️  mypy未安装，跳过类型检查")
+            # 3. mypy（如果可用，通过 dmypy 守护进程）
+            if error:
+                results.append("ℹ️  存在语法错误，跳过类型检查")
+            else:
+                results.append(_format_lint(report.mypy, "类型", {os.path.abspath(filepath): filepath}))
             
             return "\n".join(results)
         
         except Exception as e:
             return f"代码质量检查错误: {str(e)}"
     
+    @staticmethod
+    def check_project_quality(directory: str = ".") -> str:
+        """
+        检查整个项目的代码质量（ruff 一次检查全部文件，mypy 使用缓存增量检查）
+        输入: 项目目录（默认当前目录）
+        """
+        try:
+            directory = directory.strip() or "."
+            if not os.path.isdir(directory):
+                return f"错误：目录 {directory} 不存在"
+            
+            paths = [entry.path for entry in scan_files(directory, (".py",))]
+            if not paths:
+                return "未找到Python文件"
+            
+            start = time.perf_counter()
+            report = check_files(paths, timeout=PROJECT_LINT_TIMEOUT, daemon=False)
+            elapsed = time.perf_counter() - start
+            
+            display = {os.path.abspath(path): path for path in paths}
+            result = f"📊 项目代码质量 ({directory}): 检查了 {len(paths)} 个Python文件，用时 {elapsed:.1f}秒\n"
+            if report.syntax:
+                result += f"❌ 语法错误: {len(report.syntax)} 个文件\n"
+            else:
+                result += "✅ 语法检查: 通过\n"
+            for lint, label in ((report.ruff, "代码风格"), (report.mypy, "类型")):
+                result += _format_lint(lint, label, display, summary=True) + "\n"
+            
+            # 有问题的文件（按扫描顺序）
+            problem_files = [path for path in display
+                             if path in report.syntax or path in report.ruff.issues or path in report.mypy.issues]
+            if not problem_files:
+                return result
+            
+            result += f"\n{len(problem_files)} 个文件有问题:\n\n"
+            shown, note = truncate(problem_files, MAX_LISTED_FILES)
+            for path in shown:
+                ruff_issues = report.ruff.issues.get(path, [])
+                mypy_issues = report.mypy.issues.get(path, [])
+                counts = []
+                if path in report.syntax:
+                    counts.append("语法错误")
+                if ruff_issues:
+                    counts.append(f"ruff {len(ruff_issues)}")
+                if mypy_issues:
+                    counts.append(f"mypy {len(mypy_issues)}")
+                result += f"📄 {display[path]} ({', '.join(counts)})\n"
+                if path in report.syntax:
+                    result += f"   语法错误: {report.syntax[path]}\n"
+                for tool, issues in (("ruff", ruff_issues), ("mypy", mypy_issues)):
+                    lines, more = truncate(issues, MAX_ISSUES_PER_FILE)
+                    for line in lines:
+                        result += f"   {tool} {line}\n"
+                    if more:
+                        result += f"   {more}"
+                result += "\n"
+            
+            return result + note
+        
+        except Exception as e:
+            return f"项目代码质量检查错误: {str(e)}"
+    
     @staticmethod
     def run_tests(test_path: str) -> str:
         """
-        运行测试
-        输入: 测试文件路径或目录
+        运行测试（目录默认只运行受上次运行以来的修改影响的测试）
+        输入: 测试文件路径或目录；'目录|||all' 完整运行
         """
+        parts = test_path.split("|||")
+        test_path = parts[0].strip()
+        full = len(parts) > 1 and parts[1].strip().lower() in ("all", "full")
         try:
             if not os.path.exists(test_path):
                 return f"错误：路径 {test_path} 不存在"
             
-            # 尝试使用pytest
+            # 尝试使用pytest（已安装时在预热的工作进程中运行，否则启动 pytest 命令）
             try:
-                result = subprocess.run(
-                    ['pytest', test_path, '-v'],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
+                if os.path.isdir(test_path):
+                    run = run_impacted_tests(test_path, full=full, timeout=30)
+                else:
+                    run = run_test_file(test_path, timeout=30)
+                
+                if run.timed_out:
+                    return "⏱️ 测试执行超时"
                 
                 output = f"📊 测试结果 ({test_path}):\n"
-                output += result.stdout
-                if result.stderr:
-                    output += f"\n错误输出:\n{result.stderr}"
+                if run.summary:
+                    output += f"{run.summary}\n\n"
+                output += run.stdout
+                if run.stderr:
+                    output += f"\n错误输出:\n{run.stderr}"
                 
-                if result.returncode == 0:
+                if run.returncode == 0:
                     output = "✅ " + output
                 else:
                     output = "❌ " + output
@@ -123,43 +207,116 @@ class QualityTools:
     @staticmethod
     def backup_file(filepath: str) -> str:
         """
-        备份文件
+        备份文件（保存到备份存储，内容未变时不重复保存）
         输入: 文件路径
         """
         try:
-            if not os.path.exists(filepath):
+            filepath = filepath.strip()
+            if not os.path.isfile(filepath):
                 return f"错误：文件 {filepath} 不存在"
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = f"{filepath}.bak_{timestamp}"
+            version, created = get_backup_store().backup(filepath)
             
-            shutil.copy2(filepath, backup_path)
-            
-            return f"✅ 文件已备份到: {backup_path}"
+            if not created:
+                return (f"ℹ️ 文件内容与版本 {version.version} 相同，无需重复备份\n"
+                        f"恢复: restore_backup 输入 '{filepath}|||{version.version}'")
+            return (f"✅ 文件已备份: {filepath}（版本 {version.version}，{version.size} 字节）\n"
+                    f"恢复: restore_backup 输入 '{filepath}|||{version.version}'")
         
         except Exception as e:
             return f"备份文件错误: {str(e)}"
     
     @staticmethod
-    def restore_backup(backup_path: str) -> str:
+    @invalidates_file(restore_target_path)
+    def restore_backup(path_and_version: str) -> str:
         """
-        恢复备份文件
-        输入: 备份文件路径
+        恢复备份（恢复前自动备份当前内容）
+        输入: "文件路径"（最新版本）或 "文件路径|||版本号"；旧格式的 .bak_ 备份文件路径
         """
         try:
-            if not os.path.exists(backup_path):
-                return f"错误：备份文件 {backup_path} 不存在"
+            parts = path_and_version.split("|||")
+            filepath = parts[0].strip()
+            
+            # 旧版本 backup_file 生成的 文件.bak_时间戳
+            original_path = legacy_backup_target(filepath) if len(parts) == 1 else None
+            if original_path:
+                shutil.copy2(filepath, original_path)
+                return f"✅ 文件已从备份恢复: {original_path}"
+            
+            number = None
+            if len(parts) > 1 and parts[1].strip():
+                try:
+                    number = int(parts[1].strip())
+                except ValueError:
+                    return "错误：版本号必须是整数，格式应为 '文件路径|||版本号'"
             
-            # 移除.bak_时间戳后缀
-            original_path = backup_path.rsplit('.bak_', 1)[0]
+            store = get_backup_store()
+            version = store.get(filepath, number)
+            if version is None:
+                if number is not None and store.get(filepath):
+                    return f"错误：{filepath} 没有版本 {number}（用 list_backups 查看可用版本）"
+                return f"错误：{filepath} 没有备份"
             
-            shutil.copy2(backup_path, original_path)
+            # 先读取要恢复的内容，再备份当前内容（新版本可能使旧版本超出保留数量被清理）
+            data = store.read(version)
+            result = ""
+            if os.path.isfile(filepath):
+                current, created = store.backup(filepath, protect=version.version)
+                if current.hash == version.hash:
+                    return f"ℹ️ 文件内容与版本 {version.version} 相同，无需恢复"
+                if created:
+                    result = f"\n恢复前的内容已备份为版本 {current.version}"
             
-            return f"✅ 文件已从备份恢复: {original_path}"
+            store.restore(version, data)
+            created_at = datetime.fromtimestamp(version.created).strftime("%Y-%m-%d %H:%M:%S")
+            return f"✅ 文件已从备份恢复: {filepath}（版本 {version.version}，{created_at}）" + result
         
         except Exception as e:
             return f"恢复备份错误: {str(e)}"
     
+    @staticmethod
+    def list_backups(filepath: str = "") -> str:
+        """
+        列出备份版本
+        输入: 文件路径；空字符串列出所有有备份的文件
+        """
+        try:
+            filepath = filepath.strip()
+            store = get_backup_store()
+            
+            if not filepath:
+                files = store.files()
+                if not files:
+                    return "备份存储为空"
+                stats = store.stats()
+                result = (f"💾 备份存储: {stats.files} 个文件，{stats.versions} 个版本，"
+                          f"原始 {stats.original_bytes} 字节，实际占用 {stats.stored_bytes} 字节"
+                          f"（{stats.objects} 份不同内容）\n\n")
+                shown, note = truncate(files, MAX_LISTED_FILES)
+                for path, count, latest in shown:
+                    latest_at = datetime.fromtimestamp(latest).strftime("%Y-%m-%d %H:%M:%S")
+                    result += f"📄 {os.path.relpath(path)}: {count} 个版本，最近备份 {latest_at}\n"
+                return result + note
+            
+            versions = store.versions(filepath)
+            if not versions:
+                return f"{filepath} 没有备份"
+            
+            current = None
+            if os.path.isfile(filepath):
+                with open(filepath, 'rb') as f:
+                    current = hashlib.sha256(f.read()).hexdigest()
+            
+            result = f"💾 {filepath} 的备份（{len(versions)} 个版本，新的在前）:\n"
+            for version in versions:
+                created_at = datetime.fromtimestamp(version.created).strftime("%Y-%m-%d %H:%M:%S")
+                marker = "  ← 当前内容" if version.hash == current else ""
+                result += f"  版本 {version.version}: {created_at}，{version.size} 字节，{version.hash[:12]}{marker}\n"
+            return result + f"恢复: restore_backup 输入 '{filepath}|||版本号'"
+        
+        except Exception as e:
+            return f"列出备份错误: {str(e)}"
+    
     @staticmethod
     def create_test_file(filepath_and_params: str) -> str:
         """
@@ -254,20 +411,30 @@ def create_quality_tools() -> List[Tool]:
             func=QualityTools.check_code_quality,
             description="检查代码质量（语法、风格、类型）。输入：文件路径。Check code quality."
         ),
+        Tool(
+            name="check_project_quality",
+            func=QualityTools.check_project_quality,
+            description="检查整个项目的代码质量（语法、ruff、mypy），列出有问题的文件。输入：项目目录。Check code quality of all files in a project."
+        ),
         Tool(
             name="run_tests",
             func=QualityTools.run_tests,
-            description="运行测试。输入：测试文件路径或目录。Run tests."
+            description="运行测试。输入：测试文件路径或目录（目录只运行受修改影响的测试，'目录|||all' 完整运行）。Run tests."
         ),
         Tool(
             name="backup_file",
             func=QualityTools.backup_file,
-            description="备份文件。输入：文件路径。Backup file."
+            description="备份文件（保存为新版本，内容未变时不重复保存）。输入：文件路径。Backup file."
         ),
         Tool(
             name="restore_backup",
             func=QualityTools.restore_backup,
-            description="恢复备份文件。输入：备份文件路径。Restore backup file."
+            description="恢复备份。输入：'文件路径'（最新版本）或 '文件路径|||版本号'。Restore file from backup."
+        ),
+        Tool(
+            name="list_backups",
+            func=QualityTools.list_backups,
+            description="列出文件的备份版本。输入：文件路径（空字符串列出所有有备份的文件）。List backup versions."
         ),
         Tool(
             name="create_test_file",
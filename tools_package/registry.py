@@ -0,0 +1,107 @@
+"""
+工具注册表 - 按场景懒加载并缓存工具集
+- 工具模块在第一次需要时才导入（importlib），未使用的场景不产生导入开销
+- 较重的依赖（DuckDuckGoSearchRun、requests、bs4、PIL）在工具第一次调用时才导入
+- 构建好的工具集按场景缓存在进程内，重复创建Agent时直接复用
+"""
+
+import importlib
+import threading
+from typing import Dict, List, Tuple
+from langchain_core.tools import Tool
+
+
+# 工具集名称 -> (模块, 工厂函数)
+TOOLSET_FACTORIES: Dict[str, Tuple[str, str]] = {
+    "basic": ("tools_package.tools", "create_tools"),
+    "game_dev": ("tools_package.game_dev_tools", "create_game_dev_tools"),
+    "web_dev": ("tools_package.web_dev_tools", "create_web_dev_tools"),
+    "data_science": ("tools_package.data_science_tools", "create_data_science_tools"),
+    "devops": ("tools_package.devops_tools", "create_devops_tools"),
+    "quality": ("tools_package.quality_tools", "create_quality_tools"),
+}
+
+# 必需的工具集，导入失败时直接报错；其余工具集导入失败时跳过
+REQUIRED_TOOLSETS = {"basic", "game_dev"}
+
+# 场景 -> 工具集（按顺序拼接）
+SCENARIO_TOOLSETS: Dict[str, List[str]] = {
+    "game_dev": ["basic", "game_dev", "quality"],
+    "web_dev": ["basic", "web_dev", "quality"],
+    "data_science": ["basic", "data_science", "quality"],
+    "devops": ["basic", "devops", "quality"],
+    "general": ["basic", "game_dev", "web_dev", "data_science", "devops", "quality"],
+}
+
+_toolset_cache: Dict[str, List[Tool]] = {}
+_scenario_cache: Dict[str, List[Tool]] = {}
+_lock = threading.Lock()
+
+
+def _build_toolset(name: str) -> List[Tool]:
+    """导入模块并调用工厂函数"""
+    module_name, factory_name = TOOLSET_FACTORIES[name]
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        if name in REQUIRED_TOOLSETS:
+            raise
+        return []
+    return getattr(module, factory_name)()
+
+
+def get_toolset(name: str) -> List[Tool]:
+    """
+    获取单个工具集（进程内缓存）
+
+    Args:
+        name: TOOLSET_FACTORIES 中的工具集名称
+    """
+    if name not in TOOLSET_FACTORIES:
+        raise ValueError(f"未知工具集: {name}，可选: {', '.join(TOOLSET_FACTORIES)}")
+
+    with _lock:
+        tools = _toolset_cache.get(name)
+        if tools is None:
+            tools = _build_toolset(name)
+            _toolset_cache[name] = tools
+    return list(tools)
+
+
+def get_scenario_tools(scenario: str) -> List[Tool]:
+    """
+    获取场景对应的完整工具集（进程内缓存）
+
+    未知场景按 general 处理。返回列表的副本，调用方可以自由增删，
+    但工具对象本身是共享的（工具函数均为无状态的静态方法）
+
+    Args:
+        scenario: 场景名称（game_dev / web_dev / data_science / devops / general）
+    """
+    if scenario not in SCENARIO_TOOLSETS:
+        scenario = "general"
+
+    tools = _scenario_cache.get(scenario)
+    if tools is None:
+        tools = []
+        for name in SCENARIO_TOOLSETS[scenario]:
+            tools.extend(get_toolset(name))
+        with _lock:
+            tools = _scenario_cache.setdefault(scenario, tools)
+    return list(tools)
+
+
+def clear_cache() -> None:
+    """清空工具集缓存（测试或热重载时使用）"""
+    with _lock:
+        _toolset_cache.clear()
+        _scenario_cache.clear()
+
+
+def cache_info() -> dict:
+    """已缓存的工具集和场景"""
+    with _lock:
+        return {
+            "toolsets": {name: len(tools) for name, tools in _toolset_cache.items()},
+            "scenarios": {name: len(tools) for name, tools in _scenario_cache.items()},
+        }
@@ -0,0 +1,353 @@
+"""
+项目符号索引 - 本地SQLite持久化
+记录每个Python文件的类、函数、方法、导入和行号范围，
+按 mtime / 大小增量更新：只重新解析修改过的文件，查找函数、项目概览直接查表
+
+- 数据库路径: 环境变量 SYMBOL_INDEX_PATH（默认 .agent_cache/symbol_index.db）
+- 文件路径统一保存为绝对路径
+- 符号按 ast.walk 的顺序保存（ord），输出顺序与直接解析时一致
+- 目录遍历使用 file_scanner（遵守 .gitignore）；需要重新解析的文件较多时用进程池并行解析
+"""
+
+import os
+import ast
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .file_scanner import SCAN_WORKERS, map_files, scan_files
+
+
+DEFAULT_INDEX_PATH = os.path.join(".agent_cache", "symbol_index.db")
+
+# 需要解析的文件超过该数量且有多个CPU时使用进程池（进程启动有固定开销）
+PROCESS_PARSE_THRESHOLD = 1000
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS files ("
+    " path TEXT PRIMARY KEY,"
+    " mtime_ns INTEGER NOT NULL,"
+    " size INTEGER NOT NULL,"
+    " error TEXT)",
+    "CREATE TABLE IF NOT EXISTS symbols ("
+    " path TEXT NOT NULL,"
+    " ord INTEGER NOT NULL,"
+    " kind TEXT NOT NULL,"          # class / function / async_function
+    " name TEXT NOT NULL,"
+    " parent TEXT,"                 # 直接所属的类（方法）
+    " lineno INTEGER NOT NULL,"
+    " end_lineno INTEGER NOT NULL,"
+    " col_offset INTEGER NOT NULL,"
+    " args TEXT,"                   # 函数参数名（JSON）
+    " methods TEXT,"                # 类的方法名（JSON）
+    " docstring TEXT)",
+    "CREATE TABLE IF NOT EXISTS imports ("
+    " path TEXT NOT NULL,"
+    " ord INTEGER NOT NULL,"
+    " name TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols(name)",
+    "CREATE INDEX IF NOT EXISTS idx_symbols_path ON symbols(path, ord)",
+    "CREATE INDEX IF NOT EXISTS idx_imports_path ON imports(path, ord)",
+]
+
+
+def extract_symbols(code: str) -> Tuple[List[dict], List[str]]:
+    """
+    解析源码，返回 (符号列表, 导入列表)
+
+    解析失败时抛出 SyntaxError / ValueError
+    """
+    tree = ast.parse(code)
+
+    # 方法所属的类
+    parents: Dict[int, str] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    parents[id(child)] = node.name
+
+    symbols = []
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            imports.extend(f"{module}.{alias.name}" for alias in node.names)
+        elif isinstance(node, ast.ClassDef):
+            symbols.append({
+                "kind": "class",
+                "name": node.name,
+                "parent": None,
+                "lineno": node.lineno,
+                "end_lineno": node.end_lineno,
+                "col_offset": node.col_offset,
+                "args": None,
+                "methods": [m.name for m in node.body if isinstance(m, ast.FunctionDef)],
+                "docstring": ast.get_docstring(node),
+            })
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append({
+                "kind": "function" if isinstance(node, ast.FunctionDef) else "async_function",
+                "name": node.name,
+                "parent": parents.get(id(node)),
+                "lineno": node.lineno,
+                "end_lineno": node.end_lineno,
+                "col_offset": node.col_offset,
+                "args": [arg.arg for arg in node.args.args],
+                "methods": None,
+                "docstring": ast.get_docstring(node),
+            })
+    return symbols, imports
+
+
+def parse_python_file(path: str) -> Tuple[List[dict], List[str], Optional[str]]:
+    """解析一个文件：(符号, 导入, 错误信息)；模块级函数，可在进程池中执行"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            code = f.read()
+        symbols, imports = extract_symbols(code)
+        return symbols, imports, None
+    except Exception as e:
+        return [], [], str(e) or type(e).__name__
+
+
+class SymbolIndex:
+    """项目符号索引（线程安全，多个进程可共用同一个数据库文件）"""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        """
+        Args:
+            path: SQLite 数据库文件路径
+        """
+        self.path = path
+        self.parsed = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 工具在线程池中执行，连接需要跨线程使用（由 _lock 串行化）
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    # ---------- 更新 ----------
+
+    def _stored_signature(self, path: str) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, size FROM files WHERE path = ?", (path,)).fetchone()
+        return (row["mtime_ns"], row["size"]) if row else None
+
+    def _store(self, path: str, signature: Tuple[int, int], symbols: List[dict], imports: List[str],
+               error: Optional[str]) -> None:
+        """写入一个文件的解析结果（调用方持有锁）"""
+        self._conn.execute("DELETE FROM symbols WHERE path = ?", (path,))
+        self._conn.execute("DELETE FROM imports WHERE path = ?", (path,))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (path, mtime_ns, size, error) VALUES (?, ?, ?, ?)",
+            (path, signature[0], signature[1], error)
+        )
+        self._conn.executemany(
+            "INSERT INTO symbols (path, ord, kind, name, parent, lineno, end_lineno, col_offset, args, methods, docstring)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(path, i, s["kind"], s["name"], s["parent"], s["lineno"], s["end_lineno"], s["col_offset"],
+              json.dumps(s["args"]) if s["args"] is not None else None,
+              json.dumps(s["methods"]) if s["methods"] is not None else None,
+              s["docstring"]) for i, s in enumerate(symbols)]
+        )
+        self._conn.executemany(
+            "INSERT INTO imports (path, ord, name) VALUES (?, ?, ?)",
+            [(path, i, name) for i, name in enumerate(imports)]
+        )
+
+    def update_file(self, filepath: str) -> bool:
+        """
+        文件修改过（或尚未索引）时重新解析
+
+        Returns:
+            是否重新解析了文件；文件不存在时从索引中删除并返回 False
+        """
+        path = os.path.abspath(filepath)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.forget(path)
+            return False
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self._stored_signature(path) == signature:
+            return False
+
+        symbols, imports, error = parse_python_file(path)
+        with self._lock:
+            self._store(path, signature, symbols, imports, error)
+            self._conn.commit()
+            self.parsed += 1
+        return True
+
+    def refresh(self, directory: str) -> List[str]:
+        """
+        增量更新目录下的所有Python文件：只解析新增或修改过的文件，删除已不存在的文件
+
+        Returns:
+            目录下的Python文件列表（file_scanner 顺序，路径形式与 directory 一致）
+        """
+        entries = scan_files(directory, (".py",))
+        root = os.path.abspath(directory)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, mtime_ns, size FROM files WHERE path LIKE ? ESCAPE '\\'",
+                (self._like_prefix(root),)
+            ).fetchall()
+        stored = {row["path"]: (row["mtime_ns"], row["size"]) for row in rows}
+
+        changed = []
+        present = set()
+        for entry in entries:
+            path = os.path.abspath(entry.path)
+            present.add(path)
+            signature = (entry.mtime_ns, entry.size)
+            if stored.get(path) != signature:
+                changed.append((path, signature))
+
+        # 解析在锁外并行进行，写入时批量提交
+        use_processes = len(changed) >= PROCESS_PARSE_THRESHOLD and (os.cpu_count() or 1) > 1
+        results = map_files(parse_python_file, [path for path, _ in changed],
+                            workers=(os.cpu_count() or 1) if use_processes else SCAN_WORKERS,
+                            processes=use_processes)
+        parsed = [(path, signature) + result for (path, signature), result in zip(changed, results)]
+        # 已删除或被忽略（.gitignore / 跳过的目录）的文件从索引中移除
+        removed = [path for path in stored if path not in present]
+
+        if parsed or removed:
+            with self._lock:
+                for path, signature, symbols, imports, error in parsed:
+                    self._store(path, signature, symbols, imports, error)
+                for path in removed:
+                    self._delete(path)
+                self._conn.commit()
+                self.parsed += len(parsed)
+        return [entry.path for entry in entries]
+
+    @staticmethod
+    def _like_prefix(root: str) -> str:
+        prefix = root.rstrip(os.sep) + os.sep
+        return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+    def _delete(self, path: str) -> None:
+        self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._conn.execute("DELETE FROM symbols WHERE path = ?", (path,))
+        self._conn.execute("DELETE FROM imports WHERE path = ?", (path,))
+
+    def forget(self, filepath: str) -> None:
+        """从索引中删除文件（下次访问时重新解析）"""
+        path = os.path.abspath(filepath)
+        with self._lock:
+            self._delete(path)
+            self._conn.commit()
+
+    # ---------- 查询 ----------
+
+    def file_error(self, filepath: str) -> Optional[str]:
+        """文件解析失败时的错误信息"""
+        with self._lock:
+            row = self._conn.execute("SELECT error FROM files WHERE path = ?",
+                                     (os.path.abspath(filepath),)).fetchone()
+        return row["error"] if row else None
+
+    def file_symbols(self, filepath: str) -> List[dict]:
+        """文件中的所有类和函数（ast.walk 顺序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, name, parent, lineno, end_lineno, col_offset, args, methods, docstring"
+                " FROM symbols WHERE path = ? ORDER BY ord",
+                (os.path.abspath(filepath),)
+            ).fetchall()
+        return [self._row_to_symbol(row) for row in rows]
+
+    def file_imports(self, filepath: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM imports WHERE path = ? ORDER BY ord",
+                                      (os.path.abspath(filepath),)).fetchall()
+        return [row["name"] for row in rows]
+
+    def directory_imports(self, directory: str) -> Dict[str, List[str]]:
+        """目录下所有已索引文件的导入（绝对路径 -> 导入列表），用于构建导入关系图"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, name FROM imports WHERE path LIKE ? ESCAPE '\\' ORDER BY path, ord",
+                (self._like_prefix(os.path.abspath(directory)),)
+            ).fetchall()
+        imports: Dict[str, List[str]] = {}
+        for row in rows:
+            imports.setdefault(row["path"], []).append(row["name"])
+        return imports
+
+    def find_in_file(self, filepath: str, name: str, kinds: Iterable[str] = ("function",)) -> Optional[dict]:
+        """文件中第一个同名符号（与 ast.walk 的查找顺序一致）"""
+        kinds = list(kinds)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, name, parent, lineno, end_lineno, col_offset, args, methods, docstring"
+                f" FROM symbols WHERE path = ? AND name = ? AND kind IN ({','.join('?' * len(kinds))})"
+                " ORDER BY ord LIMIT 1",
+                [os.path.abspath(filepath), name] + kinds
+            ).fetchone()
+        return self._row_to_symbol(row) if row else None
+
+    def lookup(self, name: str, directory: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """按名称查找符号（可限定目录，limit=-1 表示不限数量），结果包含文件路径"""
+        sql = ("SELECT path, kind, name, parent, lineno, end_lineno, col_offset, args, methods, docstring"
+               " FROM symbols WHERE name = ?")
+        params: list = [name]
+        if directory is not None:
+            sql += " AND path LIKE ? ESCAPE '\\'"
+            params.append(self._like_prefix(os.path.abspath(directory)))
+        sql += " ORDER BY path, ord LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            symbol = self._row_to_symbol(row)
+            symbol["path"] = row["path"]
+            results.append(symbol)
+        return results
+
+    @staticmethod
+    def _row_to_symbol(row) -> dict:
+        symbol = {key: row[key] for key in ("kind", "name", "parent", "lineno", "end_lineno", "col_offset", "docstring")}
+        symbol["args"] = json.loads(row["args"]) if row["args"] is not None else None
+        symbol["methods"] = json.loads(row["methods"]) if row["methods"] is not None else None
+        return symbol
+
+    def stats(self) -> dict:
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            symbols = self._conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+        return {"files": files, "symbols": symbols, "parsed": self.parsed, "path": self.path}
+
+
+_index: Optional[SymbolIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_symbol_index() -> SymbolIndex:
+    """进程内共享的符号索引（路径来自环境变量 SYMBOL_INDEX_PATH）"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            from .tool_cache import get_tool_cache
+            _index = SymbolIndex(os.getenv("SYMBOL_INDEX_PATH", DEFAULT_INDEX_PATH))
+            # 写文件工具修改文件后立即重新解析（不依赖 mtime 精度）
+            get_tool_cache().add_listener(_index.forget)
+        return _index
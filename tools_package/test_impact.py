@@ -0,0 +1,612 @@
+"""
+增量测试 - 只运行受修改影响的测试文件
+- 导入关系: 由符号索引中记录的导入构建项目内的模块依赖图（测试文件 -> 直接 / 间接导入的项目文件）
+- 修改检测: 与上次运行时记录的文件 mtime / 大小比较，加上写文件工具修改过的文件
+- 选择: 导入了被修改文件（直接或间接）的测试、被修改的测试、上次失败的测试、新增的测试；
+  conftest.py 修改时选择其目录下的全部测试，pytest 配置文件修改时全部运行
+- 分片: 安装了 pytest-xdist 时使用 -n；否则按上次各文件用时把测试文件分成多组并发运行
+- 报告: 与上次完整运行的用时比较，给出节省的时间
+
+- 数据库路径: 环境变量 TEST_IMPACT_PATH（默认 .agent_cache/test_impact.db）
+- 分片数: 环境变量 TEST_SHARDS（默认 min(4, CPU数)）
+"""
+
+import os
+import time
+import fnmatch
+import sqlite3
+import configparser
+import tempfile
+import threading
+import subprocess
+import importlib.util
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .file_scanner import FileEntry, scan_files
+from .python_pool import WorkerError, get_python_pool
+from .symbol_index import get_symbol_index
+from .tool_cache import get_tool_cache
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+DEFAULT_IMPACT_PATH = os.path.join(".agent_cache", "test_impact.db")
+
+TEST_SHARDS = int(os.getenv("TEST_SHARDS", min(4, os.cpu_count() or 1)))
+
+# 修改后需要全部重新运行的 pytest 配置文件
+CONFIG_FILES = {"pytest.ini", ".pytest.ini", "pyproject.toml", "setup.cfg", "tox.ini"}
+
+# pytest 查找配置文件的顺序（同一目录中）
+PYTEST_CONFIG_FILES = ("pytest.ini", ".pytest.ini", "pyproject.toml", "tox.ini", "setup.cfg")
+
+# pytest 默认的测试文件命名（配置中没有 python_files 时）
+DEFAULT_PYTHON_FILES = ("test_*.py", "*_test.py")
+
+# 判断项目根目录的标志文件
+ROOT_MARKERS = (".git", "pyproject.toml", "setup.py", "setup.cfg", "pytest.ini", "tox.ini")
+
+SCHEMA = [
+    # 上次运行时项目文件的状态（按测试目标分别记录）
+    "CREATE TABLE IF NOT EXISTS snapshots ("
+    " target TEXT NOT NULL,"
+    " path TEXT NOT NULL,"
+    " mtime_ns INTEGER NOT NULL,"
+    " size INTEGER NOT NULL,"
+    " PRIMARY KEY (target, path))",
+    # 每个测试文件最近一次的结果
+    "CREATE TABLE IF NOT EXISTS results ("
+    " target TEXT NOT NULL,"
+    " test TEXT NOT NULL,"
+    " duration REAL NOT NULL,"
+    " failed INTEGER NOT NULL,"
+    " PRIMARY KEY (target, test))",
+    # 最近一次完整运行的用时
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " target TEXT PRIMARY KEY,"
+    " full_seconds REAL NOT NULL,"
+    " tests INTEGER NOT NULL)",
+]
+
+
+def is_test_file(path: str, patterns: Sequence[str] = DEFAULT_PYTHON_FILES) -> bool:
+    """是否为测试文件（patterns 为 pytest 的 python_files；与 pytest 相同，不含路径分隔符的规则只匹配文件名）"""
+    if not path.endswith(".py"):
+        return False
+    for pattern in patterns:
+        pattern = pattern.replace("/", os.sep)
+        if os.sep in pattern:
+            if fnmatch.fnmatch(path, pattern if os.path.isabs(pattern) else "*" + os.sep + pattern):
+                return True
+        elif fnmatch.fnmatch(os.path.basename(path), pattern):
+            return True
+    return False
+
+
+def _pytest_config(path: str) -> Optional[dict]:
+    """配置文件中的 pytest 配置项；文件中没有 pytest 配置时返回 None"""
+    name = os.path.basename(path)
+    try:
+        if name == "pyproject.toml":
+            if tomllib is None:
+                return None
+            with open(path, 'rb') as f:
+                tool = tomllib.load(f).get("tool", {})
+            config = tool.get("pytest") if isinstance(tool, dict) else None
+            if not isinstance(config, dict):
+                return None
+            options = config.get("ini_options")
+            return options if isinstance(options, dict) else config
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(path, encoding="utf-8")
+        section = "tool:pytest" if name == "setup.cfg" else "pytest"
+        if parser.has_section(section):
+            return dict(parser.items(section))
+        # pytest.ini 即使没有 [pytest] 段也是 pytest 的配置文件
+        return {} if name in ("pytest.ini", ".pytest.ini") else None
+    except (OSError, ValueError, configparser.Error):
+        return None
+
+
+def python_file_patterns(target: str) -> List[str]:
+    """测试文件命名规则：从目标目录向上找到的第一个 pytest 配置文件中的 python_files"""
+    current = os.path.abspath(target)
+    if not os.path.isdir(current):
+        current = os.path.dirname(current)
+    while True:
+        for name in PYTEST_CONFIG_FILES:
+            path = os.path.join(current, name)
+            config = _pytest_config(path) if os.path.isfile(path) else None
+            if config is None:
+                continue
+            value = config.get("python_files")
+            if isinstance(value, str):
+                patterns = value.split()
+            elif isinstance(value, list):
+                patterns = [str(item) for item in value]
+            else:
+                patterns = []
+            return patterns or list(DEFAULT_PYTHON_FILES)
+        parent = os.path.dirname(current)
+        if parent == current:
+            return list(DEFAULT_PYTHON_FILES)
+        current = parent
+
+
+def find_project_root(path: str) -> str:
+    """向上查找项目根目录（含 .git / pyproject.toml 等），找不到时使用测试目录本身"""
+    path = os.path.abspath(path)
+    start = path if os.path.isdir(path) else os.path.dirname(path)
+    current = start
+    while True:
+        if any(os.path.exists(os.path.join(current, marker)) for marker in ROOT_MARKERS):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return start
+        current = parent
+
+
+# ---------- 导入关系图 ----------
+
+def _package_base(path: str) -> str:
+    """pytest（rootdir 插入模式）把测试文件所在包的上一级目录加入 sys.path"""
+    directory = os.path.dirname(path)
+    while os.path.exists(os.path.join(directory, "__init__.py")):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    return directory
+
+
+class ImportGraph:
+    """项目内的模块依赖图（只包含能解析到项目文件的导入）"""
+
+    def __init__(self, root: str, files: List[str], imports: Dict[str, List[str]],
+                 test_patterns: Sequence[str] = DEFAULT_PYTHON_FILES):
+        """
+        Args:
+            root: 项目根目录（绝对路径）
+            files: 项目中的Python文件（绝对路径）
+            imports: 文件 -> 导入名列表（符号索引的格式：import a.b -> "a.b"，from a import b -> "a.b"，
+                     相对导入不含层级：from .a import b -> "a.b"，from . import b -> ".b"）
+            test_patterns: 测试文件命名规则（pytest 的 python_files）
+        """
+        self.root = root
+        bases = {root, os.path.join(root, "src")}
+        bases.update(_package_base(path) for path in files if is_test_file(path, test_patterns))
+        # 模块名 -> 文件；同一文件在不同的 sys.path 根目录下有不同的模块名
+        self.modules: Dict[str, str] = {}
+        self.module_names: Dict[str, List[str]] = {}
+        for base in sorted(bases, key=len, reverse=True):
+            prefix = base.rstrip(os.sep) + os.sep
+            for path in files:
+                if not path.startswith(prefix):
+                    continue
+                name = path[len(prefix):-3].replace(os.sep, ".")
+                if name.endswith("__init__"):
+                    name = name[:-len("__init__")].rstrip(".")
+                if name and name not in self.modules:
+                    self.modules[name] = path
+                    self.module_names.setdefault(path, []).append(name)
+
+        self.dependencies: Dict[str, Set[str]] = {
+            path: self._resolve(path, imports.get(path, [])) for path in files
+        }
+        self.dependents: Dict[str, Set[str]] = {}
+        for path, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                self.dependents.setdefault(dependency, set()).add(path)
+
+    def _resolve(self, path: str, names: List[str]) -> Set[str]:
+        """导入名 -> 项目文件（导入 a.b.c 会执行 a、a.b 的 __init__，全部算作依赖）"""
+        # 相对导入的层级已丢失：按所在包及其上级包依次尝试
+        packages = [name.rsplit(".", 1)[0] for name in self.module_names.get(path, []) if "." in name]
+        result = set()
+        for raw in names:
+            name = raw.lstrip(".")
+            candidates = [name] + [f"{package}.{name}" for package in packages]
+            for candidate in candidates:
+                parts = candidate.split(".")
+                for i in range(1, len(parts) + 1):
+                    target = self.modules.get(".".join(parts[:i]))
+                    if target is not None and target != path:
+                        result.add(target)
+        return result
+
+    def affected(self, changed: Iterable[str]) -> Set[str]:
+        """直接或间接导入了 changed 中任一文件的文件（包括 changed 本身）"""
+        seen = set(changed)
+        queue = deque(seen)
+        while queue:
+            for dependent in self.dependents.get(queue.popleft(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    queue.append(dependent)
+        return seen
+
+
+# ---------- 运行记录 ----------
+
+class Selection(NamedTuple):
+    """本次要运行的测试"""
+    tests: List[str]          # 选中的测试文件（绝对路径，按扫描顺序）
+    all_tests: List[str]      # 目标下的全部测试文件
+    changed: List[str]        # 自上次运行以来修改过的文件
+    reason: str               # 选择方式的说明
+    full: bool                # 是否为完整运行
+
+
+class TestImpactStore:
+    """增量测试的运行记录（线程安全）"""
+
+    def __init__(self, path: str = DEFAULT_IMPACT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # 写文件工具修改过、尚未被任何一次运行覆盖的文件（mtime 精度不足时也能发现修改）
+        self._dirty: Set[str] = set()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def mark_dirty(self, filepath: str) -> None:
+        with self._lock:
+            self._dirty.add(os.path.abspath(filepath))
+
+    def changed_files(self, target: str, entries: List[FileEntry]) -> Optional[List[str]]:
+        """与上次运行相比修改过（含新增、删除）的文件；没有运行记录时返回 None"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, mtime_ns, size FROM snapshots WHERE target = ?",
+                                      (target,)).fetchall()
+            dirty = set(self._dirty)
+        if not rows:
+            return None
+        stored = {row["path"]: (row["mtime_ns"], row["size"]) for row in rows}
+        changed = []
+        for entry in entries:
+            path = os.path.abspath(entry.path)
+            if stored.pop(path, None) != (entry.mtime_ns, entry.size) or path in dirty:
+                changed.append(path)
+        return changed + sorted(stored)
+
+    def results(self, target: str) -> Dict[str, Tuple[float, bool]]:
+        """测试文件 -> (上次用时, 上次是否失败)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT test, duration, failed FROM results WHERE target = ?",
+                                      (target,)).fetchall()
+        return {row["test"]: (row["duration"], bool(row["failed"])) for row in rows}
+
+    def full_run(self, target: str) -> Optional[Tuple[float, int]]:
+        """上次完整运行的 (用时, 测试文件数)"""
+        with self._lock:
+            row = self._conn.execute("SELECT full_seconds, tests FROM runs WHERE target = ?", (target,)).fetchone()
+        return (row["full_seconds"], row["tests"]) if row else None
+
+    def record(self, target: str, entries: List[FileEntry], results: Dict[str, Tuple[float, bool]],
+               all_tests: List[str], full_seconds: Optional[float]) -> None:
+        """
+        记录一次运行（未超时）：当前文件状态作为下次比较的基准，更新各测试文件的结果
+
+        Args:
+            full_seconds: 完整运行时的总用时（增量运行传 None）
+        """
+        present = set(all_tests)
+        with self._lock:
+            self._conn.execute("DELETE FROM snapshots WHERE target = ?", (target,))
+            self._conn.executemany(
+                "INSERT INTO snapshots (target, path, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                [(target, os.path.abspath(entry.path), entry.mtime_ns, entry.size) for entry in entries]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (target, test, duration, failed) VALUES (?, ?, ?, ?)",
+                [(target, test, duration, int(failed)) for test, (duration, failed) in results.items()]
+            )
+            # 已删除的测试文件
+            for row in self._conn.execute("SELECT test FROM results WHERE target = ?", (target,)).fetchall():
+                if row["test"] not in present:
+                    self._conn.execute("DELETE FROM results WHERE target = ? AND test = ?", (target, row["test"]))
+            if full_seconds is not None:
+                self._conn.execute("INSERT OR REPLACE INTO runs (target, full_seconds, tests) VALUES (?, ?, ?)",
+                                   (target, full_seconds, len(all_tests)))
+            self._conn.commit()
+            self._dirty.difference_update(os.path.abspath(entry.path) for entry in entries)
+
+
+_store: Optional[TestImpactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_test_impact_store() -> TestImpactStore:
+    """进程内共享的运行记录（路径来自环境变量 TEST_IMPACT_PATH）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TestImpactStore(os.getenv("TEST_IMPACT_PATH", DEFAULT_IMPACT_PATH))
+            get_tool_cache().add_listener(_store.mark_dirty)
+        return _store
+
+
+# ---------- 选择 ----------
+
+def scan_project(target: str) -> Tuple[str, List[FileEntry], List[str], List[str]]:
+    """(项目根目录, 项目中的 .py 和配置文件, 目标下的测试文件, 测试文件命名规则)"""
+    target = os.path.abspath(target)
+    root = find_project_root(target)
+    patterns = python_file_patterns(target)
+    entries = [entry for entry in scan_files(root, (".py", ".ini", ".cfg", ".toml"))
+               if entry.path.endswith(".py") or os.path.basename(entry.path) in CONFIG_FILES]
+    prefix = target.rstrip(os.sep) + os.sep
+    tests = [os.path.abspath(entry.path) for entry in entries
+             if os.path.abspath(entry.path).startswith(prefix) and is_test_file(os.path.abspath(entry.path), patterns)]
+    return root, entries, tests, patterns
+
+
+def select_tests(target: str, full: bool = False) -> Tuple[Selection, List[FileEntry]]:
+    """
+    选择目标目录下需要运行的测试文件
+
+    Args:
+        target: 测试目录
+        full: 强制完整运行
+    """
+    target = os.path.abspath(target)
+    root, entries, all_tests, patterns = scan_project(target)
+    store = get_test_impact_store()
+    changed = store.changed_files(target, entries)
+
+    if full:
+        return Selection(all_tests, all_tests, changed or [], "完整运行", True), entries
+    if changed is None:
+        return Selection(all_tests, all_tests, [], "首次运行（记录测试与模块的依赖关系）", True), entries
+    if any(os.path.basename(path) in CONFIG_FILES for path in changed):
+        return Selection(all_tests, all_tests, changed, "pytest 配置文件已修改，完整运行", True), entries
+
+    selected: Set[str] = set()
+    if changed:
+        index = get_symbol_index()
+        index.refresh(root)
+        files = [os.path.abspath(entry.path) for entry in entries if entry.path.endswith(".py")]
+        graph = ImportGraph(root, files, index.directory_imports(root), patterns)
+        affected = graph.affected(changed)
+        selected.update(test for test in all_tests if test in affected)
+        # conftest.py 影响所在目录下的全部测试
+        for path in changed:
+            if os.path.basename(path) == "conftest.py":
+                prefix = os.path.dirname(path) + os.sep
+                selected.update(test for test in all_tests if test.startswith(prefix))
+
+    results = store.results(target)
+    failed = {test for test, (_, was_failed) in results.items() if was_failed}
+    new = {test for test in all_tests if test not in results}
+    selected |= (failed | new) & set(all_tests)
+
+    reasons = []
+    if changed:
+        reasons.append(f"{len(changed)} 个文件已修改")
+    if failed & selected:
+        reasons.append(f"{len(failed & selected)} 个上次失败")
+    if new:
+        reasons.append(f"{len(new)} 个新测试")
+    tests = [test for test in all_tests if test in selected]
+    full_run = len(tests) == len(all_tests)
+    reason = "、".join(reasons) if reasons else "自上次运行以来没有修改"
+    return Selection(tests, all_tests, changed, reason, full_run), entries
+
+
+# ---------- 分片与结果 ----------
+
+def xdist_available() -> bool:
+    return importlib.util.find_spec("xdist") is not None
+
+
+def shard_tests(tests: List[str], durations: Dict[str, float], shards: int) -> List[List[str]]:
+    """按上次用时（没有记录时按平均用时）把测试文件分成 shards 组，每组总用时尽量接近"""
+    shards = max(1, min(shards, len(tests)))
+    known = [durations[test] for test in tests if test in durations]
+    default = sum(known) / len(known) if known else 1.0
+    groups: List[List[str]] = [[] for _ in range(shards)]
+    loads = [0.0] * shards
+    for test in sorted(tests, key=lambda test: -durations.get(test, default)):
+        i = loads.index(min(loads))
+        groups[i].append(test)
+        loads[i] += durations.get(test, default)
+    order = {test: i for i, test in enumerate(tests)}
+    return [sorted(group, key=order.get) for group in groups if group]
+
+
+def junit_args(xml_path: str) -> List[str]:
+    """输出每个用例所在文件和用时的 JUnit XML（xunit1 格式带 file 属性）"""
+    return [f"--junitxml={xml_path}", "-o", "junit_family=xunit1"]
+
+
+def parse_junit(xml_path: str, tests: List[str]) -> Dict[str, Tuple[float, bool]]:
+    """JUnit XML -> 测试文件: (用时, 是否失败)；file 属性是相对 pytest rootdir 的路径，按后缀匹配"""
+    try:
+        root = ET.parse(xml_path).getroot()
+    except (OSError, ET.ParseError):
+        return {}
+    by_suffix = {}
+    for test in tests:
+        parts = test.split(os.sep)
+        for i in range(len(parts)):
+            by_suffix.setdefault("/".join(parts[i:]), test)
+    results: Dict[str, Tuple[float, bool]] = {}
+    for case in root.iter("testcase"):
+        test = by_suffix.get((case.get("file") or "").replace("\\", "/").lstrip("./"))
+        if test is None:
+            continue
+        failed = any(child.tag in ("failure", "error") for child in case)
+        duration, was_failed = results.get(test, (0.0, False))
+        results[test] = (duration + float(case.get("time") or 0), was_failed or failed)
+    return results
+
+
+def new_junit_path() -> str:
+    fd, path = tempfile.mkstemp(prefix="pytest-", suffix=".xml")
+    os.close(fd)
+    return path
+
+
+def speedup_report(selection: Selection, seconds: float, target: str) -> str:
+    """与完整运行相比节省的时间"""
+    if selection.full:
+        return f"⏱️ 完整运行 {len(selection.all_tests)} 个测试文件，用时 {seconds:.1f}秒"
+    line = f"⚡ 增量运行 {len(selection.tests)}/{len(selection.all_tests)} 个测试文件，用时 {seconds:.1f}秒"
+    full = get_test_impact_store().full_run(target)
+    if full:
+        estimate, source = full[0], "上次完整运行"
+    else:
+        durations = get_test_impact_store().results(target)
+        estimate = sum(duration for duration, _ in durations.values())
+        source = "按各文件上次用时估算"
+    if estimate > 0 and seconds > 0:
+        line += f"；完整运行约 {estimate:.1f}秒（{source}），约 {estimate / seconds:.1f}x"
+    return line
+
+
+# ---------- 运行 ----------
+
+class TestRun(NamedTuple):
+    """一次测试运行的结果"""
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool
+    summary: str              # 选择和用时说明（单个文件时为空）
+
+
+def run_pytest(files: List[str], args: List[str], timeout: float) -> Tuple[Optional[int], str, str, bool]:
+    """
+    运行 pytest：优先在预热的工作进程中运行，否则启动 pytest 命令
+
+    Returns:
+        (退出码, stdout, stderr, 是否超时)
+
+    Raises:
+        FileNotFoundError: 没有安装 pytest
+    """
+    pool = get_python_pool()
+    if pool is not None and pool.has_module("pytest"):
+        try:
+            result = pool.run("pytest", files[0], files[1:] + args, timeout=timeout)
+            return result.returncode, result.stdout, result.stderr, result.timed_out
+        except WorkerError as e:
+            if e.delivered:
+                # 测试可能已经部分执行，不再重新运行（避免重复产生副作用）
+                return 1, "", f"工作进程异常（{e}），测试可能已部分执行，未重新运行", False
+    try:
+        result = subprocess.run(['pytest'] + files + args, capture_output=True, text=True, timeout=timeout)
+        return result.returncode, result.stdout, result.stderr, False
+    except subprocess.TimeoutExpired:
+        return None, "", "", True
+
+
+def run_impacted_tests(target: str, full: bool = False, timeout: float = 30,
+                       shards: int = TEST_SHARDS) -> TestRun:
+    """
+    运行目录下受修改影响的测试（分片并发），记录结果供下次选择
+
+    Args:
+        target: 测试目录
+        full: 强制完整运行
+        timeout: 每个分片的超时秒数
+        shards: 分片数
+
+    Raises:
+        FileNotFoundError: 没有安装 pytest
+    """
+    target = os.path.abspath(target)
+    start = time.perf_counter()
+    selection, entries = select_tests(target, full)
+    store = get_test_impact_store()
+    if not selection.tests and not full:
+        store.record(target, entries, {}, selection.all_tests, None)
+        if not selection.all_tests:
+            patterns = " / ".join(python_file_patterns(target))
+            return TestRun(5, "", "", False, f"未找到测试文件（{patterns}）")
+        return TestRun(0, "", "", False,
+                       f"✅ 没有受影响的测试（{selection.reason}），跳过 {len(selection.all_tests)} 个测试文件；"
+                       f"需要完整运行时输入 '目录|||all'")
+
+    durations = {test: duration for test, (duration, _) in store.results(target).items()}
+    pool = get_python_pool()
+    if pool is not None:
+        shards = min(shards, pool.size)
+    if full:
+        # 完整运行: 与 "pytest 目录" 相同，由 pytest 自己收集（命名规则、testpaths 等配置都生效）
+        groups = [[target]]
+        extra = ["-n", str(shards)] if shards > 1 and xdist_available() else []
+    elif shards > 1 and xdist_available():
+        groups = [selection.tests]
+        extra = ["-n", str(min(shards, len(selection.tests)))]
+    else:
+        groups = shard_tests(selection.tests, durations, shards)
+        extra = []
+
+    junit_paths = [new_junit_path() for _ in groups]
+    try:
+        with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="pytest-shard") as executor:
+            outcomes = list(executor.map(
+                lambda item: run_pytest(item[0], ["-v"] + extra + junit_args(item[1]), timeout),
+                zip(groups, junit_paths)))
+        results: Dict[str, Tuple[float, bool]] = {}
+        for group, junit_path, (returncode, _, _, _) in zip(groups, junit_paths, outcomes):
+            tests = selection.all_tests if full else group
+            parsed = parse_junit(junit_path, tests)
+            results.update(parsed)
+            # 没有出现在结果中的文件（收集失败等）：分片失败时记为失败
+            for test in tests:
+                if test not in parsed:
+                    results[test] = (0.0, returncode not in (0, 5))
+    finally:
+        for junit_path in junit_paths:
+            if os.path.exists(junit_path):
+                os.unlink(junit_path)
+
+    seconds = time.perf_counter() - start
+    timed_out = any(outcome[3] for outcome in outcomes)
+    if not timed_out:
+        store.record(target, entries, results, selection.all_tests,
+                     seconds if len(selection.tests) == len(selection.all_tests) else None)
+
+    codes = [outcome[0] for outcome in outcomes]
+    returncode = 0 if all(code in (0, 5) for code in codes) and any(code == 0 for code in codes) else max(
+        code if code is not None else 1 for code in codes)
+    if len(groups) == 1:
+        stdout, stderr = outcomes[0][1], outcomes[0][2]
+    else:
+        stdout = "".join(f"----- 分片 {i}/{len(groups)}（{len(group)} 个测试文件）-----\n{outcome[1]}\n"
+                         for i, (group, outcome) in enumerate(zip(groups, outcomes), 1))
+        stderr = "".join(outcome[2] for outcome in outcomes)
+
+    summary = f"🎯 选择: {selection.reason}"
+    if len(groups) > 1:
+        summary += f"；分成 {len(groups)} 个分片并发运行"
+    elif extra:
+        summary += f"；pytest-xdist {extra[1]} 个进程"
+    summary += "\n" + speedup_report(selection, seconds, target)
+    return TestRun(returncode, stdout, stderr, timed_out, summary)
+
+
+def run_test_file(path: str, timeout: float = 30) -> TestRun:
+    """运行单个测试文件（不做选择）"""
+    returncode, stdout, stderr, timed_out = run_pytest([path], ["-v"], timeout)
+    return TestRun(returncode if returncode is not None else 1, stdout, stderr, timed_out, "")
@@ -0,0 +1,192 @@
+"""
+工具结果缓存 - 同一任务中对未修改文件的重复分析直接返回上次结果
+- 缓存键: (工具名, 参数, 文件内容哈希)；文件的 mtime / 大小不变时复用上次计算的哈希，不重复读文件
+- 写文件工具（write_file、replace_function、insert_code、restore_backup）修改文件后立即失效
+- 只缓存文件存在时的结果，文件不存在等错误不缓存
+- 环境变量:
+    TOOL_CACHE       0 表示关闭缓存（默认开启）
+    TOOL_CACHE_SIZE  最多缓存的结果数（默认512，LRU）
+"""
+
+import os
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def first_arg_path(arg: str) -> str:
+    """从 "文件路径|||..." 格式的工具输入中取出文件路径"""
+    return str(arg).split("|||")[0].strip().strip("'\"")
+
+
+class ToolResultCache:
+    """按文件内容缓存工具结果（线程安全）"""
+
+    def __init__(self, max_entries: int = 512, enabled: bool = True):
+        """
+        Args:
+            max_entries: 最多缓存的结果数
+            enabled: 是否启用
+        """
+        self.max_entries = max_entries
+        self.enabled = enabled
+        # (工具名, 参数, 路径, 内容哈希) -> 结果
+        self._results: "OrderedDict[tuple, str]" = OrderedDict()
+        # 路径 -> ((mtime_ns, size), 内容哈希)
+        self._hashes: Dict[str, Tuple[tuple, str]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._invalidations = 0
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, path: str) -> Optional[str]:
+        """文件内容哈希（stat 未变化时复用），文件不存在时返回 None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError:
+            return None
+        content_hash = digest.hexdigest()
+        with self._lock:
+            self._hashes[path] = (signature, content_hash)
+        return content_hash
+
+    def _count(self, tool_name: str, field: str) -> None:
+        stats = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+        stats[field] += 1
+
+    def call(self, tool_name: str, arg: str, path: str, func: Callable[[str], str]) -> str:
+        """执行工具（命中缓存时直接返回）"""
+        if not self.enabled:
+            return func(arg)
+
+        path = os.path.abspath(path)
+        content_hash = self._fingerprint(path)
+        if content_hash is None:
+            return func(arg)
+
+        key = (tool_name, arg, path, content_hash)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self._count(tool_name, "hits")
+                return self._results[key]
+            self._count(tool_name, "misses")
+
+        result = func(arg)
+
+        # 执行期间文件被修改时不缓存
+        if self._fingerprint(path) == content_hash:
+            with self._lock:
+                self._results[key] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return result
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """注册失效回调（如符号索引），写文件工具修改文件后以绝对路径调用"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def invalidate(self, path: str) -> None:
+        """文件被修改：清除该文件的所有缓存结果"""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._hashes.pop(path, None)
+            stale = [key for key in self._results if key[2] == path]
+            for key in stale:
+                del self._results[key]
+            if stale:
+                self._invalidations += 1
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(path)
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        with self._lock:
+            self._results.clear()
+            self._hashes.clear()
+            self._stats.clear()
+            self._invalidations = 0
+
+    def stats(self) -> dict:
+        """命中率统计（总体 + 按工具）"""
+        with self._lock:
+            by_tool = {name: dict(stats) for name, stats in self._stats.items()}
+            invalidations = self._invalidations
+            entries = len(self._results)
+        hits = sum(stats["hits"] for stats in by_tool.values())
+        misses = sum(stats["misses"] for stats in by_tool.values())
+        for stats in by_tool.values():
+            total = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / total, 3) if total else 0.0
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "invalidations": invalidations,
+            "entries": entries,
+            "by_tool": by_tool,
+        }
+
+
+_cache: Optional[ToolResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolResultCache:
+    """进程内共享的工具结果缓存（参数来自环境变量）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ToolResultCache(
+                max_entries=int(os.getenv("TOOL_CACHE_SIZE", 512)),
+                enabled=os.getenv("TOOL_CACHE", "1") != "0"
+            )
+        return _cache
+
+
+def memoize_by_file(tool_name: str, path_of: Callable[[str], str] = first_arg_path):
+    """
+    装饰器：按文件内容缓存只读分析工具的结果
+
+    用法:
+        @staticmethod
+        @memoize_by_file("check_syntax")
+        def check_syntax(filepath: str) -> str: ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(arg: str) -> str:
+            return get_tool_cache().call(tool_name, arg, path_of(arg), func)
+        return wrapper
+    return decorator
+
+
+def invalidates_file(path_of: Callable[[str], str] = first_arg_path):
+    """装饰器：写文件工具执行后使目标文件的缓存失效"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(arg: str) -> str:
+            try:
+                return func(arg)
+            finally:
+                get_tool_cache().invalidate(path_of(arg))
+        return wrapper
+    return decorator
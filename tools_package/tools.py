@@ -5,51 +5,59 @@
 
 import os
 import json
-import requests
 from datetime import datetime
 from typing import Optional
 # langchain 0.3.x 的导入
 from langchain_core.tools import Tool
-from langchain_community.tools import DuckDuckGoSearchRun
+from .tool_cache import invalidates_file
+from .file_reader import PAGE_CHARS, read_range
+from .file_transaction import FileTransaction, apply_edit, atomic_write
 import math
 
+# 注意：DuckDuckGoSearchRun / bs4 导入较慢，在工具第一次调用时再导入
+
 
 class FileTools:
     """文件操作工具"""
     
     @staticmethod
-    def read_file(filepath: str) -> str:
-        """读取文件内容"""
+    def read_file(filepath_and_range: str) -> str:
+        """
+        读取文件内容（内存映射，按范围读取，大文件分页）
+        参数格式: "filepath" 或 "filepath|||范围"
+        范围: lines=10-20 / head=50 / tail=50 / bytes=0-4096 / offset=5000（从该字节继续读下一页）
+        """
         try:
+            parts = filepath_and_range.split("|||")
+            filepath = parts[0].strip()
+            spec = parts[1].strip() if len(parts) > 1 and parts[1].strip() else None
+            
             if not os.path.exists(filepath):
                 return f"错误：文件 {filepath} 不存在"
             
-            # 尝试多种编码方式读取
-            encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-            content = None
-            
-            for encoding in encodings:
-                try:
-                    with open(filepath, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if content is None:
-                # 如果所有编码都失败，使用二进制模式
-                with open(filepath, 'rb') as f:
-                    content = f.read().decode('utf-8', errors='ignore')
+            page = read_range(filepath, spec)
+            content = page.text
             
-            # 限制长度
-            if len(content) > 5000:
-                content = content[:5000] + "\n...(内容过长，已截断)"
+            if spec is None:
+                if page.truncated:
+                    content += (f"\n...(内容过长，已截断：已显示第 0-{page.end} 字节，共 {page.size} 字节。"
+                                f"继续读取: '{filepath}|||offset={page.end}'，"
+                                f"或用 lines=起-止 / head=行数 / tail=行数 读取指定范围)")
+                return f"文件内容（{len(page.text)}字符）:\n{content}"
             
-            return f"文件内容（{len(content)}字符）:\n{content}"
+            if page.first_line is not None:
+                position = f"第 {page.first_line}-{page.last_line} 行"
+            else:
+                position = f"第 {page.start}-{page.end} 字节"
+            if page.truncated:
+                content += f"\n...(超过 {PAGE_CHARS} 字符，已截断。继续读取: '{filepath}|||offset={page.end}')"
+            return (f"文件内容（{position}，{len(page.text)}字符，文件共 {page.size} 字节，编码 {page.encoding}）:\n"
+                    f"{content}")
         except Exception as e:
             return f"读取文件错误: {str(e)}"
     
     @staticmethod
+    @invalidates_file()
     def write_file(filepath_and_content: str) -> str:
         """
         写入文件
@@ -62,15 +70,60 @@ class FileTools:
             
             filepath, content = parts[0].strip(), parts[1].strip()
             
-            # 确保目录存在
-            os.makedirs(os.path.dirname(filepath) if os.path.dirname(filepath) else '.', exist_ok=True)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # 原子写入（临时文件 + rename，目录不存在时自动创建）
+            atomic_write(filepath, content)
             return f"成功：文件已保存到 {filepath}"
         except Exception as e:
             return f"写入文件错误: {str(e)}"
     
+    @staticmethod
+    def write_files(edits_json: str) -> str:
+        """
+        一次调用修改多个文件（事务：全部成功或全部不修改）
+        参数: JSON 列表，每项为一个编辑操作，同一文件的多个操作按顺序应用
+            {"path": "a.py", "content": "..."}                   写入整个文件
+            {"path": "a.py", "function": "名称", "code": "..."}  替换函数
+            {"path": "a.py", "line": 10, "code": "..."}          在第10行插入
+            {"path": "a.py", "find": "旧文本", "replace": "新文本"} 替换文本
+        """
+        try:
+            try:
+                edits = json.loads(edits_json)
+            except json.JSONDecodeError as e:
+                return f"错误：参数应为 JSON 列表: {e}"
+            if isinstance(edits, dict):
+                edits = edits.get("edits", [edits])
+            if not isinstance(edits, list) or not edits:
+                return "错误：参数应为非空的 JSON 列表，如 [{\"path\": \"a.py\", \"content\": \"...\"}]"
+            
+            txn = FileTransaction()
+            for i, edit in enumerate(edits, 1):
+                if not isinstance(edit, dict) or not str(edit.get("path", "")).strip():
+                    return f"错误：第 {i} 项缺少 path，未修改任何文件"
+                path = str(edit["path"]).strip()
+                try:
+                    txn.stage(path, apply_edit(txn.read(path), edit))
+                except (ValueError, SyntaxError, UnicodeDecodeError) as e:
+                    return f"错误：第 {i} 项（{path}）无法应用: {e}，未修改任何文件"
+            
+            written = txn.commit()
+            
+            result = f"✅ 已原子写入 {len(written)} 个文件（{len(edits)} 项修改）:\n"
+            for path in written:
+                result += f"- {os.path.relpath(path)}\n"
+            
+            # Python 文件写入后检查语法，提示但不回滚
+            for path in written:
+                if path.endswith('.py'):
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            compile(f.read(), path, 'exec')
+                    except SyntaxError as e:
+                        result += f"⚠️ {os.path.relpath(path)} 第 {e.lineno} 行语法错误: {e.msg}\n"
+            return result
+        except Exception as e:
+            return f"批量写入错误（已回滚）: {str(e)}"
+    
     @staticmethod
     def list_directory(path: str = ".") -> str:
         """列出目录内容"""
@@ -152,6 +205,7 @@ class WebTools:
         搜索网络信息
         """
         try:
+            from langchain_community.tools import DuckDuckGoSearchRun
             search = DuckDuckGoSearchRun()
             results = search.run(query)
             
@@ -173,13 +227,14 @@ class WebTools:
         获取网页内容
         """
         try:
-            response = requests.get(url, timeout=10, headers={
+            from tools_package.http_client import get_http_manager, apparent_encoding
+            response = get_http_manager().get(url, timeout=10, headers={
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             })
             response.raise_for_status()
             
             # 设置正确的编码
-            response.encoding = response.apparent_encoding or 'utf-8'
+            response.encoding = apparent_encoding(response.content) or 'utf-8'
             
             from bs4 import BeautifulSoup
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -264,13 +319,21 @@ def create_tools(enable_clip=False):
         Tool(
             name="read_file",
             func=FileTools.read_file,
-            description="读取文件内容。输入：文件路径（如 'data.txt'）。Read file content."
+            description="读取文件内容（大文件分页）。输入：文件路径（如 'data.txt'），或 '文件路径|||范围'，范围可为 lines=10-20、head=50、tail=50、bytes=0-4096、offset=5000（按上一页提示继续读取）。Read file content."
         ),
         Tool(
             name="write_file",
             func=FileTools.write_file,
             description="写入文件。输入格式：'文件路径|||文件内容'（用三个竖线分隔）。Write file."
         ),
+        Tool(
+            name="write_files",
+            func=FileTools.write_files,
+            description="一次修改多个文件（原子事务，全部成功或全部不修改）。输入：JSON 列表，每项为 "
+                        "{\"path\": 路径, \"content\": 全部内容} 或 {\"path\", \"function\": 函数名, \"code\": 新代码} "
+                        "或 {\"path\", \"line\": 行号, \"code\": 插入代码} 或 {\"path\", \"find\": 旧文本, \"replace\": 新文本}。"
+                        "重构多个文件时优先使用。Write multiple files atomically."
+        ),
         Tool(
             name="list_directory",
             func=FileTools.list_directory,
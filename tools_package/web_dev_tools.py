@@ -6,10 +6,11 @@ Web开发专用工具集
 import os
 import json
 import subprocess
-import requests
 from typing import Dict, List
 from langchain_core.tools import Tool
 
+from .file_scanner import map_files, read_text, scan_files
+
 
 class WebDevTools:
     """Web开发工具"""
@@ -159,7 +160,8 @@ def {func_name}():
         输入: URL地址
         """
         try:
-            response = requests.get(url, timeout=5)
+            from tools_package.http_client import get_http_manager
+            response = get_http_manager().get(url, timeout=5)
             result = {
                 "status_code": response.status_code,
                 "headers": dict(response.headers),
@@ -178,10 +180,15 @@ def {func_name}():
         try:
             req_file = os.path.join(filepath, "requirements.txt")
             
-            # 检测项目类型并生成对应的requirements
-            flask_files = [f for f in os.listdir(filepath) if f.endswith('.py')] if os.path.exists(filepath) else []
-            is_flask = any('flask' in open(os.path.join(filepath, f), 'r', encoding='utf-8', errors='ignore').read().lower() for f in flask_files if os.path.isfile(os.path.join(filepath, f)))
-            is_fastapi = any('fastapi' in open(os.path.join(filepath, f), 'r', encoding='utf-8', errors='ignore').read().lower() for f in flask_files if os.path.isfile(os.path.join(filepath, f)))
+            # 检测项目类型并生成对应的requirements（并行读取项目中的Python文件，每个文件只读一次）
+            is_flask = is_fastapi = False
+            if os.path.isdir(filepath):
+                paths = [entry.path for entry in scan_files(filepath, (".py",))]
+                for content in map_files(lambda path: (read_text(path, errors='ignore') or "").lower(), paths):
+                    is_flask = is_flask or 'flask' in content
+                    is_fastapi = is_fastapi or 'fastapi' in content
+                    if is_flask and is_fastapi:
+                        break
             
             requirements = []
             if is_fastapi:
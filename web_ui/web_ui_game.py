@@ -73,9 +73,10 @@ with st.sidebar:
         - `search_code`: 搜索代码模式
         """)
     
-    with st.expander("✏️ 代码编辑 (5个)", expanded=False):
+    with st.expander("✏️ 代码编辑 (6个)", expanded=False):
         st.markdown("""
         - `write_file`: 写入完整文件
+        - `write_files`: 原子修改多个文件
         - `create_game_file`: 从模板创建文件
         - `replace_function`: 替换函数
         - `insert_code`: 插入代码
@@ -88,9 +89,12 @@ with st.sidebar:
         - `check_syntax`: 检查语法错误
         """)
     
-    with st.expander("💻 终端工具 (1个)", expanded=False):
+    with st.expander("💻 终端工具 (4个)", expanded=False):
         st.markdown("""
         - `run_command`: 执行终端命令
+        - `run_command_background`: 后台运行长时间的命令
+        - `check_command`: 查看后台任务输出
+        - `stop_command`: 结束后台任务
         """)
     
     with st.expander("🐍 Python环境 (4个)", expanded=False):
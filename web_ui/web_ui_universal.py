@@ -99,6 +99,7 @@ with st.sidebar:
         - `run_python`: 运行Python文件
         - `check_syntax`: 检查语法错误
         - `check_code_quality`: 代码质量检查
+        - `check_project_quality`: 项目代码质量检查
         - `run_tests`: 运行测试
         """)
     
@@ -106,6 +107,7 @@ with st.sidebar:
         st.markdown("""
         - `backup_file`: 备份文件
         - `restore_backup`: 恢复备份
+        - `list_backups`: 列出备份版本
         - `create_test_file`: 创建测试文件
         """)
     
@@ -145,7 +147,8 @@ def init_agent(service, scenario, temperature):
             service=agent_service,
             scenario=scenario,
             temperature=temperature,
-            verbose=False
+            verbose=False,
+            stream_tokens=True  # 逐token推送，首字节延迟降到模型首token延迟
         )
         return agent, None
     except Exception as e:
@@ -218,6 +221,7 @@ if prompt := st.chat_input("输入你的编程任务..."):
             status_container = st.empty()
             plan_container = st.container()
             steps_container = st.container()
+            live_container = st.empty()  # 模型正在生成的文本（token流）
             result_container = st.empty()
             
             # 显示初始状态
@@ -241,14 +245,35 @@ if prompt := st.chat_input("输入你的编程任务..."):
                     "plan": "",
                     "steps": [],
                     "current_step": 0,
-                    "step_containers": {}
+                    "step_containers": {},
+                    "live_text": "",
+                    "live_message_id": None
                 }
                 
                 # 🔥 实时回调函数 - Cursor风格！
                 def realtime_callback(data):
                     msg_type = data.get("type", "")
                     
-                    if msg_type == "start":
+                    # 一条完整消息到达后，清空实时生成区域
+                    if msg_type in ("plan", "action", "observation", "final", "error"):
+                        realtime_state["live_text"] = ""
+                        live_container.empty()
+                    
+                    if msg_type == "token":
+                        # 新的模型调用开始，重新累积
+                        if data.get("message_id") != realtime_state["live_message_id"]:
+                            realtime_state["live_message_id"] = data.get("message_id")
+                            realtime_state["live_text"] = ""
+                        realtime_state["live_text"] += data.get("content", "")
+                        live_container.markdown(realtime_state["live_text"] + "▌")
+                    
+                    elif msg_type == "tool_output":
+                        # 命令类工具执行中的输出，只显示末尾部分
+                        realtime_state["live_text"] = (realtime_state["live_text"] + data.get("content", ""))[-3000:]
+                        realtime_state["live_message_id"] = None
+                        live_container.code(realtime_state["live_text"], language='text')
+                    
+                    elif msg_type == "start":
                         with plan_container:
                             st.success(f"🎯 **任务**: {data.get('content', '')}")
                     